@@ -0,0 +1,242 @@
+"""
+Affectation automatique des conducteurs aux engins pour un shift.
+
+1. Une requête SQL construit les arêtes éligibles (conducteur, engin, poids) :
+   conducteur qualifié sur l'engin, sans absence (déclarée et non refusée, ou
+   non déclarée) pendant le shift, dont les heures du jour plus la durée du shift restent sous la
+   limite max configurée ; engin « disponible » et pas encore affecté au shift.
+2. Les arêtes deviennent une matrice de poids numpy (une ligne par
+   conducteur, une colonne par engin) et le couplage de poids maximal est
+   résolu par scipy.optimize.linear_sum_assignment, ou à défaut par
+   l'algorithme hongrois vectorisé de ce module.
+3. Le résultat est écrit en deux bulk_create (affectations et
+   affectations_conducteurs) dans la même transaction.
+
+Le poids favorise le niveau d'expertise puis la marge horaire restante.
+"""
+
+import time
+
+from django.db import connection, transaction
+
+from .alertes import lire_limites_alertes
+from .models import AffectationConducteur, Affectations, Shifts
+from .periodes_absence import chevauchement
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy figure dans requirements.txt
+    np = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+SQL_ARETES_ELIGIBLES = f'''
+    WITH shift AS (
+        SELECT id_shift, date_debut_shift, date_fin_shift,
+               EXTRACT(EPOCH FROM date_fin_shift - date_debut_shift) / 3600.0 AS duree
+        FROM {{table_shifts}} WHERE id_shift = %s
+    ),
+    heures AS (
+        SELECT ch.matricule, SUM(ch.heure_par_jour) AS heures
+        FROM cumul_heures ch, shift s
+        WHERE ch.date = s.date_debut_shift::date
+        GROUP BY ch.matricule
+    )
+    SELECT
+        q.matricule,
+        ie.id_equipe,
+        q.code_engin,
+        (CASE
+            WHEN q.niveau_expertise::text ~ '^[0-9]+([.,][0-9]+)?$'
+                THEN REPLACE(q.niveau_expertise::text, ',', '.')::double precision
+            WHEN lower(q.niveau_expertise::text) IN ('expert', 'avancé', 'avance', 'senior') THEN 3
+            WHEN lower(q.niveau_expertise::text) IN ('confirmé', 'confirme', 'intermédiaire', 'intermediaire') THEN 2
+            ELSE 1
+        END) + (%s - COALESCE(h.heures, 0)) / %s AS poids
+    FROM qualifications_conducteurs q
+    JOIN info_equipe ie ON ie.matricule = q.matricule AND ie.fonction = 'conducteur'
+    JOIN engins e ON e.code_engin = q.code_engin AND e.etat_engin = 'disponible'
+    CROSS JOIN shift s
+    LEFT JOIN heures h ON h.matricule = q.matricule
+    WHERE COALESCE(h.heures, 0) + s.duree <= %s
+      AND NOT EXISTS (
+          SELECT 1 FROM absences a
+          WHERE a.matricule = q.matricule AND a.etat IS DISTINCT FROM 'refusée'
+            AND {chevauchement('a', 's.date_debut_shift', 's.date_fin_shift')}
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM "absences_non_déclarées" n
+          WHERE n.matricule = q.matricule
+            AND {chevauchement('n', 's.date_debut_shift', 's.date_fin_shift')}
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM affectations_conducteurs ac
+          WHERE ac.id_shift = s.id_shift AND (ac.matricule = q.matricule OR ac.code_engin = q.code_engin)
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM affectations af
+          WHERE af.id_shift = s.id_shift AND af.code_engin = q.code_engin
+      )
+'''
+
+
+def _verifier_numpy():
+    if np is None:
+        raise RuntimeError("numpy est requis pour l'affectation automatique (pip install numpy)")
+
+
+def construire_matrice(matricules, codes_engins, poids):
+    """
+    Matrice dense des poids à partir des arêtes (une par couple éligible).
+    Retourne (conducteurs, engins, matrice) ; 0 = couple non éligible.
+    """
+    _verifier_numpy()
+    conducteurs, lignes = np.unique(np.asarray(matricules, dtype=object), return_inverse=True)
+    engins, colonnes = np.unique(np.asarray(codes_engins, dtype=object), return_inverse=True)
+    matrice = np.zeros((len(conducteurs), len(engins)))
+    # Qualification en double : le meilleur niveau l'emporte
+    np.maximum.at(matrice, (lignes, colonnes), np.asarray(poids, dtype=float))
+    return conducteurs, engins, matrice
+
+
+def _hongrois(couts):
+    """
+    Affectation de coût minimal pour lignes <= colonnes (plus courts chemins
+    augmentants avec potentiels, en O(n² m)). Chaque étape est vectorisée sur
+    les colonnes ; repli quand scipy n'est pas installé.
+    """
+    n, m = couts.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # p[j] : ligne (base 1) affectée à la colonne j, 0 = libre ; la colonne 0 est fictive
+    p = np.zeros(m + 1, dtype=np.int64)
+    chemin = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        utilisees = np.zeros(m + 1, dtype=bool)
+        while True:
+            utilisees[j0] = True
+            i0 = p[j0]
+            libres = ~utilisees[1:]
+            reduits = couts[i0 - 1] - u[i0] - v[1:]
+            ameliores = libres & (reduits < minv[1:])
+            minv[1:][ameliores] = reduits[ameliores]
+            chemin[1:][ameliores] = j0
+            candidats = np.where(libres, minv[1:], np.inf)
+            j1 = int(np.argmin(candidats)) + 1
+            delta = candidats[j1 - 1]
+            u[p[utilisees]] += delta
+            v[utilisees] -= delta
+            minv[1:][libres] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Inversion du chemin augmentant
+        while j0:
+            j1 = chemin[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    colonnes = np.nonzero(p[1:])[0]
+    lignes = p[1:][colonnes] - 1
+    ordre = np.argsort(lignes)
+    return lignes[ordre], colonnes[ordre]
+
+
+def resoudre_affectation(matrice, solveur=None):
+    """
+    Couplage de poids maximal sur la matrice (poids > 0 = couple éligible).
+    Retourne (lignes, colonnes) des couples retenus.
+    """
+    _verifier_numpy()
+    if matrice.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    solveur = solveur or ('scipy' if linear_sum_assignment is not None else 'numpy')
+    if solveur == 'scipy':
+        lignes, colonnes = linear_sum_assignment(matrice, maximize=True)
+    elif matrice.shape[0] <= matrice.shape[1]:
+        lignes, colonnes = _hongrois(-matrice)
+    else:
+        colonnes, lignes = _hongrois(-matrice.T)
+    # Les couples de poids nul (non éligibles) complètent seulement l'affectation
+    retenus = matrice[lignes, colonnes] > 0
+    return lignes[retenus], colonnes[retenus]
+
+
+def lire_aretes(shift, limite_max):
+    table_shifts = connection.ops.quote_name(Shifts._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            SQL_ARETES_ELIGIBLES.format(table_shifts=table_shifts),
+            [shift.id_shift, limite_max, limite_max, limite_max],
+        )
+        return cursor.fetchall()
+
+
+def affecter_shift(id_shift, simulation=False):
+    """
+    Calcule et (hors simulation) enregistre l'affectation automatique du shift.
+    Lève Shifts.DoesNotExist si le shift n'existe pas.
+    """
+    _verifier_numpy()
+    shift = Shifts.objects.get(pk=id_shift)
+    limite_max = float(lire_limites_alertes()['limite_max'])
+
+    with transaction.atomic():
+        # Deux calculs simultanés du même shift se partageraient les mêmes engins
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('affectation_auto'), %s)", [shift.id_shift])
+        aretes = lire_aretes(shift, limite_max)
+
+        debut = time.perf_counter()
+        if aretes:
+            matricules, equipes, codes_engins, poids = zip(*aretes)
+            conducteurs, engins, matrice = construire_matrice(matricules, codes_engins, poids)
+            lignes, colonnes = resoudre_affectation(matrice)
+            equipe_par_matricule = dict(zip(matricules, equipes))
+        else:
+            conducteurs = engins = ()
+            lignes = colonnes = ()
+        duree_ms = (time.perf_counter() - debut) * 1000
+
+        choix = [
+            (conducteurs[ligne], engins[colonne], float(matrice[ligne, colonne]))
+            for ligne, colonne in zip(lignes, colonnes)
+        ]
+        if choix and not simulation:
+            affectations = Affectations.objects.bulk_create([
+                Affectations(
+                    date_affectation=shift.date_debut_shift.date(),
+                    id_equipe_id=equipe_par_matricule[matricule],
+                    id_shift_id=shift.id_shift,
+                    code_engin_id=code_engin,
+                )
+                for matricule, code_engin, _ in choix
+            ])
+            AffectationConducteur.objects.bulk_create([
+                AffectationConducteur(
+                    id_shift=shift.id_shift, matricule=matricule, code_engin=code_engin,
+                    poids=poids_couple, id_affectation=affectation.id_affectation,
+                )
+                for (matricule, code_engin, poids_couple), affectation in zip(choix, affectations)
+            ])
+
+    return {
+        'id_shift': shift.id_shift,
+        'simulation': simulation,
+        'conducteurs_eligibles': len(conducteurs),
+        'engins_eligibles': len(engins),
+        'couples_eligibles': len(aretes),
+        'poids_total': round(sum(poids_couple for _, _, poids_couple in choix), 3),
+        'duree_resolution_ms': round(duree_ms, 2),
+        'affectations': [
+            {'matricule': matricule, 'code_engin': code_engin, 'poids': round(poids_couple, 3)}
+            for matricule, code_engin, poids_couple in choix
+        ],
+    }
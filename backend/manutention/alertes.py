@@ -0,0 +1,336 @@
+"""
+Alertes de surcharge / sous-charge horaire.
+
+Les alertes sont évaluées à l'écriture et non plus à la lecture : le trigger
+PostgreSQL cumul_heures_alertes appelle evaluer_alerte_heures(matricule, jour)
+pour chaque ligne insérée, modifiée ou supprimée dans cumul_heures, quel que
+soit l'outil qui l'écrit. La fonction compare le total d'heures du jour aux
+limites de la table configuration (2 et 8 par défaut), ouvre une alerte dans
+alertes_heures ou ferme l'alerte active devenue caduque, et notifie chaque
+changement sur le bus d'événements (pg_notify, canal « alertes »). Un jour
+couvert par une absence déclarée (non refusée) n'ouvre pas d'alerte de
+sous-charge ; l'écriture d'une absence réévalue les jours concernés.
+
+Les endpoints ne lisent que les alertes actives (index partiel) et les
+alertes fermées constituent l'historique. Les écritures passant par le
+trigger, ces lectures ne sont pas mises en cache par table (caching).
+
+Les limites, lues aussi par l'affectation automatique, sont en cache sous la
+table configuration. Celle-ci est écrite hors de l'application : le trigger
+configuration_modifiee notifie chaque écriture sur le bus (canal
+« configuration ») et chaque processus qui a lu les limites invalide alors le
+cache. Sans LISTEN, la commande evaluer_alertes, à lancer après une
+modification des limites, l'invalide elle-même.
+"""
+
+import threading
+
+from django.db import connection
+
+from .caching import invalider, lire_ou_calculer
+from .evenements import CANAL_PG, bus
+from .periodes_absence import chevauchement
+from .presence import jour_local
+
+LIMITE_MIN_DEFAUT = 2
+LIMITE_MAX_DEFAUT = 8
+
+CANAL_CONFIGURATION = 'configuration'
+
+SQL_FONCTION_EVALUATION = '''
+    CREATE OR REPLACE FUNCTION evaluer_alerte_heures(p_matricule VARCHAR, p_jour DATE)
+    RETURNS VOID AS $$
+    DECLARE
+        v_min DOUBLE PRECISION := %(limite_min)s;
+        v_max DOUBLE PRECISION := %(limite_max)s;
+        v_heures DOUBLE PRECISION;
+        v_type VARCHAR;
+        v_limite DOUBLE PRECISION;
+        v_id BIGINT;
+        v_type_ferme VARCHAR;
+        v_inseree BOOLEAN;
+    BEGIN
+        IF p_matricule IS NULL OR p_jour IS NULL THEN
+            RETURN;
+        END IF;
+
+        -- Limites configurables ; une valeur absente ou illisible garde le défaut
+        IF to_regclass('configuration') IS NOT NULL THEN
+            BEGIN
+                EXECUTE 'SELECT
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_min_heures''), $1),
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_max_heures''), $2)'
+                INTO v_min, v_max USING v_min, v_max;
+            EXCEPTION WHEN others THEN
+                v_min := %(limite_min)s;
+                v_max := %(limite_max)s;
+            END;
+        END IF;
+
+        SELECT SUM(heure_par_jour) INTO v_heures
+        FROM cumul_heures
+        WHERE matricule = p_matricule AND date = p_jour;
+
+        IF v_heures > v_max THEN
+            v_type := 'excess';
+            v_limite := v_max;
+        ELSIF v_heures < v_min THEN
+            v_type := 'lack';
+            v_limite := v_min;
+        END IF;
+
+        -- Sous-charge expliquée par une absence déclarée : pas d'alerte
+        IF v_type = 'lack' AND to_regclass('absences') IS NOT NULL
+           AND to_regprocedure('periode_absence(timestamp, timestamp)') IS NOT NULL THEN
+            IF EXISTS (
+                SELECT 1 FROM absences a
+                WHERE a.matricule = p_matricule AND a.etat IS DISTINCT FROM 'refusée'
+                  AND %(chevauchement_jour)s
+            ) THEN
+                v_type := NULL;
+            END IF;
+        END IF;
+
+        -- Fermeture de l'alerte active si le seuil n'est plus franchi (ou l'autre l'est)
+        UPDATE alertes_heures SET date_fermeture = NOW()
+        WHERE matricule = p_matricule AND jour = p_jour AND date_fermeture IS NULL
+          AND (v_type IS NULL OR type_alerte <> v_type)
+        RETURNING id, type_alerte INTO v_id, v_type_ferme;
+
+        IF v_id IS NOT NULL THEN
+            PERFORM pg_notify('%(canal)s', json_build_object(
+                'canal', 'alertes', 'type', 'fermee',
+                'donnees', json_build_object('id', v_id, 'matricule', p_matricule, 'jour', p_jour, 'type_alerte', v_type_ferme)
+            )::text);
+            v_id := NULL;
+        END IF;
+
+        IF v_type IS NOT NULL THEN
+            INSERT INTO alertes_heures (matricule, jour, type_alerte, heures, limite, date_ouverture)
+            VALUES (p_matricule, p_jour, v_type, v_heures, v_limite, NOW())
+            ON CONFLICT (matricule, jour) WHERE date_fermeture IS NULL
+            DO UPDATE SET heures = EXCLUDED.heures, limite = EXCLUDED.limite
+                WHERE (alertes_heures.heures, alertes_heures.limite) IS DISTINCT FROM (EXCLUDED.heures, EXCLUDED.limite)
+            RETURNING id, (xmax = 0) INTO v_id, v_inseree;
+
+            -- Pas de notification si l'alerte active est inchangée
+            IF v_id IS NOT NULL THEN
+                PERFORM pg_notify('%(canal)s', json_build_object(
+                    'canal', 'alertes', 'type', CASE WHEN v_inseree THEN 'ouverte' ELSE 'mise_a_jour' END,
+                    'donnees', json_build_object(
+                        'id', v_id, 'matricule', p_matricule, 'jour', p_jour, 'type_alerte', v_type,
+                        'heures', v_heures, 'limite', v_limite
+                    )
+                )::text);
+            END IF;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+''' % {
+    'limite_min': LIMITE_MIN_DEFAUT, 'limite_max': LIMITE_MAX_DEFAUT, 'canal': CANAL_PG,
+    'chevauchement_jour': chevauchement('a', 'p_jour::timestamptz', "p_jour + INTERVAL '1 day'"),
+}
+
+SQL_TRIGGER_CUMUL_HEURES = '''
+    CREATE OR REPLACE FUNCTION cumul_heures_alertes() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM evaluer_alerte_heures(OLD.matricule, OLD.date);
+        END IF;
+        IF TG_OP = 'INSERT' OR (
+            TG_OP = 'UPDATE' AND (NEW.matricule, NEW.date) IS DISTINCT FROM (OLD.matricule, OLD.date)
+        ) THEN
+            PERFORM evaluer_alerte_heures(NEW.matricule, NEW.date);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS cumul_heures_alertes ON cumul_heures;
+    CREATE TRIGGER cumul_heures_alertes
+        AFTER INSERT OR UPDATE OR DELETE ON cumul_heures
+        FOR EACH ROW EXECUTE FUNCTION cumul_heures_alertes();
+'''
+
+# Notification de toute écriture dans configuration, quel que soit l'outil ;
+# le trigger n'est posé que si la table existe
+SQL_TRIGGER_CONFIGURATION = '''
+    CREATE OR REPLACE FUNCTION configuration_modifiee() RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM pg_notify('%(canal)s', json_build_object(
+            'canal', '%(canal_configuration)s', 'type', 'modifiee', 'donnees', json_build_object()
+        )::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DO $$
+    BEGIN
+        IF to_regclass('configuration') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS configuration_modifiee ON configuration;
+            CREATE TRIGGER configuration_modifiee
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON configuration
+                FOR EACH STATEMENT EXECUTE FUNCTION configuration_modifiee();
+        END IF;
+    END $$;
+''' % {'canal': CANAL_PG, 'canal_configuration': CANAL_CONFIGURATION}
+
+SQL_SUPPRESSION_MOTEUR = '''
+    DROP FUNCTION IF EXISTS configuration_modifiee() CASCADE;
+    DROP TRIGGER IF EXISTS cumul_heures_alertes ON cumul_heures;
+    DROP FUNCTION IF EXISTS cumul_heures_alertes();
+    DROP FUNCTION IF EXISTS evaluer_alerte_heures(VARCHAR, DATE);
+'''
+
+# Réévaluation d'une période : jours ayant des heures ou une alerte encore active
+SQL_REEVALUATION = '''
+    SELECT evaluer_alerte_heures(s.matricule, s.jour)
+    FROM (
+        SELECT matricule, date AS jour FROM cumul_heures
+        WHERE matricule IS NOT NULL AND date BETWEEN %s AND %s {filtre}
+        UNION
+        SELECT matricule, jour FROM alertes_heures
+        WHERE date_fermeture IS NULL AND jour BETWEEN %s AND %s {filtre}
+    ) s
+'''
+
+SQL_ALERTES = '''
+    SELECT
+        a.matricule,
+        ie.nom,
+        ie.prenom,
+        ie.fonction,
+        a.jour,
+        a.heures AS heure_par_jour,
+        a.limite,
+        a.type_alerte,
+        a.date_ouverture,
+        a.date_fermeture
+    FROM alertes_heures a
+    LEFT JOIN info_equipe ie ON ie.matricule = a.matricule
+    WHERE {conditions}
+    ORDER BY {tri}
+'''
+
+
+def installer_moteur_alertes():
+    """(Ré)installe la fonction d'évaluation, le trigger sur cumul_heures et celui sur configuration"""
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_FONCTION_EVALUATION)
+        cursor.execute(SQL_TRIGGER_CUMUL_HEURES)
+        cursor.execute(SQL_TRIGGER_CONFIGURATION)
+
+
+def _lire_limites():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('configuration') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            # Pas de table de configuration : valeurs par défaut
+            return {'limite_min': LIMITE_MIN_DEFAUT, 'limite_max': LIMITE_MAX_DEFAUT}
+        cursor.execute('''
+            SELECT
+                (SELECT valeur FROM configuration WHERE cle = 'limite_min_heures'),
+                (SELECT valeur FROM configuration WHERE cle = 'limite_max_heures')
+        ''')
+        valeurs = cursor.fetchone()
+
+    limites = {}
+    for cle, valeur, defaut in zip(('limite_min', 'limite_max'), valeurs, (LIMITE_MIN_DEFAUT, LIMITE_MAX_DEFAUT)):
+        try:
+            nombre = float(valeur)
+            limites[cle] = int(nombre) if nombre.is_integer() else nombre
+        except (TypeError, ValueError):
+            limites[cle] = defaut
+    return limites
+
+
+_abonnement_configuration = None
+_verrou_abonnement = threading.Lock()
+
+
+def _suivre_configuration():
+    """Abonne le processus aux écritures de configuration notifiées par le trigger"""
+    global _abonnement_configuration
+    with _verrou_abonnement:
+        if _abonnement_configuration is None:
+            _abonnement_configuration = bus.abonner_rappel(
+                [CANAL_CONFIGURATION], lambda evenement: invalider('configuration')
+            )
+
+
+def lire_limites_alertes():
+    """Limites min / max d'heures par jour, identiques à celles du trigger"""
+    _suivre_configuration()
+    return lire_ou_calculer('limites_alertes', ('configuration',), '', _lire_limites)
+
+
+def reevaluer_alertes(debut, fin, matricules=None):
+    """
+    Réévalue les alertes des jours [debut, fin] (des matricules donnés, tous
+    par défaut), par exemple après un changement de limites, l'écriture d'une
+    absence ou une reprise de données faite trigger désactivé.
+    Retourne le nombre de couples (matricule, jour) évalués.
+    """
+    filtre, params = ('', [])
+    if matricules is not None:
+        filtre, params = ('AND matricule = ANY(%s)', [list(matricules)])
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_REEVALUATION.format(filtre=filtre), [debut, fin] + params + [debut, fin] + params)
+        return cursor.rowcount
+
+
+def moteur_alertes_installe():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regprocedure('evaluer_alerte_heures(varchar, date)') IS NOT NULL")
+        return cursor.fetchone()[0]
+
+
+def reevaluer_alertes_absences(intervalles):
+    """
+    Réévalue les alertes des jours couverts par des absences écrites.
+    `intervalles` : itérable de (matricule, date_debut_abs, date_fin_abs).
+    """
+    intervalles = [(m, debut, fin) for m, debut, fin in intervalles if m and debut is not None and fin is not None]
+    if not intervalles or not moteur_alertes_installe():
+        return
+    for matricule, debut, fin in intervalles:
+        debut, fin = sorted((jour_local(debut), jour_local(fin)))
+        reevaluer_alertes(debut, fin, [matricule])
+
+
+def _formater(colonnes, ligne):
+    alerte = {
+        col: (val.isoformat() if hasattr(val, 'isoformat') else val)
+        for col, val in zip(colonnes, ligne)
+    }
+    libelle = 'Surcharge' if alerte['type_alerte'] == 'excess' else 'Sous-charge'
+    alerte['message'] = f"{libelle}: {alerte['heure_par_jour']}h/jour"
+    return alerte
+
+
+def _lire_alertes(conditions, params, tri):
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_ALERTES.format(conditions=' AND '.join(conditions), tri=tri), params)
+        colonnes = [col[0] for col in cursor.description]
+        return [_formater(colonnes, ligne) for ligne in cursor.fetchall()]
+
+
+def lire_alertes_actives(jour, fonction=None):
+    """Alertes actives du jour, servies par l'index partiel des alertes ouvertes"""
+    conditions, params = ['a.date_fermeture IS NULL', 'a.jour = %s'], [jour]
+    if fonction:
+        conditions.append('ie.fonction = %s')
+        params.append(fonction)
+    return _lire_alertes(conditions, params, 'a.matricule ASC')
+
+
+def lire_historique_alertes(debut, fin, fonction=None, matricule=None):
+    """Alertes ouvertes ou fermées sur la période, les plus récentes d'abord"""
+    conditions, params = ['a.jour BETWEEN %s AND %s'], [debut, fin]
+    if fonction:
+        conditions.append('ie.fonction = %s')
+        params.append(fonction)
+    if matricule:
+        conditions.append('a.matricule = %s')
+        params.append(matricule)
+    return _lire_alertes(conditions, params, 'a.jour DESC, a.date_ouverture DESC')
@@ -0,0 +1,302 @@
+"""
+Backends de récupération des mouvements de navires depuis le site ANP.
+
+Chaque backend expose `recuperer_lignes(port)` et renvoie la liste des lignes
+du tableau des navires (une liste de cellules texte par ligne) :
+
+- HttpFetcher     : soumet directement le formulaire de sélection du port et
+                    suit la pagination (__doPostBack ou lien « suivant ») avec
+                    une session HTTP poolée, sans navigateur
+- SeleniumFetcher : Chrome headless, conservé en repli si le site ne peut pas
+                    être lu sans exécuter son JavaScript
+"""
+
+import re
+from abc import ABC, abstractmethod
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+URL_ANP = "https://anp.org.ma/fr/services/mvm-navires"
+PORT_PAR_DEFAUT = "Port d'Agadir"
+CHAMP_PORT = "Ports"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# (connexion, lecture) en secondes
+TIMEOUT_HTTP = (5, 30)
+# Garde-fou contre une pagination qui boucle
+MAX_PAGES = 50
+
+TEXTES_SUIVANT = ('suivant', 'next', '>', '»', 'suiv.', 'next page', 'page suivante')
+REGEX_POSTBACK = re.compile(r"__doPostBack\(\\?'([^'\\]*)\\?'\s*,\s*\\?'([^'\\]*)\\?'\)")
+
+try:
+    import lxml  # noqa: F401
+    PARSEUR_HTML = 'lxml'
+except ImportError:
+    PARSEUR_HTML = 'html.parser'
+
+
+class ErreurScraping(Exception):
+    """La page ANP ne contient pas les éléments attendus"""
+
+
+def parser_html(html):
+    return BeautifulSoup(html, PARSEUR_HTML)
+
+
+def extraire_lignes(soup):
+    """Lignes de données (cellules <td>) du tableau des navires"""
+    table = soup.find("table")
+    if table is None:
+        raise ErreurScraping('Tableau non trouvé sur la page ANP')
+    lignes = []
+    for row in table.find_all("tr"):
+        cols = [td.get_text(strip=True) for td in row.find_all("td")]
+        if cols:
+            lignes.append(cols)
+    return lignes
+
+
+def champs_formulaire(form):
+    """Valeurs soumises par défaut par un formulaire (champs cachés compris)"""
+    champs = {}
+    for champ in form.find_all("input"):
+        nom = champ.get("name")
+        type_champ = (champ.get("type") or "text").lower()
+        if not nom or type_champ in ("submit", "button", "image", "reset", "file"):
+            continue
+        if type_champ in ("checkbox", "radio") and not champ.has_attr("checked"):
+            continue
+        champs[nom] = champ.get("value", "")
+    for select in form.find_all("select"):
+        nom = select.get("name")
+        option = select.find("option", selected=True) or select.find("option")
+        if nom and option is not None:
+            champs[nom] = option.get("value", option.get_text(strip=True))
+    return champs
+
+
+def cible_postback(javascript):
+    """(cible, argument) d'un appel __doPostBack, ou None"""
+    match = REGEX_POSTBACK.search(javascript or "")
+    return match.groups() if match else None
+
+
+def est_desactive(lien):
+    classes = lien.get("class", []) + (lien.parent.get("class", []) if lien.parent else [])
+    return "disabled" in classes or lien.has_attr("disabled") or lien.get("aria-disabled") == "true"
+
+
+def trouver_page_suivante(soup):
+    """
+    Retourne ('postback', lien, cible, argument), ('get', url) ou None
+    pour la page suivante du tableau
+    """
+    for lien in soup.find_all("a"):
+        texte = lien.get_text(strip=True).lower()
+        classes = [classe.lower() for classe in lien.get("class", [])]
+        suivant = texte in TEXTES_SUIVANT or "next" in (lien.get("rel") or []) or "next" in classes
+        if not suivant or est_desactive(lien):
+            continue
+        href = lien.get("href") or ""
+        postback = cible_postback(href) or cible_postback(lien.get("onclick"))
+        if postback:
+            return ('postback', lien) + postback
+        if href and not href.startswith(("#", "javascript:")):
+            return ('get', href)
+    return None
+
+
+class FetcherANP(ABC):
+    """Interface commune des backends de scraping ANP"""
+    nom = None
+
+    @abstractmethod
+    def recuperer_lignes(self, port=PORT_PAR_DEFAUT):
+        """Lignes du tableau des navires du port, une liste de cellules texte par ligne"""
+
+
+class HttpFetcher(FetcherANP):
+    """
+    Lecture du site ANP par requêtes HTTP directes.
+
+    La session est réutilisée pour toutes les pages (keep-alive, cookies de
+    session du formulaire) et rejoue automatiquement les erreurs 5xx
+    transitoires.
+    """
+    nom = 'http'
+
+    def __init__(self, url=URL_ANP, session=None, timeout=TIMEOUT_HTTP, max_pages=MAX_PAGES):
+        self.url = url
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.session = session or self.creer_session()
+
+    @staticmethod
+    def creer_session():
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = USER_AGENT
+        return session
+
+    def charger(self, methode, url, data=None):
+        response = self.session.request(methode, url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.url, parser_html(response.content)
+
+    def soumettre(self, form, url_page, champs):
+        action = urljoin(url_page, form.get("action") or url_page)
+        if (form.get("method") or "get").lower() == "post":
+            return self.charger("POST", action, data=champs)
+        response = self.session.get(action, params=champs, timeout=self.timeout)
+        response.raise_for_status()
+        return response.url, parser_html(response.content)
+
+    def selectionner_port(self, url_page, soup, port):
+        select = soup.find("select", attrs={"name": CHAMP_PORT})
+        if select is None:
+            raise ErreurScraping(f'Liste déroulante "{CHAMP_PORT}" non trouvée')
+        option = next((opt for opt in select.find_all("option") if opt.get_text(strip=True) == port), None)
+        if option is None:
+            raise ErreurScraping(f'Port "{port}" absent de la liste')
+
+        form = select.find_parent("form")
+        if form is None:
+            raise ErreurScraping('Formulaire de sélection du port non trouvé')
+        champs = champs_formulaire(form)
+        champs[CHAMP_PORT] = option.get("value", option.get_text(strip=True))
+        # Liste à postback automatique (WebForms) : le serveur attend l'événement
+        postback = cible_postback(select.get("onchange"))
+        if postback:
+            champs["__EVENTTARGET"], champs["__EVENTARGUMENT"] = postback
+        return self.soumettre(form, url_page, champs)
+
+    def recuperer_lignes(self, port=PORT_PAR_DEFAUT):
+        url_page, soup = self.charger("GET", self.url)
+        url_page, soup = self.selectionner_port(url_page, soup, port)
+
+        lignes = []
+        pages_vues = set()
+        for _ in range(self.max_pages):
+            lignes_page = extraire_lignes(soup)
+            # Une page identique à une page déjà lue signifie que la pagination boucle
+            signature = tuple(map(tuple, lignes_page))
+            if signature in pages_vues:
+                break
+            pages_vues.add(signature)
+            lignes.extend(lignes_page)
+
+            suivante = trouver_page_suivante(soup)
+            if suivante is None:
+                break
+            if suivante[0] == 'get':
+                url_page, soup = self.charger("GET", urljoin(url_page, suivante[1]))
+            else:
+                _, lien, cible, argument = suivante
+                form = lien.find_parent("form") or soup.find("form")
+                if form is None:
+                    break
+                champs = champs_formulaire(form)
+                champs["__EVENTTARGET"], champs["__EVENTARGUMENT"] = cible, argument
+                url_page, soup = self.soumettre(form, url_page, champs)
+        return lignes
+
+
+class SeleniumFetcher(FetcherANP):
+    """
+    Repli par navigateur headless. Selenium n'est importé qu'à l'utilisation
+    pour ne pas être une dépendance du serveur d'application.
+    """
+    nom = 'selenium'
+
+    def __init__(self, url=URL_ANP, attente=20, max_pages=MAX_PAGES):
+        self.url = url
+        self.attente = attente
+        self.max_pages = max_pages
+
+    def recuperer_lignes(self, port=PORT_PAR_DEFAUT):
+        from selenium import webdriver
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import Select, WebDriverWait
+
+        chrome_options = Options()
+        for argument in ("--headless", "--no-sandbox", "--disable-dev-shm-usage",
+                         "--disable-gpu", "--window-size=1920,1080", f"--user-agent={USER_AGENT}"):
+            chrome_options.add_argument(argument)
+
+        driver = webdriver.Chrome(options=chrome_options)
+        try:
+            driver.get(self.url)
+            wait = WebDriverWait(driver, self.attente)
+            dropdown = wait.until(EC.presence_of_element_located((By.NAME, CHAMP_PORT)))
+            Select(dropdown).select_by_visible_text(port)
+            # Attente sur le DOM plutôt qu'une pause fixe
+            wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
+
+            lignes = []
+            for _ in range(self.max_pages):
+                soup = parser_html(driver.page_source)
+                lignes.extend(extraire_lignes(soup))
+                if trouver_page_suivante(soup) is None:
+                    break
+                table = driver.find_element(By.TAG_NAME, "table")
+                boutons = [
+                    element for element in driver.find_elements(By.TAG_NAME, "a")
+                    if element.text.strip().lower() in TEXTES_SUIVANT and element.is_displayed()
+                ]
+                if not boutons:
+                    break
+                boutons[0].click()
+                try:
+                    wait.until(EC.staleness_of(table))
+                    wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
+                except TimeoutException:
+                    break
+            return lignes
+        finally:
+            driver.quit()
+
+
+BACKENDS = {
+    HttpFetcher.nom: HttpFetcher,
+    SeleniumFetcher.nom: SeleniumFetcher,
+}
+
+
+def recuperer_lignes_anp(port=PORT_PAR_DEFAUT, backends=None):
+    """
+    Essaie les backends dans l'ordre de settings.ANP_SCRAPER_BACKENDS
+    (HTTP puis Selenium par défaut) et renvoie (nom_backend, lignes) du
+    premier qui produit des lignes
+    """
+    backends = backends or [BACKENDS[nom]() for nom in getattr(settings, 'ANP_SCRAPER_BACKENDS', ['http', 'selenium'])]
+    erreurs = []
+    for backend in backends:
+        try:
+            lignes = backend.recuperer_lignes(port)
+        except ImportError as e:
+            erreurs.append(f"{backend.nom}: dépendance manquante ({e})")
+            continue
+        except Exception as e:
+            erreurs.append(f"{backend.nom}: {e}")
+            continue
+        if lignes:
+            return backend.nom, lignes
+        erreurs.append(f"{backend.nom}: aucune ligne")
+    raise ErreurScraping('; '.join(erreurs) or 'Aucun backend configuré')
@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def installer_fonctions_sql(using='default', **kwargs):
+    """Fonctions SQL utilitaires (periode_absence) lues par les requêtes brutes"""
+    from django.db import connections
+
+    from .periodes_absence import SQL_FONCTIONS_PERIODE
+
+    connexion = connections[using]
+    if connexion.vendor == 'postgresql':
+        with connexion.cursor() as cursor:
+            cursor.execute(SQL_FONCTIONS_PERIODE)
 
 
 class ManutentionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'manutention'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Réinstallées après chaque migrate, y compris la base de test créée sans migrations
+        post_migrate.connect(installer_fonctions_sql, sender=self, dispatch_uid='manutention_fonctions_sql')
@@ -0,0 +1,89 @@
+import functools
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+# Alias du cache des endpoints de référence (voir CACHES dans settings)
+ALIAS_CACHE = 'endpoints'
+TTL_PAR_DEFAUT = 300
+
+
+def get_cache():
+    return caches[ALIAS_CACHE] if ALIAS_CACHE in settings.CACHES else caches['default']
+
+
+def ttl_endpoint(nom):
+    config = getattr(settings, 'CACHE_ENDPOINTS_TTL', {})
+    return config.get(nom, config.get('default', TTL_PAR_DEFAUT))
+
+
+def _cle_version(table):
+    return f'version:{table}'
+
+
+def versions_tables(tables):
+    """Version courante de chaque table ; une écriture incrémente la version"""
+    cache = get_cache()
+    versions = cache.get_many([_cle_version(table) for table in tables])
+    return [versions.get(_cle_version(table), 0) for table in tables]
+
+
+def invalider(*tables):
+    """
+    Invalide toutes les réponses qui dépendent des tables données.
+    Les anciennes entrées ne sont plus lues et expirent d'elles-mêmes (TTL).
+    """
+    cache = get_cache()
+    for table in tables:
+        cle = _cle_version(table)
+        cache.add(cle, 0, None)
+        try:
+            cache.incr(cle)
+        except ValueError:
+            cache.set(cle, 1, None)
+
+
+def lire_ou_calculer(nom, tables, suffixe, calculer):
+    """
+    Retourne la valeur en cache pour (nom, suffixe) tant qu'aucune des tables
+    n'a été modifiée, sinon la recalcule avec calculer() et la met en cache
+    """
+    versions = '.'.join(str(version) for version in versions_tables(tables))
+    cle = f'valeur:{nom}:{versions}:{suffixe}'
+    cache = get_cache()
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = calculer()
+        cache.set(cle, valeur, ttl_endpoint(nom))
+    return valeur
+
+
+def cache_endpoint(*tables, nom=None):
+    """
+    Met en cache les réponses 200 d'une vue DRF (fonction ou action de ViewSet).
+
+    `tables` liste les tables lues par la vue : toute écriture signalée par
+    invalider(table) rend les réponses en cache obsolètes. Le TTL se configure
+    par vue dans settings.CACHE_ENDPOINTS_TTL.
+    """
+    def decorateur(vue):
+        nom_vue = nom or vue.__name__
+
+        @functools.wraps(vue)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if hasattr(arg, 'query_params'))
+            versions = '.'.join(str(version) for version in versions_tables(tables))
+            cle = f'endpoint:{nom_vue}:{versions}:{request.get_full_path()}'
+
+            cache = get_cache()
+            data = cache.get(cle)
+            if data is not None:
+                return Response(data)
+
+            response = vue(*args, **kwargs)
+            if response.status_code == 200:
+                cache.set(cle, response.data, ttl_endpoint(nom_vue))
+            return response
+        return wrapper
+    return decorateur
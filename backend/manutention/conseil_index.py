@@ -0,0 +1,281 @@
+"""
+Conseil d'index pour les tables historiques (managed = False).
+
+Les requêtes SQL brutes d'un module (manutention/views.py par défaut) sont
+extraites par analyse syntaxique : constantes SQL_* du module et chaînes
+littérales passées à cursor.execute(). Les fragments dynamiques ({filtre},
+f-strings) sont retirés et chaque %s devient un paramètre de requête
+préparée, exécutée avec une valeur d'exemple de son type.
+
+Chaque requête passe par EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) dans une
+transaction annulée : les écritures (UPDATE, DELETE...) ne sont pas
+conservées. Les Seq Scan avec filtre sont signalés et les colonnes du filtre
+(égalités d'abord, puis intervalles) donnent un index proposé, sauf s'il est
+déjà couvert par un index existant. Le script produit utilise
+CREATE INDEX CONCURRENTLY IF NOT EXISTS : il s'applique à part des migrations
+Django, sans bloquer les écritures, et peut être rejoué.
+"""
+
+import ast
+import json
+import re
+import unicodedata
+from collections import OrderedDict
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+DEBUT_SQL = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+FRAGMENT_FORMAT = re.compile(r'\{\w*\}')
+
+# Colonne (éventuellement castée) suivie d'un opérateur, telle qu'affichée dans le Filter d'un plan
+CONDITION = re.compile(
+    r'\(*"?(\w+)"?\)*(?:::[\w ]+(?:\[\])?\)*)?\s+(=|<=|>=|<|>)\s'
+)
+OPERATEURS_EGALITE = ('=',)
+
+# Valeurs d'exemple par type de paramètre déduit par PostgreSQL
+VALEURS_EXEMPLE = (
+    (lambda t: t.endswith('[]'), "'{}'"),
+    (lambda t: t == 'date', 'CURRENT_DATE'),
+    (lambda t: t.startswith('timestamp'), 'NOW()'),
+    (lambda t: t in ('smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision'), '1'),
+    (lambda t: t == 'boolean', 'true'),
+    (lambda t: t in ('json', 'jsonb'), "'{}'"),
+    (lambda t: t in ('text', 'character varying', 'character', 'unknown'), "''"),
+)
+
+COLONNES_MAX = 3
+
+
+def _texte_sql(noeud):
+    """Texte d'une chaîne littérale ou f-string (parties dynamiques retirées), sinon None"""
+    if isinstance(noeud, ast.Constant) and isinstance(noeud.value, str):
+        return noeud.value
+    if isinstance(noeud, ast.JoinedStr):
+        return ''.join(
+            partie.value for partie in noeud.values
+            if isinstance(partie, ast.Constant) and isinstance(partie.value, str)
+        )
+    return None
+
+
+class _ExtracteurRequetes(ast.NodeVisitor):
+    def __init__(self):
+        self.requetes = []
+        self.fonctions = []
+
+    def ajouter(self, texte, origine, ligne):
+        if texte and DEBUT_SQL.match(texte):
+            self.requetes.append({'origine': origine, 'ligne': ligne, 'sql': FRAGMENT_FORMAT.sub('', texte)})
+
+    def visit_Assign(self, noeud):
+        if not self.fonctions:
+            for cible in noeud.targets:
+                if isinstance(cible, ast.Name) and cible.id.startswith('SQL_'):
+                    self.ajouter(_texte_sql(noeud.value), cible.id, noeud.lineno)
+        self.generic_visit(noeud)
+
+    def visit_FunctionDef(self, noeud):
+        self.fonctions.append(noeud.name)
+        self.generic_visit(noeud)
+        self.fonctions.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, noeud):
+        if isinstance(noeud.func, ast.Attribute) and noeud.func.attr == 'execute' and noeud.args:
+            origine = self.fonctions[-1] if self.fonctions else '<module>'
+            self.ajouter(_texte_sql(noeud.args[0]), origine, noeud.lineno)
+        self.generic_visit(noeud)
+
+
+def extraire_requetes(chemin):
+    """Requêtes SQL brutes d'un fichier Python : [{'origine', 'ligne', 'sql'}]"""
+    with open(chemin, encoding='utf-8') as fichier:
+        arbre = ast.parse(fichier.read(), filename=str(chemin))
+    extracteur = _ExtracteurRequetes()
+    extracteur.visit(arbre)
+    return extracteur.requetes
+
+
+def _parametres_numerotes(sql):
+    """%s -> $1, $2... et %% -> % (la requête est envoyée sans interpolation)"""
+    compteur = iter(range(1, sql.count('%s') + 1))
+    sql = re.sub(r'%s', lambda _: f'${next(compteur)}', sql)
+    return sql.replace('%%', '%')
+
+
+def _valeur_exemple(type_parametre):
+    for accepte, valeur in VALEURS_EXEMPLE:
+        if accepte(type_parametre):
+            return f'{valeur}::{type_parametre}'
+    return f'NULL::{type_parametre}'
+
+
+def expliquer(sql, nom='conseil_index'):
+    """
+    Plan JSON de EXPLAIN (ANALYZE, BUFFERS) de la requête, paramètres remplis
+    par des valeurs d'exemple. L'exécution est toujours annulée.
+    """
+    preparee = False
+    with connection.cursor() as cursor:
+        try:
+            with transaction.atomic():
+                cursor.execute(f'PREPARE {nom} AS {_parametres_numerotes(sql)}')
+                preparee = True
+                cursor.execute('SELECT parameter_types::text[] FROM pg_prepared_statements WHERE name = %s', [nom])
+                types_parametres = cursor.fetchone()[0] or []
+                valeurs = ', '.join(_valeur_exemple(type_parametre) for type_parametre in types_parametres)
+                cursor.execute(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) EXECUTE {nom}{f'({valeurs})' if valeurs else ''}"
+                )
+                plan = cursor.fetchone()[0]
+                # Annule les écritures exécutées par ANALYZE (UPDATE, DELETE...)
+                transaction.set_rollback(True)
+        finally:
+            # Une requête préparée survit à l'annulation de la transaction
+            if preparee:
+                cursor.execute(f'DEALLOCATE {nom}')
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def scans_sequentiels(noeud):
+    """Nœuds Seq Scan filtrés du plan (récursif)"""
+    if isinstance(noeud, list):
+        noeud = noeud[0]['Plan']
+    scans = []
+    if noeud.get('Node Type') == 'Seq Scan' and noeud.get('Filter'):
+        scans.append({
+            'table': noeud['Relation Name'],
+            'filtre': noeud['Filter'],
+            'lignes': noeud.get('Actual Rows', 0),
+            'lignes_ecartees': noeud.get('Rows Removed by Filter', 0),
+            'boucles': noeud.get('Actual Loops', 1),
+            'blocs_lus': noeud.get('Shared Hit Blocks', 0) + noeud.get('Shared Read Blocks', 0),
+        })
+    for enfant in noeud.get('Plans', []):
+        scans.extend(scans_sequentiels(enfant))
+    return scans
+
+
+def colonnes_filtre(filtre, colonnes_table):
+    """Colonnes indexables du filtre : égalités puis comparaisons d'intervalle"""
+    egalites, intervalles = [], []
+    for colonne, operateur in CONDITION.findall(filtre):
+        if colonne not in colonnes_table:
+            continue
+        cible = egalites if operateur in OPERATEURS_EGALITE else intervalles
+        if colonne not in egalites and colonne not in intervalles:
+            cible.append(colonne)
+    return (egalites + intervalles)[:COLONNES_MAX]
+
+
+def _colonnes_tables(tables):
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT table_name, array_agg(column_name::text)
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ANY(%s)
+            GROUP BY table_name
+        ''', [list(tables)])
+        return {table: set(colonnes) for table, colonnes in cursor.fetchall()}
+
+
+def _index_existants(tables):
+    """Colonnes (dans l'ordre) des index valides de chaque table"""
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT c.relname, array_agg(a.attname::text ORDER BY k.ordre)
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indrelid
+            JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ordre) ON true
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+            WHERE c.relname = ANY(%s) AND c.relnamespace = current_schema()::regnamespace AND i.indisvalid
+            GROUP BY i.indexrelid, c.relname
+        ''', [list(tables)])
+        index = {}
+        for table, colonnes in cursor.fetchall():
+            index.setdefault(table, []).append(colonnes)
+        return index
+
+
+def _couvert(colonnes, index_table):
+    return any(existant[:len(colonnes)] == colonnes for existant in index_table)
+
+
+def analyser_requetes(requetes, timeout_ms=30000):
+    """
+    Explique chaque requête (transaction annulée) et retourne (resultats, propositions).
+    resultats : une entrée par requête avec ses Seq Scan filtrés ou son erreur.
+    propositions : {(table, colonnes): [scans motivant l'index]}, hors index existants.
+    """
+    resultats = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s', [timeout_ms])
+        for numero, requete in enumerate(requetes):
+            resultat = dict(requete, scans=[], erreur=None)
+            try:
+                resultat['scans'] = scans_sequentiels(expliquer(requete['sql'], f'conseil_index_{numero}'))
+            except DatabaseError as e:
+                resultat['erreur'] = str(e).strip().splitlines()[0]
+            resultats.append(resultat)
+        transaction.set_rollback(True)
+
+    tables = {scan['table'] for resultat in resultats for scan in resultat['scans']}
+    colonnes_tables = _colonnes_tables(tables) if tables else {}
+    index_existants = _index_existants(tables) if tables else {}
+
+    propositions = OrderedDict()
+    for resultat in resultats:
+        for scan in resultat['scans']:
+            colonnes = colonnes_filtre(scan['filtre'], colonnes_tables.get(scan['table'], set()))
+            scan['colonnes'] = colonnes
+            if colonnes and not _couvert(colonnes, index_existants.get(scan['table'], [])):
+                propositions.setdefault((scan['table'], tuple(colonnes)), []).append(
+                    dict(scan, origine=resultat['origine'], ligne=resultat['ligne'])
+                )
+    # Un index (a, b) sert aussi les filtres sur (a) : on ne garde que le plus large
+    for table, colonnes in list(propositions):
+        if any(
+            autre_table == table and len(autres) > len(colonnes) and autres[:len(colonnes)] == colonnes
+            for autre_table, autres in propositions
+        ):
+            motifs = propositions.pop((table, colonnes))
+            plus_large = max(
+                (cle for cle in propositions if cle[0] == table and cle[1][:len(colonnes)] == colonnes),
+                key=lambda cle: len(cle[1]),
+            )
+            propositions[plus_large].extend(motifs)
+    return resultats, propositions
+
+
+def nom_index(table, colonnes):
+    nom = '_'.join([table, *colonnes, 'idx'])
+    nom = unicodedata.normalize('NFKD', nom).encode('ascii', 'ignore').decode()
+    return nom[:connection.ops.max_name_length()]
+
+
+def script_index(propositions):
+    """Script SQL idempotent des index proposés, à exécuter hors transaction"""
+    lignes = [
+        f"-- Index conseillés par manage.py conseiller_index ({timezone.localtime():%Y-%m-%d %H:%M})",
+        "-- CREATE INDEX CONCURRENTLY ne bloque pas les écritures mais refuse les blocs transactionnels :",
+        "-- exécuter avec psql -f, sans --single-transaction. Un index resté INVALID après un échec",
+        "-- doit être supprimé (DROP INDEX CONCURRENTLY) avant de relancer le script.",
+    ]
+    quote = connection.ops.quote_name
+    for (table, colonnes), motifs in propositions.items():
+        lignes.append('')
+        lignes.append(f"-- {table} : Seq Scan filtré dans {len(motifs)} requête(s)")
+        for motif in motifs:
+            lignes.append(
+                f"--   {motif['origine']} (l.{motif['ligne']}) : {motif['filtre']}, "
+                f"{motif['lignes_ecartees']} ligne(s) écartée(s), {motif['blocs_lus']} bloc(s)"
+            )
+        lignes.append(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(nom_index(table, colonnes))} "
+            f"ON {quote(table)} ({', '.join(quote(colonne) for colonne in colonnes)});"
+        )
+    return '\n'.join(lignes) + '\n'
@@ -0,0 +1,123 @@
+"""
+Détection des absences non déclarées, shift par shift.
+
+Pour les shifts terminés d'une période, une seule requête ensembliste :
+    attendus  = membres des équipes affectées au shift (affectations x info_equipe)
+                + conducteurs affectés nominativement (affectations_conducteurs)
+    excusés   = absences déclarées (non refusées) chevauchant le shift
+    pointés   = heures saisies dans cumul_heures le jour du shift
+    manquants = attendus EXCEPT excusés EXCEPT pointés
+Les manquants sont insérés dans absences_non_déclarées (une ligne par
+matricule et par shift, couvrant le shift) ; l'index unique
+(matricule, id_shift) rend la détection idempotente (ON CONFLICT DO NOTHING),
+elle peut donc être relancée sur une période qui se recouvre.
+"""
+
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .index_absences import publier_ecriture
+from .models import Shifts
+from .periodes_absence import chevauchement
+from .presence import recalculer_presence
+
+SQL_DETECTION = f'''
+    WITH shifts AS (
+        SELECT id_shift, date_debut_shift, date_fin_shift
+        FROM {{table_shifts}}
+        WHERE date_fin_shift >= %s AND date_fin_shift < %s AND date_fin_shift <= NOW()
+    ),
+    attendus AS (
+        SELECT s.id_shift, ie.matricule
+        FROM shifts s
+        JOIN affectations af ON af.id_shift = s.id_shift
+        JOIN info_equipe ie ON ie.id_equipe = af.id_equipe
+        WHERE ie.matricule IS NOT NULL
+        UNION
+        SELECT s.id_shift, ac.matricule
+        FROM shifts s
+        JOIN affectations_conducteurs ac ON ac.id_shift = s.id_shift
+    ),
+    excuses AS (
+        SELECT s.id_shift, a.matricule
+        FROM shifts s
+        JOIN absences a ON {chevauchement('a', 's.date_debut_shift', 's.date_fin_shift')}
+        WHERE a.etat IS DISTINCT FROM 'refusée'
+    ),
+    pointes AS (
+        SELECT s.id_shift, ch.matricule
+        FROM shifts s
+        JOIN cumul_heures ch
+          ON ch.date BETWEEN s.date_debut_shift::date AND s.date_fin_shift::date
+         AND ch.heure_par_jour > 0
+    ),
+    manquants AS (
+        SELECT id_shift, matricule FROM attendus
+        EXCEPT SELECT id_shift, matricule FROM excuses
+        EXCEPT SELECT id_shift, matricule FROM pointes
+    )
+    INSERT INTO "absences_non_déclarées" (matricule, id_shift, date_debut_abs, date_fin_abs)
+    SELECT m.matricule, m.id_shift, s.date_debut_shift, s.date_fin_shift
+    FROM manquants m
+    JOIN shifts s ON s.id_shift = m.id_shift
+    ON CONFLICT (matricule, id_shift) DO NOTHING
+    RETURNING matricule, date_debut_abs, date_fin_abs
+'''
+
+
+def detecter_absences_non_declarees(debut, fin):
+    """
+    Détecte les absences non déclarées des shifts terminés dans [debut, fin[
+    (datetimes). Retourne les absences créées : (matricule, debut, fin).
+    """
+    table_shifts = connection.ops.quote_name(Shifts._meta.db_table)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_DETECTION.format(table_shifts=table_shifts), [debut, fin])
+            creees = cursor.fetchall()
+        if creees:
+            # Insertion SQL sans signaux : un seul recalcul de présence pour tous les jours touchés
+            recalculer_presence(
+                timezone.localtime(min(debut_abs for _, debut_abs, _ in creees)).date(),
+                timezone.localtime(max(fin_abs for _, _, fin_abs in creees)).date(),
+                {matricule for matricule, _, _ in creees},
+            )
+            publier_ecriture(matricule for matricule, _, _ in creees)
+    return creees
+
+
+def detecter_derniers_jours(jours=2, maintenant=None):
+    """Détection planifiée : shifts terminés depuis `jours` jours"""
+    maintenant = maintenant or timezone.now()
+    return detecter_absences_non_declarees(maintenant - timedelta(days=jours), maintenant)
+
+
+def lire_absences_non_declarees(debut, fin, id_shift=None):
+    """Absences non déclarées commençant entre les jours debut et fin, avec l'identité de l'employé"""
+    filtre, params = ('', [])
+    if id_shift is not None:
+        filtre, params = ('AND n.id_shift = %s', [id_shift])
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            SELECT n.id, n.matricule, n.id_shift, n.date_debut_abs, n.date_fin_abs, ie.nom, ie.prenom, ie.fonction
+            FROM "absences_non_déclarées" n
+            LEFT JOIN info_equipe ie ON ie.matricule = n.matricule
+            WHERE n.date_debut_abs >= %s AND n.date_debut_abs < %s {filtre}
+            ORDER BY n.date_debut_abs DESC, n.matricule
+        ''', [debut, fin + timedelta(days=1)] + params)
+        lignes = cursor.fetchall()
+    return [
+        {
+            'id': ligne[0],
+            'matricule': ligne[1],
+            'id_shift': ligne[2],
+            'date_debut_abs': ligne[3].isoformat() if ligne[3] else None,
+            'date_fin_abs': ligne[4].isoformat() if ligne[4] else None,
+            'nom': ligne[5] or 'Non renseigné',
+            'prenom': ligne[6] or 'Non renseigné',
+            'fonction': ligne[7] or 'Non renseigné',
+        }
+        for ligne in lignes
+    ]
@@ -0,0 +1,302 @@
+"""
+Bus d'événements temps réel (alertes, présence) pour les flux SSE.
+
+Un événement est un dict {'canal', 'type', 'donnees'}. publier() l'émet par
+NOTIFY sur le canal PostgreSQL CANAL_PG : il n'est délivré qu'au commit de la
+transaction, et chaque processus (worker ASGI) le reçoit via un unique thread
+LISTEN qui le diffuse à ses abonnés locaux. Les triggers SQL (alertes_heures)
+publient de la même façon avec pg_notify.
+
+Sans LISTEN (settings.EVENEMENTS['LISTEN'] = False, processus unique), les
+événements sont diffusés localement après le commit.
+
+PostgreSQL refuse les charges NOTIFY de 8000 octets ou plus : au-delà de
+TAILLE_MAX_NOTIFY, les listes de l'événement (matricules...) sont retirées et
+remplacées par 'volumineux': True, signal pour les abonnés de tout relire.
+
+publier_journalise() enregistre en plus l'événement dans la table evenements :
+son id est transmis au client SSE, qui peut reprendre après une coupure sans
+rien perdre (en-tête Last-Event-ID).
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from .models import Evenement
+
+logger = logging.getLogger(__name__)
+
+# Canal NOTIFY partagé par Python et les triggers SQL
+CANAL_PG = 'evenements_hosting'
+
+# Octets, sous la limite de 8000 de PostgreSQL pour une charge NOTIFY
+TAILLE_MAX_NOTIFY = 7900
+
+CONFIGURATION_DEFAUT = {
+    'LISTEN': True,
+    # Événements en attente par abonné avant de lui demander une resynchronisation
+    'FILE_MAX': 100,
+    # Secondes entre deux commentaires keep-alive du flux SSE
+    'HEARTBEAT': 15,
+    # Secondes avant une nouvelle tentative de connexion LISTEN
+    'DELAI_RECONNEXION': 2,
+    # Événements rejoués au plus à la reconnexion ; au-delà le client se resynchronise
+    'REPRISE_MAX': 1000,
+}
+
+
+def configuration():
+    return {**CONFIGURATION_DEFAUT, **getattr(settings, 'EVENEMENTS', {})}
+
+
+class Abonnement:
+    """File asyncio d'un client, alimentée depuis n'importe quel thread"""
+
+    def __init__(self, canaux, loop, taille_max):
+        self.canaux = frozenset(canaux)
+        self.loop = loop
+        self.file = asyncio.Queue(maxsize=taille_max)
+        # Des événements ont été perdus (client trop lent) : il doit tout relire
+        self.debordement = False
+
+    def _deposer(self, evenement):
+        try:
+            self.file.put_nowait(evenement)
+        except asyncio.QueueFull:
+            self.debordement = True
+
+    def deposer(self, evenement):
+        self.loop.call_soon_threadsafe(self._deposer, evenement)
+
+    async def suivant(self, timeout):
+        """Prochain événement, ou None si rien n'arrive avant timeout"""
+        try:
+            return await asyncio.wait_for(self.file.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class AbonnementRappel:
+    """Abonnement interne au processus : le rappel est appelé dans le thread qui diffuse"""
+
+    def __init__(self, canaux, rappel):
+        self.canaux = frozenset(canaux)
+        self.rappel = rappel
+
+    def deposer(self, evenement):
+        try:
+            self.rappel(evenement)
+        except Exception:
+            logger.exception("Rappel d'événement en échec")
+
+
+class BusEvenements:
+    def __init__(self):
+        self._abonnements = set()
+        # Rappels internes, distincts des clients SSE comptés par nombre_abonnes()
+        self._rappels = set()
+        self._verrou = threading.Lock()
+
+    def abonner(self, canaux):
+        """À appeler depuis la boucle asyncio du client"""
+        abonnement = Abonnement(canaux, asyncio.get_running_loop(), configuration()['FILE_MAX'])
+        with self._verrou:
+            self._abonnements.add(abonnement)
+        if configuration()['LISTEN']:
+            demarrer_ecoute()
+        return abonnement
+
+    def abonner_rappel(self, canaux, rappel):
+        """Abonnement synchrone (caches du processus), hors boucle asyncio"""
+        abonnement = AbonnementRappel(canaux, rappel)
+        with self._verrou:
+            self._rappels.add(abonnement)
+        if configuration()['LISTEN']:
+            demarrer_ecoute()
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            self._abonnements.discard(abonnement)
+            self._rappels.discard(abonnement)
+
+    def diffuser(self, evenement):
+        with self._verrou:
+            abonnements = list(self._rappels) + list(self._abonnements)
+        for abonnement in abonnements:
+            if evenement.get('canal') in abonnement.canaux:
+                try:
+                    abonnement.deposer(evenement)
+                except RuntimeError:
+                    # Boucle du client fermée : abonnement abandonné
+                    self.desabonner(abonnement)
+
+    def nombre_abonnes(self):
+        with self._verrou:
+            return len(self._abonnements)
+
+
+bus = BusEvenements()
+
+
+def charge_notify(evenement):
+    """Charge JSON de NOTIFY, réduite si elle dépasse TAILLE_MAX_NOTIFY"""
+    charge = json.dumps(evenement, default=str)
+    if len(charge.encode()) <= TAILLE_MAX_NOTIFY:
+        return charge
+    donnees = {
+        cle: valeur for cle, valeur in (evenement.get('donnees') or {}).items()
+        if not isinstance(valeur, (list, tuple, set, dict))
+    }
+    return json.dumps({**evenement, 'donnees': {**donnees, 'volumineux': True}}, default=str)
+
+
+def _notifier(charge):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [CANAL_PG, charge])
+
+
+def publier(canal, type_evenement, donnees, id_evenement=None):
+    """Publie un événement au commit de la transaction courante"""
+    evenement = {'canal': canal, 'type': type_evenement, 'donnees': donnees}
+    if id_evenement is not None:
+        evenement['id'] = id_evenement
+    if not configuration()['LISTEN']:
+        transaction.on_commit(lambda: bus.diffuser(evenement))
+    elif id_evenement is not None:
+        # Événement journalisé : NOTIFY sous le verrou du journal, pour que
+        # les ids arrivent aux clients dans l'ordre croissant
+        _notifier(charge_notify(evenement))
+    else:
+        # Après le commit : une charge refusée n'annule pas l'écriture publiée
+        charge = charge_notify(evenement)
+        transaction.on_commit(lambda: _notifier(charge), robust=True)
+
+
+def publier_journalise(canal, type_evenement, donnees):
+    """
+    Enregistre l'événement dans le journal puis le publie avec son id.
+    Le verrou consultatif sérialise les écritures du journal jusqu'au commit :
+    les ids deviennent visibles dans l'ordre croissant, sans trou rattrapé
+    plus tard par une transaction plus lente.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('evenements'))")
+        evenement = Evenement.objects.create(canal=canal, type_evenement=type_evenement, donnees=donnees)
+        publier(canal, type_evenement, donnees, id_evenement=evenement.id)
+    return evenement
+
+
+def dernier_id_journal():
+    return Evenement.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def lire_journal(canaux, depuis, limite):
+    """
+    Événements des canaux d'id > depuis, au plus `limite`. Retourne
+    (evenements, complet) ; complet est faux si la reprise est impossible
+    (trop d'événements manqués ou journal purgé depuis) et que le client
+    doit tout relire.
+    """
+    if depuis and not Evenement.objects.filter(id__lte=depuis).exists() and Evenement.objects.exists():
+        return [], False
+    lignes = list(
+        Evenement.objects.filter(canal__in=canaux, id__gt=depuis)
+        .order_by('id')
+        .values('id', 'canal', 'type_evenement', 'donnees')[:limite + 1]
+    )
+    evenements = [
+        {'id': ligne['id'], 'canal': ligne['canal'], 'type': ligne['type_evenement'], 'donnees': ligne['donnees']}
+        for ligne in lignes[:limite]
+    ]
+    return evenements, len(lignes) <= limite
+
+
+def purger_journal(avant):
+    """Supprime les événements antérieurs à `avant` ; retourne le nombre supprimé"""
+    return Evenement.objects.filter(date_creation__lt=avant).delete()[0]
+
+
+class EcouteurPostgres(threading.Thread):
+    """Thread unique par processus : LISTEN sur CANAL_PG et diffusion locale"""
+
+    def __init__(self):
+        super().__init__(name='evenements-listen', daemon=True)
+        self.arret = threading.Event()
+        self.pret = threading.Event()
+        # Numéro de la connexion LISTEN en cours, incrémenté à chaque reconnexion
+        self.connexions = 0
+
+    def run(self):
+        delai = configuration()['DELAI_RECONNEXION']
+        while not self.arret.is_set():
+            # Connexion dédiée, hors de la gestion des connexions par requête
+            wrapper = connections.create_connection('default')
+            try:
+                wrapper.ensure_connection()
+                wrapper.set_autocommit(True)
+                with wrapper.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CANAL_PG}')
+                self.connexions += 1
+                self.pret.set()
+                self.ecouter(wrapper.connection)
+            except Exception:
+                self.pret.clear()
+                logger.exception("Écoute des événements PostgreSQL interrompue")
+                self.arret.wait(delai)
+            finally:
+                wrapper.close()
+
+    def ecouter(self, pg):
+        while not self.arret.is_set():
+            if select.select([pg], [], [], 1.0) == ([], [], []):
+                continue
+            pg.poll()
+            while pg.notifies:
+                notification = pg.notifies.pop(0)
+                try:
+                    bus.diffuser(json.loads(notification.payload))
+                except ValueError:
+                    logger.warning("Notification illisible ignorée: %s", notification.payload[:200])
+
+
+_ecouteur = None
+_verrou_ecouteur = threading.Lock()
+
+
+def demarrer_ecoute():
+    """Démarre le thread LISTEN au premier abonnement du processus"""
+    global _ecouteur
+    with _verrou_ecouteur:
+        if _ecouteur is None or not _ecouteur.is_alive():
+            _ecouteur = EcouteurPostgres()
+            _ecouteur.start()
+        return _ecouteur
+
+
+def connexion_ecoute():
+    """
+    Identifiant de la connexion LISTEN en cours du processus, None si elle
+    n'est pas établie. Les notifications émises hors connexion sont perdues :
+    un cache qui en dépend se recharge quand cet identifiant change.
+    """
+    ecouteur = _ecouteur
+    if ecouteur is None or not ecouteur.is_alive() or not ecouteur.pret.is_set():
+        return None
+    return (id(ecouteur), ecouteur.connexions)
+
+
+def arreter_ecoute():
+    global _ecouteur
+    with _verrou_ecouteur:
+        if _ecouteur is not None:
+            _ecouteur.arret.set()
+            _ecouteur.join(timeout=5)
+            _ecouteur = None
@@ -0,0 +1,127 @@
+import csv
+import json
+from contextlib import closing
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+# Nombre de lignes lues par aller-retour sur le curseur serveur
+TAILLE_LOT_EXPORT = 2000
+
+FORMATS_EXPORT = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def serialiser_valeur(valeur):
+    return valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur
+
+
+def lignes_curseur_serveur(sql, params=None, taille_lot=TAILLE_LOT_EXPORT):
+    """
+    Exécute la requête sur un curseur nommé PostgreSQL et produit d'abord la
+    liste des colonnes puis les lignes, lot par lot (fetchmany) : la mémoire
+    reste constante quelle que soit la taille du résultat.
+
+    Le curseur est ouvert dans une transaction : en autocommit, Django le
+    déclare WITH HOLD et PostgreSQL matérialise tout le résultat au premier
+    COMMIT. La fermeture du générateur (client déconnecté) ferme le curseur
+    et termine la transaction.
+    """
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        lot = cursor.fetchmany(taille_lot)
+        # Avec un curseur nommé, la description n'est connue qu'après le premier fetch
+        yield [col[0] for col in cursor.description]
+        while lot:
+            yield from lot
+            lot = cursor.fetchmany(taille_lot)
+
+
+def generer_ndjson(lignes):
+    # closing : la fermeture de la réponse se propage jusqu'au curseur serveur
+    with closing(lignes):
+        colonnes = next(lignes)
+        for ligne in lignes:
+            objet = {col: serialiser_valeur(val) for col, val in zip(colonnes, ligne)}
+            yield json.dumps(objet, ensure_ascii=False) + '\n'
+
+
+class _Tampon:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire"""
+
+    def write(self, valeur):
+        return valeur
+
+
+def generer_csv(lignes):
+    writer = csv.writer(_Tampon())
+    with closing(lignes):
+        for ligne in lignes:
+            yield writer.writerow([serialiser_valeur(val) for val in ligne])
+
+
+async def generer_async(generateur, taille_lot=TAILLE_LOT_EXPORT):
+    """
+    Itérateur asynchrone sur un générateur d'export synchrone, pour ASGI :
+    Django y consommerait un itérateur synchrone en entier (sync_to_async(list))
+    avant d'envoyer le premier octet. Chaque lot est lu par sync_to_async
+    thread_sensitive, donc dans le même thread et sur la même connexion que
+    le curseur serveur et sa transaction.
+    """
+    lot_suivant = sync_to_async(lambda: ''.join(islice(generateur, taille_lot)))
+    try:
+        while lot := await lot_suivant():
+            yield lot
+    finally:
+        # Fin du flux ou client déconnecté : curseur fermé, transaction terminée
+        await sync_to_async(generateur.close)()
+
+
+def reponse_export_streaming(sql, params, format_export, nom_fichier, asynchrone=False):
+    """
+    StreamingHttpResponse NDJSON ou CSV alimentée par un curseur serveur.
+    `asynchrone` : requête servie par ASGI, le contenu est un itérateur asynchrone.
+    """
+    lignes = lignes_curseur_serveur(sql, params)
+    generateur = generer_csv(lignes) if format_export == 'csv' else generer_ndjson(lignes)
+    if asynchrone:
+        generateur = generer_async(generateur)
+    response = StreamingHttpResponse(generateur, content_type=FORMATS_EXPORT[format_export])
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}.{format_export}"'
+    return response
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Permet la négociation de ?format=ndjson (utilisé pour les réponses d'erreur)"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        objets = data if isinstance(data, list) else [data]
+        return ''.join(json.dumps(objet, ensure_ascii=False, default=str) + '\n' for objet in objets)
+
+
+class CSVRenderer(BaseRenderer):
+    """Permet la négociation de ?format=csv (utilisé pour les réponses d'erreur)"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        objets = data if isinstance(data, list) else [data]
+        if not objets:
+            return ''
+        colonnes = list(objets[0].keys())
+        writer = csv.writer(_Tampon())
+        return writer.writerow(colonnes) + ''.join(
+            writer.writerow([serialiser_valeur(objet.get(col)) for col in colonnes]) for objet in objets
+        )
+
+
+RENDERERS_EXPORT = [NDJSONRenderer, CSVRenderer]
@@ -0,0 +1,132 @@
+"""
+Flux Server-Sent Events alimentés par le bus d'événements (manutention.evenements).
+
+Vues Django asynchrones (DRF ne gère pas les vues async) : une connexion
+ouverte ne coûte qu'une coroutine et une file en mémoire, aucune requête
+SQL en dehors de la reprise sur le journal à la connexion. Elles doivent être servies par le serveur ASGI (uvicorn asgi:application).
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .evenements import bus, configuration, dernier_id_journal, lire_journal
+
+CANAUX_RH = ('alertes', 'presence')
+CANAUX_ENGINS = ('engins',)
+
+
+def formater_sse(evenement):
+    lignes = []
+    if evenement.get('id') is not None:
+        lignes.append(f"id: {evenement['id']}")
+    lignes.append(f"event: {evenement['canal']}")
+    lignes.append(f'data: {json.dumps(evenement, default=str)}')
+    return '\n'.join(lignes) + '\n\n'
+
+
+def evenement_resync(motif, id_evenement=None):
+    return formater_sse({'canal': 'resync', 'type': motif, 'donnees': {}, 'id': id_evenement})
+
+
+async def flux_evenements(canaux, journal=False, depuis=None):
+    """
+    Générateur SSE : événements des canaux, keep-alive et resynchronisation.
+
+    Avec journal=True, les événements portent l'id du journal ; `depuis`
+    (Last-Event-ID du client) rejoue d'abord les événements manqués. Les
+    événements reçus en direct et déjà rejoués sont ignorés.
+    """
+    config = configuration()
+    # Abonnement avant la relecture du journal : rien ne se perd entre les deux
+    abonnement = bus.abonner(canaux)
+    dernier_id = depuis or 0
+    try:
+        # Délai de reconnexion conseillé à EventSource, puis confirmation d'abonnement
+        entete = 'retry: 3000\n'
+        if journal and depuis is None:
+            # Point de reprise initial du client
+            dernier_id = await sync_to_async(dernier_id_journal)()
+            entete += f'id: {dernier_id}\n'
+        yield entete + ': connecte\n\n'
+
+        if journal and depuis is not None:
+            manques, complet = await sync_to_async(lire_journal)(canaux, depuis, config['REPRISE_MAX'])
+            if complet:
+                for evenement in manques:
+                    yield formater_sse(evenement)
+                    dernier_id = evenement['id']
+            else:
+                dernier_id = await sync_to_async(dernier_id_journal)()
+                yield evenement_resync('reprise_impossible', dernier_id)
+
+        while True:
+            evenement = await abonnement.suivant(config['HEARTBEAT'])
+            if abonnement.debordement:
+                abonnement.debordement = False
+                yield evenement_resync('debordement')
+            if evenement is None:
+                yield ': ping\n\n'
+            elif journal and evenement.get('id', 0) <= dernier_id:
+                continue
+            else:
+                if journal:
+                    dernier_id = evenement['id']
+                yield formater_sse(evenement)
+    finally:
+        bus.desabonner(abonnement)
+
+
+def reponse_sse(flux):
+    response = StreamingHttpResponse(flux, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un proxy nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def reponse_wsgi():
+    # Sous WSGI le flux infini bloquerait un worker : le client garde son chargement ponctuel
+    return JsonResponse({'error': 'Flux disponible uniquement via le serveur ASGI'}, status=501)
+
+
+def lire_canaux(request, autorises):
+    demandes = request.GET.get('canaux')
+    if not demandes:
+        return set(autorises)
+    return {canal for canal in demandes.split(',') if canal in autorises}
+
+
+@require_GET
+async def flux_rh(request):
+    """
+    Flux SSE des alertes d'heures (ouverture / mise à jour / fermeture) et des
+    changements de présence
+    - ?canaux=alertes,presence (tous par défaut)
+    """
+    if not isinstance(request, ASGIRequest):
+        return reponse_wsgi()
+    canaux = lire_canaux(request, CANAUX_RH)
+    if not canaux:
+        return JsonResponse({'error': f"Paramètre canaux invalide (valeurs: {', '.join(CANAUX_RH)})"}, status=400)
+    return reponse_sse(flux_evenements(canaux))
+
+
+@require_GET
+async def flux_engins(request):
+    """
+    Flux SSE des changements d'état des engins (Kanban Dev Tech)
+    - en-tête Last-Event-ID (ou ?depuis=<id>) : reprise après le dernier événement reçu
+    """
+    if not isinstance(request, ASGIRequest):
+        return reponse_wsgi()
+    depuis = request.headers.get('Last-Event-ID') or request.GET.get('depuis')
+    if depuis is not None:
+        try:
+            depuis = int(depuis)
+        except ValueError:
+            return JsonResponse({'error': 'Last-Event-ID invalide (entier attendu)'}, status=400)
+    return reponse_sse(flux_evenements(CANAUX_ENGINS, journal=True, depuis=depuis))
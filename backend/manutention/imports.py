@@ -0,0 +1,467 @@
+"""
+Import en masse des absences et du personnel (CSV, XLSX ou JSON).
+
+Absences :
+1. Le fichier est lu en lignes (un dict par ligne, clés = en-têtes).
+2. Validation en mémoire : matricules contre un seul ensemble préchargé
+   depuis info_equipe, dates, état, chevauchements avec les absences
+   existantes et entre lignes du fichier (index_absences).
+3. Les lignes valides sont chargées par COPY dans une table temporaire puis
+   fusionnées dans absences en une transaction. La fusion écarte une ligne
+   qui chevauche une absence écrite entre-temps par un autre worker (index
+   GiST de periode_absence), l'index en mémoire pouvant être en retard.
+4. Un seul recalcul de présence et d'alertes pour les jours et matricules
+   importés (l'INSERT ne déclenche pas les signaux).
+
+Personnel (info_equipe, conducteurs et dockers) : équipes validées contre un
+seul ensemble préchargé, puis un unique INSERT ... ON CONFLICT (matricule)
+qui ignore, ou met à jour, les matricules déjà enregistrés.
+
+Le rapport donne les compteurs et les erreurs de chaque ligne rejetée ; une
+ligne est numérotée à partir de 1 parmi les lignes de données (en-tête exclu).
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, time
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .alertes import moteur_alertes_installe, reevaluer_alertes
+from .caching import invalider
+from .index_absences import bornes, formater_conflit, index_absences, publier_ecriture, verrouiller_matricules
+from .models import Absences, Equipe, InfoEquipe
+from .presence import jour_local, recalculer_presence
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - dépendance optionnelle (import XLSX)
+    openpyxl = None
+
+# En-têtes acceptés en plus des noms de colonnes
+ALIAS_COLONNES = {
+    'debut': 'date_debut_abs',
+    'date_debut': 'date_debut_abs',
+    'fin': 'date_fin_abs',
+    'date_fin': 'date_fin_abs',
+    'equipe': 'id_equipe',
+    'disponibilite': 'disponibilité',
+    'telephone': 'phone_number',
+}
+
+FORMATS_DATE_HEURE = ('%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y')
+FIN_JOURNEE = time(23, 59, 59)
+
+ETATS = {etat for etat, _ in Absences.ETAT_CHOICES}
+
+SQL_TABLE_IMPORT = '''
+    DROP TABLE IF EXISTS import_absences;
+    CREATE TEMPORARY TABLE import_absences (
+        ligne INTEGER PRIMARY KEY,
+        matricule VARCHAR(30) NOT NULL,
+        date_debut_abs TIMESTAMPTZ NOT NULL,
+        date_fin_abs TIMESTAMPTZ NOT NULL,
+        justification TEXT,
+        etat VARCHAR(50) NOT NULL
+    ) ON COMMIT DROP
+'''
+
+# Lignes de l'import en conflit avec une absence déjà enregistrée
+SQL_CONFLITS_FUSION = '''
+    SELECT i.ligne
+    FROM import_absences i
+    WHERE i.etat <> 'refusée'
+      AND (
+          EXISTS (
+              SELECT 1 FROM absences a
+              WHERE a.matricule = i.matricule AND a.etat IS DISTINCT FROM 'refusée'
+                AND periode_absence(a.date_debut_abs, a.date_fin_abs) && periode_absence(i.date_debut_abs, i.date_fin_abs)
+          )
+          OR EXISTS (
+              SELECT 1 FROM "absences_non_déclarées" n
+              WHERE n.matricule = i.matricule
+                AND periode_absence(n.date_debut_abs, n.date_fin_abs) && periode_absence(i.date_debut_abs, i.date_fin_abs)
+          )
+      )
+'''
+
+SQL_FUSION = '''
+    INSERT INTO absences (matricule, date_debut_abs, date_fin_abs, justification, uploaded_at, etat)
+    SELECT matricule, date_debut_abs, date_fin_abs, justification, NOW(), etat
+    FROM import_absences
+    WHERE ligne <> ALL(%s)
+    ORDER BY ligne
+    RETURNING id_absence
+'''
+
+
+class ImportInvalide(ValueError):
+    """Fichier illisible ou format non pris en charge"""
+
+
+class LigneRejetee(ValueError):
+    """Ligne d'import rejetée à la validation"""
+
+
+def _normaliser(ligne):
+    if not isinstance(ligne, dict):
+        raise ImportInvalide("chaque absence doit être un objet")
+    normalisee = {}
+    for cle, valeur in ligne.items():
+        cle = str(cle or '').strip().lower()
+        normalisee[ALIAS_COLONNES.get(cle, cle)] = valeur.strip() if isinstance(valeur, str) else valeur
+    return normalisee
+
+
+def lire_csv(texte):
+    try:
+        dialecte = csv.Sniffer().sniff(texte[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialecte = csv.excel
+    return [_normaliser(ligne) for ligne in csv.DictReader(io.StringIO(texte), dialect=dialecte)]
+
+
+def lire_xlsx(contenu):
+    if openpyxl is None:
+        raise ImportInvalide("l'import XLSX nécessite openpyxl (pip install openpyxl)")
+    try:
+        classeur = openpyxl.load_workbook(io.BytesIO(contenu), read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportInvalide(f"fichier XLSX illisible : {e}")
+    lignes = classeur.active.iter_rows(values_only=True)
+    entetes = next(lignes, None) or ()
+    return [
+        _normaliser(dict(zip(entetes, ligne)))
+        for ligne in lignes
+        if any(valeur not in (None, '') for valeur in ligne)
+    ]
+
+
+def lire_json(donnees, cle='absences'):
+    """Liste de lignes, ou objet {cle: [...]}"""
+    if isinstance(donnees, dict):
+        donnees = donnees.get(cle)
+    if not isinstance(donnees, list):
+        raise ImportInvalide(f"JSON attendu : liste de lignes ou {{'{cle}': [...]}}")
+    return [_normaliser(ligne) for ligne in donnees]
+
+
+def lire_fichier(contenu, nom, cle='absences'):
+    """Lignes d'un fichier importé, format déduit de l'extension"""
+    extension = nom.rsplit('.', 1)[-1].lower() if '.' in nom else ''
+    if extension == 'xlsx':
+        return lire_xlsx(contenu)
+    try:
+        texte = contenu.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        texte = contenu.decode('latin-1')
+    if extension == 'json':
+        try:
+            return lire_json(json.loads(texte), cle)
+        except json.JSONDecodeError as e:
+            raise ImportInvalide(f"JSON invalide : {e}")
+    if extension in ('csv', 'txt', ''):
+        return lire_csv(texte)
+    raise ImportInvalide(f"format non pris en charge : .{extension} (csv, xlsx ou json)")
+
+
+def _parser_texte(texte, fin):
+    # Date seule d'abord : parse_datetime lirait « AAAA-MM-JJ » comme minuit
+    jour = parse_date(texte)
+    instant = parse_datetime(texte) if jour is None else None
+    if instant is not None:
+        return instant
+    for format_date in FORMATS_DATE_HEURE if jour is None else ():
+        try:
+            instant = datetime.strptime(texte, format_date)
+        except ValueError:
+            continue
+        if format_date != '%d/%m/%Y':
+            return instant
+        jour = instant.date()
+        break
+    if jour is None:
+        raise LigneRejetee(f'date invalide : {texte}')
+    return datetime.combine(jour, FIN_JOURNEE if fin else time.min)
+
+
+def parser_instant(valeur, fin=False):
+    """
+    Date et heure d'une cellule : datetime, date, ISO 8601 ou JJ/MM/AAAA [HH:MM].
+    Une date seule couvre la journée entière (00:00 au début, 23:59:59 à la fin).
+    """
+    if valeur in (None, ''):
+        raise LigneRejetee('date manquante')
+    if isinstance(valeur, datetime):
+        instant = valeur
+    elif isinstance(valeur, date):
+        instant = datetime.combine(valeur, FIN_JOURNEE if fin else time.min)
+    else:
+        try:
+            instant = _parser_texte(str(valeur).strip(), fin)
+        except LigneRejetee:
+            raise
+        except ValueError as e:
+            # Date bien formée mais impossible (31/02, 25:00...)
+            raise LigneRejetee(f'date invalide : {valeur} ({e})')
+    return timezone.make_aware(instant) if timezone.is_naive(instant) else instant
+
+
+def _valider_ligne(ligne, matricules_connus):
+    erreurs = []
+    matricule = str(ligne.get('matricule') or '').strip()
+    if not matricule:
+        erreurs.append('matricule manquant')
+    elif matricule not in matricules_connus:
+        erreurs.append(f'matricule inconnu : {matricule}')
+
+    instants = []
+    for champ, fin in (('date_debut_abs', False), ('date_fin_abs', True)):
+        try:
+            instants.append(parser_instant(ligne.get(champ), fin=fin))
+        except LigneRejetee as e:
+            erreurs.append(f'{champ} : {e}')
+    if len(instants) == 2 and instants[1] < instants[0]:
+        erreurs.append('date_fin_abs antérieure à date_debut_abs')
+
+    etat = ligne.get('etat') or 'en attente'
+    if etat not in ETATS:
+        erreurs.append(f"etat invalide : {etat} ({', '.join(sorted(ETATS))})")
+
+    if erreurs:
+        raise LigneRejetee(erreurs)
+    justification = ligne.get('justification')
+    return {
+        'matricule': matricule,
+        'date_debut_abs': instants[0],
+        'date_fin_abs': instants[1],
+        'justification': str(justification) if justification not in (None, '') else None,
+        'etat': etat,
+    }
+
+
+def valider_lignes(lignes):
+    """
+    Retourne (valides, erreurs) : valides = {numéro: absence normalisée},
+    erreurs = {numéro: [messages]}.
+    """
+    matricules = {str(ligne.get('matricule') or '').strip() for ligne in lignes}
+    matricules_connus = set(
+        InfoEquipe.objects.filter(matricule__in=matricules - {''}).values_list('matricule', flat=True)
+    )
+
+    valides, erreurs = {}, {}
+    for numero, ligne in enumerate(lignes, start=1):
+        try:
+            valides[numero] = _valider_ligne(ligne, matricules_connus)
+        except LigneRejetee as e:
+            erreurs[numero] = e.args[0]
+
+    # Une absence refusée n'occupe pas la période : seules les autres sont comparées
+    a_comparer = [numero for numero, absence in valides.items() if absence['etat'] != 'refusée']
+    conflits = index_absences.conflits_lot([
+        (valides[numero]['matricule'], valides[numero]['date_debut_abs'], valides[numero]['date_fin_abs'])
+        for numero in a_comparer
+    ])
+    for indice, conflits_ligne in conflits.items():
+        numero = a_comparer[indice]
+        del valides[numero]
+        erreurs[numero] = [
+            f"chevauche la ligne {a_comparer[conflit[3]]} du fichier" if conflit[2] == 'lot'
+            else f"chevauche l'absence existante {formater_conflit(conflit)}"
+            for conflit in conflits_ligne
+        ]
+    return valides, erreurs
+
+
+def _copier(cursor, valides):
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon)
+    for numero, absence in valides.items():
+        ecrivain.writerow([
+            numero, absence['matricule'], absence['date_debut_abs'].isoformat(),
+            absence['date_fin_abs'].isoformat(), absence['justification'], absence['etat'],
+        ])
+    tampon.seek(0)
+    cursor.copy_expert(
+        'COPY import_absences (ligne, matricule, date_debut_abs, date_fin_abs, justification, etat) '
+        'FROM STDIN WITH (FORMAT csv)',
+        tampon,
+    )
+
+
+def importer_absences(lignes, strict=False):
+    """
+    Valide et importe les absences. En mode strict, rien n'est écrit si une
+    ligne est rejetée. Retourne le rapport d'import.
+    """
+    valides, erreurs = valider_lignes(lignes)
+    ids = []
+    if valides and not (strict and erreurs):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # Deux imports simultanés ne se valident pas l'un l'autre, ni un
+                # import et une absence créée par l'API (verrou par matricule)
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('import_absences'))")
+                verrouiller_matricules(absence['matricule'] for absence in valides.values())
+                cursor.execute(SQL_TABLE_IMPORT)
+                _copier(cursor, valides)
+                cursor.execute(SQL_CONFLITS_FUSION)
+                en_conflit = [ligne[0] for ligne in cursor.fetchall()]
+                for numero in en_conflit:
+                    erreurs[numero] = ['chevauche une absence enregistrée pendant l\'import']
+                if not (strict and en_conflit):
+                    cursor.execute(SQL_FUSION, [en_conflit])
+                    ids = [ligne[0] for ligne in cursor.fetchall()]
+            if ids:
+                _apres_import([absence for numero, absence in valides.items() if numero not in erreurs])
+
+    return {
+        'lignes': len(lignes),
+        'importees': len(ids),
+        'rejetees': len(erreurs),
+        'ids': ids,
+        'erreurs': [{'ligne': numero, 'erreurs': erreurs[numero]} for numero in sorted(erreurs)],
+    }
+
+
+def _apres_import(absences):
+    """Équivalent ensembliste des signaux d'écriture d'absence (signals.py)"""
+    matricules = sorted({absence['matricule'] for absence in absences})
+    debut = min(jour_local(bornes(a['date_debut_abs'], a['date_fin_abs'])[0]) for a in absences)
+    fin = max(jour_local(bornes(a['date_debut_abs'], a['date_fin_abs'])[1]) for a in absences)
+    recalculer_presence(debut, fin, matricules)
+    if moteur_alertes_installe():
+        reevaluer_alertes(debut, fin, matricules)
+    invalider('absences')
+    publier_ecriture(matricules)
+
+
+# Personnel
+
+FONCTIONS_PERSONNEL = ('conducteur', 'docker')
+DISPONIBILITES = ('en service', 'en repos', 'disponible', 'non disponible')
+CHAMPS_PERSONNEL = (
+    'matricule', 'id_equipe', 'fonction', 'nom', 'prenom', 'email', 'phone_number', 'date_embauche', 'disponibilité',
+)
+
+# Au-delà, l'import est confié au worker run_jobs (tâche import_personnel)
+SEUIL_JOB_PERSONNEL = 500
+
+SQL_INSERTION_PERSONNEL = '''
+    INSERT INTO info_equipe (matricule, id_equipe, fonction, nom, prenom, email, phone_number, date_embauche, "disponibilité")
+    SELECT * FROM unnest(
+        %s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[], %s::varchar[],
+        %s::varchar[], %s::varchar[], %s::date[], %s::varchar[]
+    )
+    ON CONFLICT (matricule) {action}
+    RETURNING matricule, xmax = 0
+'''
+
+SQL_MISE_A_JOUR_PERSONNEL = '''DO UPDATE SET
+        id_equipe = EXCLUDED.id_equipe, fonction = EXCLUDED.fonction, nom = EXCLUDED.nom,
+        prenom = EXCLUDED.prenom, email = EXCLUDED.email, phone_number = EXCLUDED.phone_number,
+        date_embauche = EXCLUDED.date_embauche, "disponibilité" = EXCLUDED."disponibilité"
+'''
+
+
+def _texte(ligne, champ):
+    valeur = ligne.get(champ)
+    return str(valeur).strip() if valeur not in (None, '') else ''
+
+
+def _valider_employe(ligne, equipes_connues, fonction_defaut):
+    erreurs = []
+    employe = {champ: _texte(ligne, champ) for champ in CHAMPS_PERSONNEL}
+    for champ in ('matricule', 'nom', 'prenom'):
+        if not employe[champ]:
+            erreurs.append(f'{champ} manquant')
+
+    employe['fonction'] = employe['fonction'].lower() or fonction_defaut
+    if employe['fonction'] not in FONCTIONS_PERSONNEL:
+        erreurs.append(f"fonction invalide : {employe['fonction'] or '(vide)'} ({', '.join(FONCTIONS_PERSONNEL)})")
+    employe['disponibilité'] = employe['disponibilité'] or 'disponible'
+    if employe['disponibilité'] not in DISPONIBILITES:
+        erreurs.append(f"disponibilité invalide : {employe['disponibilité']} ({', '.join(DISPONIBILITES)})")
+    if employe['id_equipe'] and employe['id_equipe'] not in equipes_connues:
+        erreurs.append(f"équipe inconnue : {employe['id_equipe']}")
+
+    date_embauche = ligne.get('date_embauche')
+    if isinstance(date_embauche, (date, datetime)):
+        employe['date_embauche'] = date_embauche if not isinstance(date_embauche, datetime) else date_embauche.date()
+    elif employe['date_embauche']:
+        try:
+            employe['date_embauche'] = parse_date(employe['date_embauche']) or datetime.strptime(employe['date_embauche'], '%d/%m/%Y').date()
+        except ValueError:
+            erreurs.append(f"date_embauche invalide : {employe['date_embauche']}")
+
+    for champ in CHAMPS_PERSONNEL:
+        max_length = InfoEquipe._meta.get_field(champ).max_length
+        if max_length and isinstance(employe[champ], str) and len(employe[champ]) > max_length:
+            erreurs.append(f'{champ} dépasse {max_length} caractères')
+
+    if erreurs:
+        raise LigneRejetee(erreurs)
+    # Colonnes facultatives vides : NULL, comme l'équipe non renseignée
+    return {champ: (valeur if valeur != '' else None) for champ, valeur in employe.items()}
+
+
+def valider_personnel(lignes, fonction_defaut=''):
+    """
+    Retourne (valides, erreurs) comme valider_lignes ; les équipes sont
+    vérifiées par une seule requête, un matricule répété dans le fichier
+    n'est retenu qu'à sa première ligne.
+    """
+    equipes = {_texte(ligne, 'id_equipe') for ligne in lignes} - {''}
+    equipes_connues = set(Equipe.objects.filter(id_equipe__in=equipes).values_list('id_equipe', flat=True))
+
+    valides, erreurs, vus = {}, {}, {}
+    for numero, ligne in enumerate(lignes, start=1):
+        try:
+            employe = _valider_employe(ligne, equipes_connues, fonction_defaut)
+        except LigneRejetee as e:
+            erreurs[numero] = e.args[0]
+            continue
+        if employe['matricule'] in vus:
+            erreurs[numero] = [f"matricule {employe['matricule']} déjà présent ligne {vus[employe['matricule']]}"]
+            continue
+        vus[employe['matricule']] = numero
+        valides[numero] = employe
+    return valides, erreurs
+
+
+def importer_personnel(lignes, fonction_defaut='', mise_a_jour=False, strict=False, progression=None):
+    """
+    Valide et insère les employés. Un matricule déjà enregistré est ignoré
+    (« existants » du rapport), ou mis à jour si mise_a_jour est vrai.
+    `progression(pourcentage, message)` est appelée par la tâche de fond.
+    """
+    valides, erreurs = valider_personnel(lignes, fonction_defaut)
+    if progression:
+        progression(50, f'{len(valides)} ligne(s) valide(s)')
+
+    inseres, mis_a_jour, existants = [], [], []
+    if valides and not (strict and erreurs):
+        colonnes = [[employe[champ] for employe in valides.values()] for champ in CHAMPS_PERSONNEL]
+        action = SQL_MISE_A_JOUR_PERSONNEL if mise_a_jour else 'DO NOTHING'
+        # Une seule instruction : atomique sans transaction explicite
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_INSERTION_PERSONNEL.format(action=action), colonnes)
+            for matricule, insere in cursor.fetchall():
+                # xmax nul : ligne insérée ; sinon ligne existante mise à jour
+                (inseres if insere else mis_a_jour).append(matricule)
+        ecrits = set(inseres) | set(mis_a_jour)
+        existants = [employe['matricule'] for employe in valides.values() if employe['matricule'] not in ecrits]
+        invalider('info_equipe')
+
+    return {
+        'lignes': len(lignes),
+        'inseres': len(inseres),
+        'mis_a_jour': len(mis_a_jour),
+        'existants': existants,
+        'rejetees': len(erreurs),
+        'erreurs': [{'ligne': numero, 'erreurs': erreurs[numero]} for numero in sorted(erreurs)],
+    }
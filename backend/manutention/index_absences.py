@@ -0,0 +1,276 @@
+"""
+Index en mémoire des absences par matricule, pour refuser les chevauchements
+à la création sans une requête par absence soumise.
+
+Pour chaque matricule, les absences de la fenêtre active (absences déclarées
+non refusées et absences non déclarées) sont triées par début avec le
+maximum cumulé des fins : « chevauche [debut, fin] ? » se résout par une
+recherche dichotomique, en O(log n), puis les absences en conflit sont
+énumérées en remontant tant que le maximum cumulé atteint le début demandé.
+Une période hors de la fenêtre est vérifiée par une requête SQL indexée
+(periode_absence).
+
+Synchronisation entre workers : chaque écriture d'absence est publiée sur le
+bus d'événements (canal « absences », NOTIFY au commit) ; chaque processus
+marque alors le matricule comme périmé et le recharge à la vérification
+suivante. Le processus qui écrit le fait dès son commit, sans attendre le
+retour de sa propre notification. Un rechargement complet a lieu au premier
+usage, quand la fenêtre glisse, quand la connexion LISTEN change (les
+notifications émises entre-temps sont perdues) et au plus tard après TTL
+secondes.
+
+L'index ne sert qu'à refuser tôt, à la validation : l'écriture revérifie en
+base dans sa transaction, sous un verrou consultatif par matricule
+(verifier_en_base), ce qui couvre une écriture d'un autre processus dont la
+notification n'est pas encore arrivée.
+"""
+
+import itertools
+import threading
+import time
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .evenements import bus, configuration as configuration_evenements, connexion_ecoute, publier
+from .periodes_absence import TABLES_ABSENCES, chevauchement
+
+CANAL_ABSENCES = 'absences'
+
+CONFIGURATION_DEFAUT = {
+    # Fenêtre active chargée en mémoire autour d'aujourd'hui
+    'JOURS_PASSES': 90,
+    'JOURS_FUTURS': 365,
+    # Secondes avant un rechargement complet de sécurité
+    'TTL': 300,
+}
+
+# Verrou consultatif de transaction par matricule, pris avant d'écrire ses absences
+SQL_VERROU_MATRICULES = '''
+    SELECT pg_advisory_xact_lock(hashtext('absences'), hashtext(m))
+    FROM unnest(%s::varchar[]) AS m
+    ORDER BY m
+'''
+
+# Nom court de chaque table d'absences dans les conflits renvoyés
+SOURCES = {'absences': 'declaree', 'absences_non_déclarées': 'non_declaree'}
+
+
+def configuration():
+    return {**CONFIGURATION_DEFAUT, **getattr(settings, 'INDEX_ABSENCES', {})}
+
+
+def _sql_absences(filtre_matricules):
+    """Absences chevauchant [%s, %s[ : source, id, matricule, début, fin (bornes ordonnées, avec fuseau)"""
+    requetes = []
+    for table, condition in TABLES_ABSENCES:
+        cle = 'id_absence' if table == 'absences' else 'id'
+        conditions = ['a.matricule IS NOT NULL', chevauchement('a', '%s', '%s')]
+        if condition:
+            conditions.append(f'a.{condition}')
+        if filtre_matricules:
+            conditions.append('a.matricule = ANY(%s)')
+        requetes.append(f'''
+            SELECT '{SOURCES[table]}', a.{cle}, a.matricule,
+                   lower(periode_absence(a.date_debut_abs, a.date_fin_abs)),
+                   upper(periode_absence(a.date_debut_abs, a.date_fin_abs))
+            FROM {connection.ops.quote_name(table)} a
+            WHERE {' AND '.join(conditions)}
+        ''')
+    return ' UNION ALL '.join(requetes)
+
+
+def lire_absences(debut, fin, matricules=None):
+    """Absences chevauchant [debut, fin[ par matricule : {matricule: [(debut, fin, source, id)]}"""
+    params = [debut, fin] + ([list(matricules)] if matricules is not None else [])
+    with connection.cursor() as cursor:
+        cursor.execute(_sql_absences(matricules is not None), params * len(TABLES_ABSENCES))
+        lignes = cursor.fetchall()
+    par_matricule = {}
+    for source, id_absence, matricule, debut_abs, fin_abs in lignes:
+        par_matricule.setdefault(matricule, []).append((debut_abs, fin_abs, source, id_absence))
+    return par_matricule
+
+
+class IntervallesMatricule:
+    """Absences d'un matricule triées par début, avec le maximum cumulé des fins"""
+
+    __slots__ = ('absences', 'debuts', 'fins_max')
+
+    def __init__(self, absences):
+        self.absences = sorted(absences, key=lambda absence: absence[0])
+        self.debuts = [absence[0] for absence in self.absences]
+        self.fins_max = list(itertools.accumulate((absence[1] for absence in self.absences), max))
+
+    def chevauche(self, debut, fin):
+        """Existence d'un chevauchement avec [debut, fin], en O(log n)"""
+        k = bisect_right(self.debuts, fin)
+        return k > 0 and self.fins_max[k - 1] >= debut
+
+    def conflits(self, debut, fin):
+        """Absences chevauchant [debut, fin], par début croissant"""
+        conflits = []
+        i = bisect_right(self.debuts, fin) - 1
+        while i >= 0 and self.fins_max[i] >= debut:
+            if self.absences[i][1] >= debut:
+                conflits.append(self.absences[i])
+            i -= 1
+        return conflits[::-1]
+
+    def ajouter(self, absence):
+        return IntervallesMatricule(self.absences + [absence])
+
+
+def bornes(debut, fin):
+    """Bornes dans l'ordre, avec fuseau (une date naïve est dans le fuseau courant)"""
+    return tuple(
+        timezone.make_aware(instant) if timezone.is_naive(instant) else instant
+        for instant in (min(debut, fin), max(debut, fin))
+    )
+
+
+def formater_conflit(absence):
+    debut, fin, source, id_absence = absence
+    return {'source': source, 'id': id_absence, 'date_debut_abs': debut.isoformat(), 'date_fin_abs': fin.isoformat()}
+
+
+class IndexAbsences:
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._par_matricule = {}
+        self._fenetre = None
+        self._charge_le = None
+        self._perimes = set()
+        self._abonnement = None
+        self._ecoute = None
+
+    def _fenetre_courante(self):
+        config = configuration()
+        aujourdhui = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return aujourdhui - timedelta(days=config['JOURS_PASSES']), aujourdhui + timedelta(days=config['JOURS_FUTURS'])
+
+    def _s_abonner(self):
+        """
+        Abonnement au canal des absences. Retourne l'identifiant de la
+        connexion LISTEN (None tant qu'elle n'est pas établie), 'local' sans LISTEN.
+        """
+        if self._abonnement is None:
+            self._abonnement = bus.abonner_rappel([CANAL_ABSENCES], self.recevoir)
+        if not configuration_evenements()['LISTEN']:
+            return 'local'
+        return connexion_ecoute()
+
+    def _a_jour(self):
+        """Recharge complet ou des seuls matricules périmés ; appelé sous le verrou"""
+        # Lue avant le chargement : une reconnexion pendant celui-ci force le suivant
+        ecoute = self._s_abonner()
+        fenetre = self._fenetre_courante()
+        if (
+            self._charge_le is None or fenetre != self._fenetre
+            or ecoute is None or ecoute != self._ecoute
+            or time.monotonic() - self._charge_le > configuration()['TTL']
+        ):
+            self._perimes.clear()
+            self._par_matricule = {
+                matricule: IntervallesMatricule(absences)
+                for matricule, absences in lire_absences(*fenetre).items()
+            }
+            self._fenetre = fenetre
+            self._ecoute = ecoute
+            self._charge_le = time.monotonic()
+        elif self._perimes:
+            perimes, self._perimes = self._perimes, set()
+            recharges = lire_absences(*self._fenetre, matricules=perimes)
+            for matricule in perimes:
+                if matricule in recharges:
+                    self._par_matricule[matricule] = IntervallesMatricule(recharges[matricule])
+                else:
+                    self._par_matricule.pop(matricule, None)
+
+    def recevoir(self, evenement):
+        """Rappel du bus : écriture d'absence dans ce processus ou un autre"""
+        donnees = evenement.get('donnees', {})
+        with self._verrou:
+            if donnees.get('volumineux'):
+                # Liste des matricules retirée de la charge NOTIFY : tout recharger
+                self._charge_le = None
+            else:
+                self._perimes.update(donnees.get('matricules') or [])
+
+    def invalider(self):
+        with self._verrou:
+            self._charge_le = None
+
+    def conflits(self, matricule, debut, fin, exclure=None):
+        """
+        Absences existantes de `matricule` chevauchant [debut, fin].
+        `exclure` : (source, id) de l'absence modifiée elle-même.
+        """
+        debut, fin = bornes(debut, fin)
+        with self._verrou:
+            self._a_jour()
+            fenetre_debut, fenetre_fin = self._fenetre
+            if fenetre_debut <= debut and fin < fenetre_fin:
+                intervalles = self._par_matricule.get(matricule)
+                trouves = intervalles.conflits(debut, fin) if intervalles and intervalles.chevauche(debut, fin) else []
+            else:
+                trouves = None
+        if trouves is None:
+            # Hors fenêtre : requête indexée sur ce seul matricule
+            trouves = lire_absences(debut, fin + timedelta(microseconds=1), [matricule]).get(matricule, [])
+        return [absence for absence in trouves if exclure is None or (absence[2], absence[3]) != tuple(exclure)]
+
+    def conflits_lot(self, lignes):
+        """
+        Conflits de chaque absence d'un lot (matricule, debut, fin), avec les
+        absences existantes et les lignes précédentes du même lot. Retourne
+        {indice: [conflits]} pour les seules lignes en conflit.
+        """
+        resultats = {}
+        lot = {}
+        for indice, (matricule, debut, fin) in enumerate(lignes):
+            debut, fin = bornes(debut, fin)
+            conflits = self.conflits(matricule, debut, fin)
+            deja_vus = lot.get(matricule)
+            if deja_vus is not None and deja_vus.chevauche(debut, fin):
+                conflits += deja_vus.conflits(debut, fin)
+            if conflits:
+                resultats[indice] = conflits
+            else:
+                absence = (debut, fin, 'lot', indice)
+                lot[matricule] = deja_vus.ajouter(absence) if deja_vus else IntervallesMatricule([absence])
+        return resultats
+
+
+index_absences = IndexAbsences()
+
+
+def publier_ecriture(matricules):
+    """
+    Publie l'écriture d'absences des matricules. Les autres processus les
+    marquent périmés à la réception du NOTIFY, celui-ci dès le commit.
+    """
+    donnees = {'matricules': sorted(set(matricules))}
+    publier(CANAL_ABSENCES, 'ecriture', donnees)
+    transaction.on_commit(lambda: index_absences.recevoir({'canal': CANAL_ABSENCES, 'donnees': donnees}))
+
+
+def verrouiller_matricules(matricules):
+    """Verrous consultatifs des matricules jusqu'à la fin de la transaction, dans l'ordre"""
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_VERROU_MATRICULES, [sorted(set(matricules))])
+
+
+def verifier_en_base(matricule, debut, fin, exclure=None):
+    """
+    Conflits de [debut, fin] lus en base (prédicat indexé periode_absence),
+    sous le verrou du matricule : à appeler dans la transaction qui écrit
+    l'absence, pour que deux écritures simultanées ne se manquent pas.
+    """
+    verrouiller_matricules([matricule])
+    debut, fin = bornes(debut, fin)
+    trouves = lire_absences(debut, fin + timedelta(microseconds=1), [matricule]).get(matricule, [])
+    return [absence for absence in trouves if exclure is None or (absence[2], absence[3]) != tuple(exclure)]
@@ -0,0 +1,159 @@
+"""
+Exécution de tâches de fond persistées dans la table `jobs`.
+
+Les vues soumettent un job (soumettre_job) et répondent immédiatement ; la
+commande `python manage.py run_jobs` réserve les jobs en attente et les
+exécute dans un pool de threads borné. Un seul job actif est autorisé par
+type (contrainte partielle jobs_un_seul_actif_par_type) : des clics répétés
+renvoient le job déjà en cours au lieu d'en lancer un nouveau.
+
+Le worker renouvelle périodiquement date_heartbeat de ses jobs en cours, tout
+comme mettre_a_jour_progression. Un job « en cours » dont le heartbeat est
+plus ancien que JOBS_DELAI_ORPHELINS a perdu son worker : tout worker en
+fonctionnement le marque en échec, ce qui libère son type.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# type_job -> fonction(job, **parametres) retournant un résultat sérialisable en JSON
+REGISTRE_TACHES = {}
+
+
+def delai_orphelins():
+    """Au-delà, un job « en cours » sans heartbeat est considéré comme abandonné par son worker"""
+    return timedelta(seconds=getattr(settings, 'JOBS_DELAI_ORPHELINS', 120))
+
+
+def tache(type_job):
+    """Enregistre une fonction exécutable en tâche de fond"""
+    def decorateur(fonction):
+        REGISTRE_TACHES[type_job] = fonction
+        return fonction
+    return decorateur
+
+
+def soumettre_job(type_job, parametres=None):
+    """
+    Crée un job en attente et retourne (job, cree). Si un job du même type est
+    déjà en attente ou en cours, il est retourné avec cree=False.
+    """
+    if type_job not in REGISTRE_TACHES:
+        raise ValueError(f"Type de job inconnu: {type_job}")
+    try:
+        with transaction.atomic():
+            return Job.objects.create(type_job=type_job, parametres=parametres or {}), True
+    except IntegrityError:
+        job = Job.objects.filter(type_job=type_job, statut__in=Job.STATUTS_ACTIFS).first()
+        if job is None:
+            # Le job actif vient de se terminer : nouvelle tentative
+            return soumettre_job(type_job, parametres)
+        return job, False
+
+
+def reserver_job():
+    """
+    Passe le plus ancien job en attente à « en cours » et le retourne.
+    SKIP LOCKED permet à plusieurs workers de se partager la file sans attente.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(statut=Job.EN_ATTENTE)
+            .order_by('date_creation')
+            .first()
+        )
+        if job is None:
+            return None
+        job.statut = Job.EN_COURS
+        job.date_debut = job.date_heartbeat = timezone.now()
+        job.save(update_fields=['statut', 'date_debut', 'date_heartbeat'])
+    return job
+
+
+def mettre_a_jour_progression(job, progression, message=''):
+    job.progression = max(0, min(100, int(progression)))
+    job.message = message[:255]
+    Job.objects.filter(pk=job.pk).update(progression=job.progression, message=job.message, date_heartbeat=timezone.now())
+
+
+def signaler_activite(ids):
+    """Heartbeat des jobs en cours exécutés par ce worker"""
+    if not ids:
+        return 0
+    return Job.objects.filter(pk__in=ids, statut=Job.EN_COURS).update(date_heartbeat=timezone.now())
+
+
+def executer_job(job):
+    """Exécute un job réservé et enregistre son résultat ou son erreur"""
+    # Un job libéré comme orphelin entre-temps garde son statut d'échec
+    en_cours = Job.objects.filter(pk=job.pk, statut=Job.EN_COURS)
+    try:
+        fonction = REGISTRE_TACHES[job.type_job]
+        resultat = fonction(job, **job.parametres)
+        en_cours.update(statut=Job.TERMINE, progression=100, resultat=resultat, date_fin=timezone.now())
+    except Exception as e:
+        # La trace complète reste dans les logs du worker, le job ne garde qu'un message court
+        logger.exception("Job %s en échec", job)
+        en_cours.update(statut=Job.ECHOUE, erreur=f'{type(e).__name__}: {e}'[:500], date_fin=timezone.now())
+    finally:
+        # Chaque thread du pool a sa propre connexion
+        close_old_connections()
+
+
+def liberer_jobs_orphelins(delai=None):
+    """
+    Marque en échec les jobs « en cours » sans heartbeat depuis plus de
+    `delai` (worker arrêté en plein traitement) pour qu'ils ne bloquent plus
+    leur type
+    """
+    limite = timezone.now() - (delai if delai is not None else delai_orphelins())
+    return Job.objects.filter(statut=Job.EN_COURS).filter(
+        Q(date_heartbeat__lt=limite) | Q(date_heartbeat__isnull=True, date_debut__lt=limite)
+    ).update(statut=Job.ECHOUE, erreur='Job interrompu (worker arrêté)', date_fin=timezone.now())
+
+
+@tache('scraping_navires')
+def scraping_navires(job):
+    from .navire_scraper import scrape_navires_anp
+
+    def progression(pourcentage, message):
+        mettre_a_jour_progression(job, pourcentage, message)
+
+    resultat = scrape_navires_anp(progression=progression)
+    if not resultat.get('success'):
+        raise RuntimeError(resultat.get('error', 'Échec du scraping'))
+    return resultat
+
+
+@tache('reinitialisation_quotas')
+def reinitialisation_quotas(job):
+    from .quotas import reinitialiser_quotas_shifts_commences
+
+    return {'chefs_reinitialises': reinitialiser_quotas_shifts_commences()}
+
+
+@tache('detection_absences_non_declarees')
+def detection_absences_non_declarees(job, jours=2):
+    from .detection_absences import detecter_derniers_jours
+
+    return {'absences_creees': len(detecter_derniers_jours(jours))}
+
+
+@tache('import_personnel')
+def import_personnel(job, lignes, fonction_defaut='', mise_a_jour=False, strict=False):
+    from .imports import importer_personnel
+
+    def progression(pourcentage, message):
+        mettre_a_jour_progression(job, pourcentage, message)
+
+    return importer_personnel(lignes, fonction_defaut, mise_a_jour=mise_a_jour, strict=strict, progression=progression)
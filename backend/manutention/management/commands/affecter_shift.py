@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from manutention.affectation_auto import affecter_shift
+from manutention.models import Shifts
+
+
+class Command(BaseCommand):
+    help = "Affecte automatiquement les conducteurs éligibles aux engins disponibles d'un shift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('id_shift', type=int)
+        parser.add_argument('--simulation', action='store_true', help="Calcule l'affectation sans l'enregistrer")
+
+    def handle(self, *args, **options):
+        try:
+            resultat = affecter_shift(options['id_shift'], simulation=options['simulation'])
+        except Shifts.DoesNotExist:
+            raise CommandError(f"Shift {options['id_shift']} introuvable")
+
+        for affectation in resultat['affectations']:
+            self.stdout.write(f"{affectation['matricule']:<12} -> {affectation['code_engin']:<12} ({affectation['poids']})")
+        self.stdout.write(
+            f"Éligibles    : {resultat['conducteurs_eligibles']} conducteur(s), "
+            f"{resultat['engins_eligibles']} engin(s), {resultat['couples_eligibles']} couple(s)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(resultat['affectations'])} affectation(s) "
+            f"{'calculée(s)' if resultat['simulation'] else 'enregistrée(s)'}, poids total {resultat['poids_total']}, "
+            f"résolution en {resultat['duree_resolution_ms']} ms"
+        ))
@@ -0,0 +1,152 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from manutention import affectation_auto
+from manutention.affectation_auto import affecter_shift, construire_matrice, resoudre_affectation
+from manutention.models import Absences, Affectations, Engins, Equipe, InfoEquipe, Shifts
+
+NIVEAUX_EXPERTISE = ('expert', 'confirmé', 'débutant')
+
+# Tables non gérées lues par SQL_ARETES_ELIGIBLES, absentes d'une base de test
+SQL_TABLES_BRUTES = {
+    'qualifications_conducteurs': '''
+        CREATE TABLE qualifications_conducteurs (
+            id_qualification SERIAL PRIMARY KEY,
+            matricule VARCHAR(20),
+            code_engin VARCHAR(30),
+            niveau_expertise VARCHAR(20)
+        )
+    ''',
+    'cumul_heures': '''
+        CREATE TABLE cumul_heures (
+            id_cumul_heures SERIAL PRIMARY KEY,
+            matricule VARCHAR(30),
+            code_engin VARCHAR(30),
+            heure_par_jour DOUBLE PRECISION,
+            date DATE
+        )
+    ''',
+}
+
+
+class Command(BaseCommand):
+    help = "Mesure la construction de la matrice et la résolution de l'affectation automatique sur des données aléatoires"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conducteurs', type=int, default=500)
+        parser.add_argument('--engins', type=int, default=300)
+        parser.add_argument('--densite', type=float, default=0.3, help="Part des couples conducteur/engin éligibles")
+        parser.add_argument('--repetitions', type=int, default=3)
+        parser.add_argument('--graine', type=int, default=0)
+        parser.add_argument(
+            '--bout-en-bout', action='store_true',
+            help="Peuple une base de test et chronomètre affecter_shift() complet "
+                 "(requête des couples éligibles, résolution et bulk_create)",
+        )
+
+    def handle(self, *args, **options):
+        generateur = np.random.default_rng(options['graine'])
+        if options['bout_en_bout']:
+            self.mesurer_bout_en_bout(generateur, options)
+        else:
+            self.mesurer_resolution(generateur, options)
+
+    def mesurer_resolution(self, generateur, options):
+        conducteurs, engins = options['conducteurs'], options['engins']
+        # Arêtes au format renvoyé par la requête SQL des couples éligibles
+        lignes, colonnes = np.nonzero(generateur.random((conducteurs, engins)) < options['densite'])
+        matricules = [f'C{ligne:05d}' for ligne in lignes]
+        codes_engins = [f'E{colonne:04d}' for colonne in colonnes]
+        poids = generateur.integers(1, 4, len(lignes)) + generateur.random(len(lignes))
+        self.stdout.write(f"Instance     : {conducteurs} conducteurs x {engins} engins, {len(lignes)} couples éligibles")
+
+        solveurs = ['numpy'] + (['scipy'] if affectation_auto.linear_sum_assignment is not None else [])
+        for solveur in solveurs:
+            durees = []
+            for _ in range(options['repetitions']):
+                debut = time.perf_counter()
+                _, _, matrice = construire_matrice(matricules, codes_engins, poids)
+                choix_lignes, choix_colonnes = resoudre_affectation(matrice, solveur=solveur)
+                durees.append(time.perf_counter() - debut)
+            total = matrice[choix_lignes, choix_colonnes].sum()
+            self.stdout.write(self.style.SUCCESS(
+                f"{solveur:<12} : {min(durees) * 1000:.1f} ms (meilleur de {len(durees)}), "
+                f"{len(choix_lignes)} affectations, poids total {total:.3f}"
+            ))
+
+    def mesurer_bout_en_bout(self, generateur, options):
+        """Base de test jetable : la base configurée n'est jamais modifiée"""
+        nom_base = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            shift = self.peupler(generateur, options)
+            mesures = []
+            for _ in range(options['repetitions']):
+                # Chaque répétition écrit réellement puis est annulée : même instance à chaque fois
+                with transaction.atomic():
+                    debut = time.perf_counter()
+                    resultat = affecter_shift(shift.id_shift)
+                    mesures.append(((time.perf_counter() - debut) * 1000, resultat))
+                    transaction.set_rollback(True)
+            meilleure, resultat = min(mesures, key=lambda mesure: mesure[0])
+            self.stdout.write(self.style.SUCCESS(
+                f"affecter_shift : {meilleure:.1f} ms (meilleur de {len(mesures)}), "
+                f"dont résolution {resultat['duree_resolution_ms']:.1f} ms, "
+                f"SQL et écritures {meilleure - resultat['duree_resolution_ms']:.1f} ms ; "
+                f"{len(resultat['affectations'])} affectations, poids total {resultat['poids_total']:.3f}"
+            ))
+        finally:
+            connection.creation.destroy_test_db(nom_base, verbosity=0)
+
+    def peupler(self, generateur, options):
+        conducteurs, engins = options['conducteurs'], options['engins']
+        existantes = set(connection.introspection.table_names())
+        with connection.schema_editor() as editor:
+            for modele in (Equipe, InfoEquipe, Absences, Affectations):
+                if modele._meta.db_table not in existantes:
+                    editor.create_model(modele)
+        with connection.cursor() as cursor:
+            for table, sql in SQL_TABLES_BRUTES.items():
+                if table not in existantes:
+                    cursor.execute(sql)
+
+        debut = timezone.now().replace(hour=6, minute=0, second=0, microsecond=0)
+        shift = Shifts.objects.create(date_debut_shift=debut, date_fin_shift=debut + timedelta(hours=6))
+        matricules = [f'C{numero:05d}' for numero in range(conducteurs)]
+        codes_engins = [f'E{numero:04d}' for numero in range(engins)]
+
+        equipes = Equipe.objects.bulk_create([Equipe(id_equipe=f'EQ{numero:03d}') for numero in range(0, conducteurs, 10)])
+        InfoEquipe.objects.bulk_create([
+            InfoEquipe(id_equipe=equipes[numero // 10], matricule=matricule, fonction='conducteur')
+            for numero, matricule in enumerate(matricules)
+        ])
+        Engins.objects.bulk_create([
+            Engins(code_engin=code, famille_engin='grue', capacite_max=40, etat_engin='disponible') for code in codes_engins
+        ])
+        lignes, colonnes = np.nonzero(generateur.random((conducteurs, engins)) < options['densite'])
+        niveaux = generateur.integers(0, len(NIVEAUX_EXPERTISE), len(lignes))
+        # Un conducteur sur deux a déjà travaillé ce jour, un sur vingt est absent pendant le shift
+        heures = generateur.uniform(0, 4, conducteurs)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO qualifications_conducteurs (matricule, code_engin, niveau_expertise) VALUES (%s, %s, %s)',
+                [(matricules[l], codes_engins[c], NIVEAUX_EXPERTISE[n]) for l, c, n in zip(lignes, colonnes, niveaux)],
+            )
+            cursor.executemany(
+                'INSERT INTO cumul_heures (matricule, heure_par_jour, date) VALUES (%s, %s, %s)',
+                [(matricule, float(heures[numero]), debut.date()) for numero, matricule in enumerate(matricules) if numero % 2],
+            )
+        Absences.objects.bulk_create([
+            Absences(matricule=matricule, date_debut_abs=debut + timedelta(hours=1), date_fin_abs=debut + timedelta(hours=2))
+            for matricule in matricules[::20]
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(
+            f"Instance     : {conducteurs} conducteurs x {engins} engins, {len(lignes)} qualifications (base de test)"
+        )
+        return shift
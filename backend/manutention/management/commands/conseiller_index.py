@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from manutention.conseil_index import analyser_requetes, extraire_requetes, nom_index, script_index
+
+SOURCE_DEFAUT = Path(__file__).resolve().parents[2] / 'views.py'
+
+
+class Command(BaseCommand):
+    help = (
+        "Explique (EXPLAIN ANALYZE, BUFFERS) les requêtes SQL brutes de manutention/views.py dans une "
+        "transaction annulée, signale les Seq Scan filtrés et écrit un script CREATE INDEX CONCURRENTLY "
+        "idempotent à appliquer hors migrations"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', default=[], help="Fichier Python à analyser (répétable, views.py par défaut)")
+        parser.add_argument('--sortie', help="Fichier du script SQL (sortie standard par défaut)")
+        parser.add_argument('--timeout', type=int, default=30000, help="statement_timeout par requête, en ms")
+
+    def handle(self, *args, **options):
+        requetes = []
+        for source in options['source'] or [SOURCE_DEFAUT]:
+            if not Path(source).is_file():
+                raise CommandError(f"Fichier introuvable: {source}")
+            requetes.extend(extraire_requetes(source))
+
+        resultats, propositions = analyser_requetes(requetes, timeout_ms=options['timeout'])
+        for resultat in resultats:
+            entete = f"{resultat['origine']} (l.{resultat['ligne']})"
+            if resultat['erreur']:
+                self.stderr.write(f"{entete} : ignorée ({resultat['erreur']})")
+            for scan in resultat['scans']:
+                colonnes = ', '.join(scan['colonnes']) or 'aucune colonne indexable'
+                self.stdout.write(self.style.WARNING(
+                    f"{entete} : Seq Scan sur {scan['table']} ({scan['filtre']}) -> {colonnes}"
+                ))
+
+        script = script_index(propositions)
+        if options['sortie']:
+            Path(options['sortie']).write_text(script, encoding='utf-8')
+        else:
+            self.stdout.write(script)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(resultats)} requête(s) analysée(s), {sum(1 for r in resultats if r['erreur'])} ignorée(s), "
+            f"{len(propositions)} index proposé(s)"
+            + (f" : {', '.join(nom_index(table, colonnes) for table, colonnes in propositions)}" if propositions else '')
+        ))
@@ -0,0 +1,40 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from manutention.detection_absences import detecter_absences_non_declarees
+
+
+class Command(BaseCommand):
+    help = (
+        "Détecte les absences non déclarées des shifts terminés (employés attendus sans absence "
+        "déclarée ni heures saisies) ; idempotent, à planifier en cron après chaque fin de shift"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=2, help="Shifts terminés depuis ce nombre de jours (défaut 2)")
+        parser.add_argument('--debut', help="Premier jour de fin de shift (YYYY-MM-DD)")
+        parser.add_argument('--fin', help="Dernier jour de fin de shift (YYYY-MM-DD, aujourd'hui par défaut)")
+
+    def handle(self, *args, **options):
+        fin = timezone.now()
+        debut = fin - timedelta(days=options['jours'])
+        if options['debut'] or options['fin']:
+            jours = {}
+            for param in ('debut', 'fin'):
+                if options[param]:
+                    jours[param] = parse_date(options[param])
+                    if jours[param] is None:
+                        raise CommandError(f"--{param} invalide (format YYYY-MM-DD)")
+            fin_jour = jours.get('fin', timezone.localdate())
+            debut_jour = jours.get('debut', fin_jour)
+            debut = timezone.make_aware(datetime.combine(debut_jour, time.min))
+            fin = timezone.make_aware(datetime.combine(fin_jour + timedelta(days=1), time.min))
+
+        creees = detecter_absences_non_declarees(debut, fin)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(creees)} absence(s) non déclarée(s) détectée(s) pour les shifts terminés "
+            f"entre {timezone.localtime(debut):%Y-%m-%d %H:%M} et {timezone.localtime(fin):%Y-%m-%d %H:%M}"
+        ))
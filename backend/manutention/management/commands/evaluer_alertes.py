@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from manutention.alertes import installer_moteur_alertes, reevaluer_alertes
+from manutention.caching import invalider
+
+
+class Command(BaseCommand):
+    help = (
+        "Réévalue les alertes d'heures sur une période (aujourd'hui par défaut), "
+        "par exemple après une modification des limites dans la table configuration"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Premier jour (YYYY-MM-DD)")
+        parser.add_argument('--fin', help="Dernier jour (YYYY-MM-DD), aujourd'hui par défaut")
+        parser.add_argument(
+            '--installer', action='store_true',
+            help="(Ré)installe d'abord la fonction et le trigger sur cumul_heures",
+        )
+
+    def handle(self, *args, **options):
+        aujourdhui = timezone.localdate()
+        debut = self.lire_date(options['debut'], aujourdhui)
+        fin = self.lire_date(options['fin'], aujourdhui)
+        if debut > fin:
+            raise CommandError("--debut doit précéder --fin")
+
+        if options['installer']:
+            installer_moteur_alertes()
+            self.stdout.write("Triggers cumul_heures_alertes et configuration_modifiee installés")
+        # Limites en cache (endpoint, affectation automatique) relues après la modification
+        invalider('configuration')
+        evalues = reevaluer_alertes(debut, fin)
+        self.stdout.write(self.style.SUCCESS(f"{evalues} couple(s) matricule/jour évalué(s) du {debut} au {fin}"))
+
+    def lire_date(self, valeur, defaut):
+        if not valeur:
+            return defaut
+        date = parse_date(valeur)
+        if date is None:
+            raise CommandError(f"Date invalide: {valeur}")
+        return date
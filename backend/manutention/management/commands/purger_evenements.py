@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from manutention.evenements import purger_journal
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les événements temps réel plus anciens que --jours du journal ; "
+        "un client qui reprend avant cette limite est invité à se resynchroniser"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=7, help="Ancienneté conservée (7 jours par défaut)")
+
+    def handle(self, *args, **options):
+        if options['jours'] < 1:
+            raise CommandError("--jours doit être au moins 1")
+        supprimes = purger_journal(timezone.now() - timedelta(days=options['jours']))
+        self.stdout.write(self.style.SUCCESS(f"{supprimes} événement(s) supprimé(s)"))
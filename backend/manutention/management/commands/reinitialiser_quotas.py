@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from manutention.models import ChefEscale
+from manutention.quotas import QUOTA_AFF_MANUELLE, reinitialiser_quotas, reinitialiser_quotas_shifts_commences
+
+
+class Command(BaseCommand):
+    help = (
+        "Remet à {} le quota d'affectations manuelles des chefs d'escale dont le shift "
+        "a commencé (une fois par shift) ; à planifier en cron toutes les quelques minutes"
+    ).format(QUOTA_AFF_MANUELLE)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tous', action='store_true', help="Réinitialise tous les chefs d'escale, shift ou non")
+        parser.add_argument('--chef', action='append', default=[], help="Réinitialise ce chef d'escale (répétable)")
+
+    def handle(self, *args, **options):
+        if options['tous'] or options['chef']:
+            ids_chefs = options['chef'] or ChefEscale.objects.values_list('id_chef_escale', flat=True)
+            total = reinitialiser_quotas(ids_chefs, reference='manuel')
+        else:
+            total = reinitialiser_quotas_shifts_commences()
+        self.stdout.write(self.style.SUCCESS(f"{total} quota(s) réinitialisé(s)"))
@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from manutention.jobs import executer_job, liberer_jobs_orphelins, reserver_job, signaler_activite
+
+
+class Command(BaseCommand):
+    help = "Exécute les jobs en attente (scraping, rapports, imports) dans un pool de threads borné"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'JOBS_WORKERS', 2),
+            help="Nombre maximal de jobs exécutés simultanément",
+        )
+        parser.add_argument(
+            '--intervalle', type=float, default=getattr(settings, 'JOBS_INTERVALLE_POLL', 2.0),
+            help="Secondes entre deux consultations de la file quand elle est vide",
+        )
+        parser.add_argument(
+            '--une-fois', action='store_true',
+            help="Vide la file puis s'arrête (cron, tests)",
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        intervalle_heartbeat = getattr(settings, 'JOBS_INTERVALLE_HEARTBEAT', 15)
+        self.liberer_orphelins()
+
+        self.stdout.write(f"Worker de jobs démarré ({workers} thread(s))")
+        # future -> id du job exécuté
+        en_cours = {}
+        dernier_heartbeat = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job') as pool:
+            try:
+                while True:
+                    # Heartbeat de nos jobs avant de libérer ceux des workers disparus
+                    if time.monotonic() - dernier_heartbeat >= intervalle_heartbeat:
+                        signaler_activite(list(en_cours.values()))
+                        self.liberer_orphelins()
+                        dernier_heartbeat = time.monotonic()
+
+                    # Ne réserver que ce que le pool peut exécuter immédiatement
+                    while len(en_cours) < workers:
+                        job = reserver_job()
+                        if job is None:
+                            break
+                        self.stdout.write(f"▶ {job}")
+                        en_cours[pool.submit(executer_job, job)] = job.pk
+
+                    if not en_cours:
+                        if options['une_fois']:
+                            break
+                        time.sleep(options['intervalle'])
+                        continue
+                    _, restants = wait(en_cours, timeout=options['intervalle'], return_when=FIRST_COMPLETED)
+                    en_cours = {future: en_cours[future] for future in restants}
+            except KeyboardInterrupt:
+                self.stdout.write("Arrêt demandé, attente des jobs en cours...")
+        self.stdout.write(self.style.SUCCESS("Worker de jobs arrêté"))
+
+    def liberer_orphelins(self):
+        liberes = liberer_jobs_orphelins()
+        if liberes:
+            self.stdout.write(self.style.WARNING(f"{liberes} job(s) orphelin(s) marqué(s) en échec"))
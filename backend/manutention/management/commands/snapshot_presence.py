@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from manutention.presence import recalculer_presence
+
+
+class Command(BaseCommand):
+    help = "Remplit ou recalcule la table presence_journaliere sur une période (aujourd'hui par défaut)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Premier jour (YYYY-MM-DD)")
+        parser.add_argument('--fin', help="Dernier jour (YYYY-MM-DD), aujourd'hui par défaut")
+        parser.add_argument('--jours-par-lot', type=int, default=31, help="Jours recalculés par requête")
+
+    def handle(self, *args, **options):
+        aujourdhui = timezone.localdate()
+        debut = self.lire_date(options['debut'], aujourdhui)
+        fin = self.lire_date(options['fin'], aujourdhui)
+        if debut > fin:
+            raise CommandError("--debut doit précéder --fin")
+
+        total = 0
+        lot = timedelta(days=max(1, options['jours_par_lot']))
+        courant = debut
+        # Une requête ensembliste par lot de jours pour borner la transaction
+        while courant <= fin:
+            fin_lot = min(courant + lot - timedelta(days=1), fin)
+            modifiees = recalculer_presence(courant, fin_lot)
+            total += modifiees
+            self.stdout.write(f"{courant} → {fin_lot} : {modifiees} ligne(s)")
+            courant = fin_lot + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Présence journalière à jour ({total} ligne(s) écrite(s))"))
+
+    def lire_date(self, valeur, defaut):
+        if not valeur:
+            return defaut
+        date = parse_date(valeur)
+        if date is None:
+            raise CommandError(f"Date invalide: {valeur}")
+        return date
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0006_absencesnondeclarees_affectations_chefescaleavance_and_more'),
+    ]
+
+    operations = [
+        # La table n'est pas gérée par Django : l'index est créé en SQL,
+        # la contrainte n'est déclarée que dans l'état des migrations
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    """
+                    -- Supprimer les doublons accumulés par les anciens rafraîchissements
+                    -- (on conserve la ligne la plus récente de chaque escale)
+                    DELETE FROM navires_previsionnels a
+                    USING navires_previsionnels b
+                    WHERE a.nom = b.nom
+                      AND a.date_arrivee = b.date_arrivee
+                      AND a.port = b.port
+                      AND a.id < b.id;
+
+                    CREATE UNIQUE INDEX IF NOT EXISTS navires_previsionnels_cle_naturelle
+                    ON navires_previsionnels (nom, date_arrivee, port);
+                    """,
+                    """
+                    DROP INDEX IF EXISTS navires_previsionnels_cle_naturelle;
+                    """
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='navireprevisionnel',
+                    constraint=models.UniqueConstraint(fields=('nom', 'date_arrivee', 'port'), name='navires_previsionnels_cle_naturelle'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0007_navires_previsionnels_cle_naturelle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('type_job', models.CharField(max_length=50)),
+                ('statut', models.CharField(choices=[('en attente', 'En attente'), ('en cours', 'En cours'), ('terminé', 'Terminé'), ('échoué', 'Échoué')], default='en attente', max_length=20)),
+                ('parametres', models.JSONField(blank=True, default=dict)),
+                ('progression', models.PositiveSmallIntegerField(default=0)),
+                ('message', models.CharField(blank=True, default='', max_length=255)),
+                ('resultat', models.JSONField(blank=True, null=True)),
+                ('erreur', models.TextField(blank=True, default='')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'jobs',
+                'ordering': ['-date_creation'],
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='jobs_statut_date_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('statut__in', ['en attente', 'en cours'])), fields=('type_job',), name='jobs_un_seul_actif_par_type')],
+            },
+        ),
+    ]
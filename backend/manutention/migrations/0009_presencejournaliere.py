@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresenceJournaliere',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('matricule', models.CharField(max_length=30)),
+                ('jour', models.DateField()),
+                ('statut', models.CharField(choices=[('present', 'Présent'), ('absent', 'Absent (déclaré)'), ('absent_non_declare', 'Absent (non déclaré)')], default='present', max_length=20)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'presence_journaliere',
+                'indexes': [models.Index(fields=['jour', 'statut'], name='presence_jour_statut_idx')],
+                'constraints': [models.UniqueConstraint(fields=('matricule', 'jour'), name='presence_journaliere_matricule_jour')],
+            },
+        ),
+    ]
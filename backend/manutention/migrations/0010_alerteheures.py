@@ -0,0 +1,132 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+# SQL figé à l'écriture de la migration : manutention.alertes peut évoluer depuis
+SQL_FONCTION_EVALUATION = """
+    CREATE OR REPLACE FUNCTION evaluer_alerte_heures(p_matricule VARCHAR, p_jour DATE)
+    RETURNS VOID AS $$
+    DECLARE
+        v_min DOUBLE PRECISION := 2;
+        v_max DOUBLE PRECISION := 8;
+        v_heures DOUBLE PRECISION;
+        v_type VARCHAR;
+        v_limite DOUBLE PRECISION;
+    BEGIN
+        IF p_matricule IS NULL OR p_jour IS NULL THEN
+            RETURN;
+        END IF;
+
+        -- Limites configurables ; une valeur absente ou illisible garde le défaut
+        IF to_regclass('configuration') IS NOT NULL THEN
+            BEGIN
+                EXECUTE 'SELECT
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_min_heures''), $1),
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_max_heures''), $2)'
+                INTO v_min, v_max USING v_min, v_max;
+            EXCEPTION WHEN others THEN
+                v_min := 2;
+                v_max := 8;
+            END;
+        END IF;
+
+        SELECT SUM(heure_par_jour) INTO v_heures
+        FROM cumul_heures
+        WHERE matricule = p_matricule AND date = p_jour;
+
+        IF v_heures > v_max THEN
+            v_type := 'excess';
+            v_limite := v_max;
+        ELSIF v_heures < v_min THEN
+            v_type := 'lack';
+            v_limite := v_min;
+        END IF;
+
+        -- Fermeture de l'alerte active si le seuil n'est plus franchi (ou l'autre l'est)
+        UPDATE alertes_heures SET date_fermeture = NOW()
+        WHERE matricule = p_matricule AND jour = p_jour AND date_fermeture IS NULL
+          AND (v_type IS NULL OR type_alerte <> v_type);
+
+        IF v_type IS NOT NULL THEN
+            INSERT INTO alertes_heures (matricule, jour, type_alerte, heures, limite, date_ouverture)
+            VALUES (p_matricule, p_jour, v_type, v_heures, v_limite, NOW())
+            ON CONFLICT (matricule, jour) WHERE date_fermeture IS NULL
+            DO UPDATE SET heures = EXCLUDED.heures, limite = EXCLUDED.limite;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# cumul_heures est une table historique hors migrations : sans elle, le trigger
+# s'installe plus tard avec python manage.py evaluer_alertes --installer
+SQL_TRIGGER_CUMUL_HEURES = """
+    CREATE OR REPLACE FUNCTION cumul_heures_alertes() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM evaluer_alerte_heures(OLD.matricule, OLD.date);
+        END IF;
+        IF TG_OP = 'INSERT' OR (
+            TG_OP = 'UPDATE' AND (NEW.matricule, NEW.date) IS DISTINCT FROM (OLD.matricule, OLD.date)
+        ) THEN
+            PERFORM evaluer_alerte_heures(NEW.matricule, NEW.date);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DO $$
+    BEGIN
+        IF to_regclass('cumul_heures') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS cumul_heures_alertes ON cumul_heures;
+            CREATE TRIGGER cumul_heures_alertes
+                AFTER INSERT OR UPDATE OR DELETE ON cumul_heures
+                FOR EACH ROW EXECUTE FUNCTION cumul_heures_alertes();
+        END IF;
+    END $$;
+"""
+
+SQL_SUPPRESSION_MOTEUR = """
+    DO $$
+    BEGIN
+        IF to_regclass('cumul_heures') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS cumul_heures_alertes ON cumul_heures;
+        END IF;
+    END $$;
+    DROP FUNCTION IF EXISTS cumul_heures_alertes();
+    DROP FUNCTION IF EXISTS evaluer_alerte_heures(VARCHAR, DATE);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0009_presencejournaliere'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlerteHeures',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('matricule', models.CharField(max_length=30)),
+                ('jour', models.DateField()),
+                ('type_alerte', models.CharField(choices=[('excess', 'Surcharge'), ('lack', 'Sous-charge')], max_length=10)),
+                ('heures', models.FloatField()),
+                ('limite', models.FloatField()),
+                ('date_ouverture', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_fermeture', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'alertes_heures',
+                'indexes': [
+                    models.Index(condition=models.Q(('date_fermeture__isnull', True)), fields=['jour'], name='alertes_heures_actives_idx'),
+                    models.Index(fields=['matricule', 'jour'], name='alertes_heures_matricule_idx'),
+                ],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('date_fermeture__isnull', True)), fields=('matricule', 'jour'), name='alertes_heures_une_active_par_jour')],
+            },
+        ),
+        # Évaluation des seuils à chaque écriture dans cumul_heures (table non gérée)
+        migrations.RunSQL(
+            sql=[SQL_FONCTION_EVALUATION, SQL_TRIGGER_CUMUL_HEURES],
+            reverse_sql=SQL_SUPPRESSION_MOTEUR,
+        ),
+    ]
@@ -0,0 +1,107 @@
+from django.db import migrations
+
+# SQL figé à l'écriture de la migration : manutention.alertes peut évoluer depuis
+SQL_FONCTION_EVALUATION = """
+    CREATE OR REPLACE FUNCTION evaluer_alerte_heures(p_matricule VARCHAR, p_jour DATE)
+    RETURNS VOID AS $$
+    DECLARE
+        v_min DOUBLE PRECISION := 2;
+        v_max DOUBLE PRECISION := 8;
+        v_heures DOUBLE PRECISION;
+        v_type VARCHAR;
+        v_limite DOUBLE PRECISION;
+        v_id BIGINT;
+        v_type_ferme VARCHAR;
+        v_inseree BOOLEAN;
+    BEGIN
+        IF p_matricule IS NULL OR p_jour IS NULL THEN
+            RETURN;
+        END IF;
+
+        -- Limites configurables ; une valeur absente ou illisible garde le défaut
+        IF to_regclass('configuration') IS NOT NULL THEN
+            BEGIN
+                EXECUTE 'SELECT
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_min_heures''), $1),
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_max_heures''), $2)'
+                INTO v_min, v_max USING v_min, v_max;
+            EXCEPTION WHEN others THEN
+                v_min := 2;
+                v_max := 8;
+            END;
+        END IF;
+
+        SELECT SUM(heure_par_jour) INTO v_heures
+        FROM cumul_heures
+        WHERE matricule = p_matricule AND date = p_jour;
+
+        IF v_heures > v_max THEN
+            v_type := 'excess';
+            v_limite := v_max;
+        ELSIF v_heures < v_min THEN
+            v_type := 'lack';
+            v_limite := v_min;
+        END IF;
+
+        -- Fermeture de l'alerte active si le seuil n'est plus franchi (ou l'autre l'est)
+        UPDATE alertes_heures SET date_fermeture = NOW()
+        WHERE matricule = p_matricule AND jour = p_jour AND date_fermeture IS NULL
+          AND (v_type IS NULL OR type_alerte <> v_type)
+        RETURNING id, type_alerte INTO v_id, v_type_ferme;
+
+        IF v_id IS NOT NULL THEN
+            PERFORM pg_notify('evenements_hosting', json_build_object(
+                'canal', 'alertes', 'type', 'fermee',
+                'donnees', json_build_object('id', v_id, 'matricule', p_matricule, 'jour', p_jour, 'type_alerte', v_type_ferme)
+            )::text);
+            v_id := NULL;
+        END IF;
+
+        IF v_type IS NOT NULL THEN
+            INSERT INTO alertes_heures (matricule, jour, type_alerte, heures, limite, date_ouverture)
+            VALUES (p_matricule, p_jour, v_type, v_heures, v_limite, NOW())
+            ON CONFLICT (matricule, jour) WHERE date_fermeture IS NULL
+            DO UPDATE SET heures = EXCLUDED.heures, limite = EXCLUDED.limite
+                WHERE (alertes_heures.heures, alertes_heures.limite) IS DISTINCT FROM (EXCLUDED.heures, EXCLUDED.limite)
+            RETURNING id, (xmax = 0) INTO v_id, v_inseree;
+
+            -- Pas de notification si l'alerte active est inchangée
+            IF v_id IS NOT NULL THEN
+                PERFORM pg_notify('evenements_hosting', json_build_object(
+                    'canal', 'alertes', 'type', CASE WHEN v_inseree THEN 'ouverte' ELSE 'mise_a_jour' END,
+                    'donnees', json_build_object(
+                        'id', v_id, 'matricule', p_matricule, 'jour', p_jour, 'type_alerte', v_type,
+                        'heures', v_heures, 'limite', v_limite
+                    )
+                )::text);
+            END IF;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Ouverture des alertes du jour pour les heures déjà saisies. Exécutée ici et non
+# dans 0010 : l'index unique partiel d'alertes_heures, cible de l'ON CONFLICT,
+# n'est créé qu'à la fin de la migration qui crée la table.
+SQL_EVALUATION_INITIALE = """
+    DO $$
+    BEGIN
+        IF to_regclass('cumul_heures') IS NOT NULL THEN
+            PERFORM evaluer_alerte_heures(s.matricule, s.date)
+            FROM (SELECT DISTINCT matricule, date FROM cumul_heures WHERE date = CURRENT_DATE) s;
+        END IF;
+    END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0010_alerteheures'),
+    ]
+
+    operations = [
+        # evaluer_alerte_heures publie désormais l'ouverture / la fermeture des alertes (pg_notify)
+        migrations.RunSQL(sql=SQL_FONCTION_EVALUATION, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(sql=SQL_EVALUATION_INITIALE, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,26 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0011_alertes_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Evenement',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('canal', models.CharField(max_length=30)),
+                ('type_evenement', models.CharField(max_length=30)),
+                ('donnees', models.JSONField(default=dict)),
+                ('date_creation', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'evenements',
+                'indexes': [models.Index(fields=['canal', 'id'], name='evenements_canal_id_idx')],
+            },
+        ),
+    ]
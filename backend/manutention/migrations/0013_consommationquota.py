@@ -0,0 +1,40 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0012_evenement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsommationQuota',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('id_chef_escale', models.CharField(max_length=30)),
+                ('operation', models.CharField(choices=[('consommation', 'Consommation'), ('remboursement', 'Remboursement'), ('reinitialisation', 'Réinitialisation'), ('ajustement', 'Ajustement manuel')], max_length=20)),
+                ('delta', models.IntegerField()),
+                ('restant', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=100, null=True)),
+                ('date_operation', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'consommations_quota',
+                'indexes': [
+                    models.Index(fields=['id_chef_escale', 'date_operation'], name='conso_quota_chef_date_idx'),
+                    models.Index(fields=['operation', 'reference'], name='conso_quota_operation_ref_idx'),
+                ],
+            },
+        ),
+        # Valeurs hors bornes ramenées dans [0, 4] avant la contrainte
+        migrations.RunSQL(
+            sql='UPDATE "CHEF_ESCALE" SET nbr_aff_manuelle = LEAST(GREATEST(nbr_aff_manuelle, 0), 4)',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='chefescale',
+            constraint=models.CheckConstraint(condition=models.Q(('nbr_aff_manuelle__gte', 0), ('nbr_aff_manuelle__lte', 4)), name='chef_escale_quota_borne'),
+        ),
+    ]
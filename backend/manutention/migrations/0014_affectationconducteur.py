@@ -0,0 +1,31 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0013_consommationquota'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AffectationConducteur',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('id_shift', models.IntegerField()),
+                ('matricule', models.CharField(max_length=30)),
+                ('code_engin', models.CharField(max_length=30)),
+                ('poids', models.FloatField()),
+                ('id_affectation', models.IntegerField(blank=True, null=True)),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'affectations_conducteurs',
+                'constraints': [
+                    models.UniqueConstraint(fields=('id_shift', 'matricule'), name='affectations_conducteurs_un_engin'),
+                    models.UniqueConstraint(fields=('id_shift', 'code_engin'), name='affectations_conducteurs_un_conducteur'),
+                ],
+            },
+        ),
+    ]
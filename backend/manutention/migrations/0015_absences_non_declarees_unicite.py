@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+# Doublons saisis à la main avant l'index unique : on garde la ligne la plus ancienne
+SQL_DEDOUBLONNAGE = '''
+    DELETE FROM "absences_non_déclarées" n
+    USING "absences_non_déclarées" autre
+    WHERE n.matricule = autre.matricule AND n.id_shift = autre.id_shift AND n.id > autre.id
+'''
+
+# Colonne ajoutée hors migrations sur la base réelle : les insertions SQL de la détection ne la renseignent pas
+SQL_DEFAUT_EST_JUSTIFIE = '''
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'absences_non_déclarées' AND column_name = 'est_justifie'
+        ) THEN
+            ALTER TABLE "absences_non_déclarées" ALTER COLUMN est_justifie SET DEFAULT false;
+        END IF;
+    END $$;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0014_affectationconducteur'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL_DEDOUBLONNAGE, migrations.RunSQL.noop),
+        migrations.RunSQL(SQL_DEFAUT_EST_JUSTIFIE, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='absencenondeclaree',
+            constraint=models.UniqueConstraint(fields=('matricule', 'id_shift'), name='absences_non_declarees_matricule_shift'),
+        ),
+    ]
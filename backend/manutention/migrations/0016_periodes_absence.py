@@ -0,0 +1,144 @@
+from django.db import migrations
+
+# SQL figé à l'écriture de la migration : manutention.periodes_absence et
+# manutention.alertes peuvent évoluer depuis
+SQL_FONCTIONS_PERIODE = """
+    CREATE OR REPLACE FUNCTION periode_absence(debut TIMESTAMPTZ, fin TIMESTAMPTZ)
+    RETURNS TSTZRANGE AS $$
+        SELECT tstzrange(LEAST(debut, fin), GREATEST(debut, fin), '[]')
+    $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+    CREATE OR REPLACE FUNCTION periode_absence(debut TIMESTAMP, fin TIMESTAMP)
+    RETURNS TSTZRANGE AS $$
+        SELECT tstzrange(LEAST(debut, fin) AT TIME ZONE 'UTC', GREATEST(debut, fin) AT TIME ZONE 'UTC', '[]')
+    $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+"""
+
+# Index créés seulement si la table existe (tables historiques hors migrations)
+SQL_INDEX_PERIODES = """
+    DO $$
+    BEGIN
+        IF to_regclass('absences') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS absences_periode_gist
+                ON absences USING gist (periode_absence(date_debut_abs, date_fin_abs));
+            CREATE INDEX IF NOT EXISTS absences_matricule_idx ON absences (matricule);
+        END IF;
+        IF to_regclass('"absences_non_déclarées"') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS absences_non_declarees_periode_gist
+                ON "absences_non_déclarées" USING gist (periode_absence(date_debut_abs, date_fin_abs));
+        END IF;
+    END $$;
+"""
+
+SQL_SUPPRESSION_PERIODES = """
+    DROP INDEX IF EXISTS absences_periode_gist;
+    DROP INDEX IF EXISTS absences_matricule_idx;
+    DROP INDEX IF EXISTS absences_non_declarees_periode_gist;
+    DROP FUNCTION IF EXISTS periode_absence(TIMESTAMPTZ, TIMESTAMPTZ);
+    DROP FUNCTION IF EXISTS periode_absence(TIMESTAMP, TIMESTAMP);
+"""
+
+SQL_FONCTION_EVALUATION = """
+    CREATE OR REPLACE FUNCTION evaluer_alerte_heures(p_matricule VARCHAR, p_jour DATE)
+    RETURNS VOID AS $$
+    DECLARE
+        v_min DOUBLE PRECISION := 2;
+        v_max DOUBLE PRECISION := 8;
+        v_heures DOUBLE PRECISION;
+        v_type VARCHAR;
+        v_limite DOUBLE PRECISION;
+        v_id BIGINT;
+        v_type_ferme VARCHAR;
+        v_inseree BOOLEAN;
+    BEGIN
+        IF p_matricule IS NULL OR p_jour IS NULL THEN
+            RETURN;
+        END IF;
+
+        -- Limites configurables ; une valeur absente ou illisible garde le défaut
+        IF to_regclass('configuration') IS NOT NULL THEN
+            BEGIN
+                EXECUTE 'SELECT
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_min_heures''), $1),
+                    COALESCE((SELECT valeur::double precision FROM configuration WHERE cle = ''limite_max_heures''), $2)'
+                INTO v_min, v_max USING v_min, v_max;
+            EXCEPTION WHEN others THEN
+                v_min := 2;
+                v_max := 8;
+            END;
+        END IF;
+
+        SELECT SUM(heure_par_jour) INTO v_heures
+        FROM cumul_heures
+        WHERE matricule = p_matricule AND date = p_jour;
+
+        IF v_heures > v_max THEN
+            v_type := 'excess';
+            v_limite := v_max;
+        ELSIF v_heures < v_min THEN
+            v_type := 'lack';
+            v_limite := v_min;
+        END IF;
+
+        -- Sous-charge expliquée par une absence déclarée : pas d'alerte
+        IF v_type = 'lack' AND to_regclass('absences') IS NOT NULL
+           AND to_regprocedure('periode_absence(timestamp, timestamp)') IS NOT NULL THEN
+            IF EXISTS (
+                SELECT 1 FROM absences a
+                WHERE a.matricule = p_matricule AND a.etat IS DISTINCT FROM 'refusée'
+                  AND periode_absence(a.date_debut_abs, a.date_fin_abs) && tstzrange(p_jour::timestamptz, p_jour + INTERVAL '1 day', '[)')
+            ) THEN
+                v_type := NULL;
+            END IF;
+        END IF;
+
+        -- Fermeture de l'alerte active si le seuil n'est plus franchi (ou l'autre l'est)
+        UPDATE alertes_heures SET date_fermeture = NOW()
+        WHERE matricule = p_matricule AND jour = p_jour AND date_fermeture IS NULL
+          AND (v_type IS NULL OR type_alerte <> v_type)
+        RETURNING id, type_alerte INTO v_id, v_type_ferme;
+
+        IF v_id IS NOT NULL THEN
+            PERFORM pg_notify('evenements_hosting', json_build_object(
+                'canal', 'alertes', 'type', 'fermee',
+                'donnees', json_build_object('id', v_id, 'matricule', p_matricule, 'jour', p_jour, 'type_alerte', v_type_ferme)
+            )::text);
+            v_id := NULL;
+        END IF;
+
+        IF v_type IS NOT NULL THEN
+            INSERT INTO alertes_heures (matricule, jour, type_alerte, heures, limite, date_ouverture)
+            VALUES (p_matricule, p_jour, v_type, v_heures, v_limite, NOW())
+            ON CONFLICT (matricule, jour) WHERE date_fermeture IS NULL
+            DO UPDATE SET heures = EXCLUDED.heures, limite = EXCLUDED.limite
+                WHERE (alertes_heures.heures, alertes_heures.limite) IS DISTINCT FROM (EXCLUDED.heures, EXCLUDED.limite)
+            RETURNING id, (xmax = 0) INTO v_id, v_inseree;
+
+            -- Pas de notification si l'alerte active est inchangée
+            IF v_id IS NOT NULL THEN
+                PERFORM pg_notify('evenements_hosting', json_build_object(
+                    'canal', 'alertes', 'type', CASE WHEN v_inseree THEN 'ouverte' ELSE 'mise_a_jour' END,
+                    'donnees', json_build_object(
+                        'id', v_id, 'matricule', p_matricule, 'jour', p_jour, 'type_alerte', v_type,
+                        'heures', v_heures, 'limite', v_limite
+                    )
+                )::text);
+            END IF;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0015_absences_non_declarees_unicite'),
+    ]
+
+    operations = [
+        # periode_absence() et ses index GiST : chevauchements d'absences indexables
+        migrations.RunSQL(sql=SQL_FONCTIONS_PERIODE + SQL_INDEX_PERIODES, reverse_sql=SQL_SUPPRESSION_PERIODES),
+        # evaluer_alerte_heures n'ouvre plus d'alerte de sous-charge un jour d'absence déclarée
+        migrations.RunSQL(sql=SQL_FONCTION_EVALUATION, reverse_sql=migrations.RunSQL.noop),
+    ]
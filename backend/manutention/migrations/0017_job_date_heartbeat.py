@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manutention', '0016_periodes_absence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='date_heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -109,6 +109,10 @@ class AbsenceNonDeclaree(models.Model):
 
     class Meta:
         db_table = 'absences_non_déclarées'
+        constraints = [
+            # Une absence non déclarée par employé et par shift (détection idempotente)
+            models.UniqueConstraint(fields=['matricule', 'id_shift'], name='absences_non_declarees_matricule_shift'),
+        ]
 
     def __str__(self):
         return f"Absence non déclarée {self.id} - {self.matricule}"
@@ -124,6 +128,13 @@ class ChefEscale(models.Model):
 
     class Meta:
         db_table = 'CHEF_ESCALE'
+        constraints = [
+            # Quota d'affectations manuelles (manutention.quotas.QUOTA_AFF_MANUELLE)
+            models.CheckConstraint(
+                condition=models.Q(nbr_aff_manuelle__gte=0) & models.Q(nbr_aff_manuelle__lte=4),
+                name='chef_escale_quota_borne',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.nom} {self.prenom} ({self.id_chef_escale})"
@@ -182,10 +193,11 @@ class QualificationsConducteurs(models.Model):
         return f"Qualification {self.id_qualification}"
 
 class CumulHeures(models.Model):
-    id_cumul = models.AutoField(primary_key=True)
+    # Noms de colonnes de la table réelle, telle que lue par les requêtes SQL brutes
+    id_cumul = models.AutoField(primary_key=True, db_column='id_cumul_heures')
     code_engin = models.ForeignKey(Engins, models.DO_NOTHING, db_column='code_engin', blank=True, null=True)
-    heure_par_engin = models.FloatField(blank=True, null=True)
-    date_cumul = models.DateField(blank=True, null=True)
+    heure_par_engin = models.FloatField(db_column='heure_par_jour', blank=True, null=True)
+    date_cumul = models.DateField(db_column='date', blank=True, null=True)
 
     class Meta:
         managed = False
@@ -409,6 +421,216 @@ class NavirePrevisionnel(models.Model):
         managed = False
         db_table = 'navires_previsionnels'
         ordering = ['date_arrivee', 'heure_arrivee']
+        constraints = [
+            # Clé naturelle utilisée par l'upsert du scraper (navires_ingestion)
+            models.UniqueConstraint(fields=['nom', 'date_arrivee', 'port'], name='navires_previsionnels_cle_naturelle'),
+        ]
 
     def __str__(self):
         return f"{self.nom} ({self.type})"
+
+class Job(models.Model):
+    """Tâche de fond exécutée par la commande run_jobs (voir manutention.jobs)"""
+    EN_ATTENTE = 'en attente'
+    EN_COURS = 'en cours'
+    TERMINE = 'terminé'
+    ECHOUE = 'échoué'
+    STATUT_CHOICES = [
+        (EN_ATTENTE, 'En attente'),
+        (EN_COURS, 'En cours'),
+        (TERMINE, 'Terminé'),
+        (ECHOUE, 'Échoué'),
+    ]
+    STATUTS_ACTIFS = (EN_ATTENTE, EN_COURS)
+
+    id = models.AutoField(primary_key=True)
+    type_job = models.CharField(max_length=50)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default=EN_ATTENTE)
+    parametres = models.JSONField(default=dict, blank=True)
+    progression = models.PositiveSmallIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True, default='')
+    resultat = models.JSONField(null=True, blank=True)
+    erreur = models.TextField(blank=True, default='')
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    # Renouvelé par le worker tant qu'il exécute le job (voir manutention.jobs)
+    date_heartbeat = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'jobs'
+        ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['statut', 'date_creation'], name='jobs_statut_date_idx'),
+        ]
+        constraints = [
+            # Un seul job actif par type : une deuxième demande réutilise le job en cours
+            models.UniqueConstraint(
+                fields=['type_job'],
+                condition=models.Q(statut__in=['en attente', 'en cours']),
+                name='jobs_un_seul_actif_par_type',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type_job} #{self.id} ({self.statut})"
+
+class PresenceJournaliere(models.Model):
+    """
+    Statut de présence d'un employé pour une journée, maintenu par les signaux
+    des absences (manutention.presence) et la commande snapshot_presence.
+    Une journée sans ligne pour un employé signifie qu'il était présent.
+    """
+    PRESENT = 'present'
+    ABSENT = 'absent'
+    ABSENT_NON_DECLARE = 'absent_non_declare'
+    STATUT_CHOICES = [
+        (PRESENT, 'Présent'),
+        (ABSENT, 'Absent (déclaré)'),
+        (ABSENT_NON_DECLARE, 'Absent (non déclaré)'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    matricule = models.CharField(max_length=30)
+    jour = models.DateField()
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default=PRESENT)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'presence_journaliere'
+        constraints = [
+            models.UniqueConstraint(fields=['matricule', 'jour'], name='presence_journaliere_matricule_jour'),
+        ]
+        indexes = [
+            models.Index(fields=['jour', 'statut'], name='presence_jour_statut_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.matricule} {self.jour} ({self.statut})"
+
+
+class AlerteHeures(models.Model):
+    """
+    Alerte de surcharge / sous-charge horaire d'un employé pour une journée.
+    Ouverte et fermée par le trigger cumul_heures_alertes (manutention.alertes)
+    à chaque écriture dans cumul_heures ; date_fermeture nulle = alerte active.
+    """
+    SURCHARGE = 'excess'
+    SOUS_CHARGE = 'lack'
+    TYPE_CHOICES = [
+        (SURCHARGE, 'Surcharge'),
+        (SOUS_CHARGE, 'Sous-charge'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    matricule = models.CharField(max_length=30)
+    jour = models.DateField()
+    type_alerte = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    heures = models.FloatField()
+    limite = models.FloatField()
+    date_ouverture = models.DateTimeField(default=timezone.now)
+    date_fermeture = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'alertes_heures'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['matricule', 'jour'],
+                condition=models.Q(date_fermeture__isnull=True),
+                name='alertes_heures_une_active_par_jour',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['jour'],
+                condition=models.Q(date_fermeture__isnull=True),
+                name='alertes_heures_actives_idx',
+            ),
+            models.Index(fields=['matricule', 'jour'], name='alertes_heures_matricule_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.matricule} {self.jour} {self.type_alerte} ({self.heures}h)"
+
+
+class Evenement(models.Model):
+    """
+    Journal des événements temps réel rejouables (manutention.evenements).
+    L'id, croissant dans l'ordre des commits, sert d'identifiant SSE : un
+    client reconnecté reprend après le dernier id reçu (Last-Event-ID).
+    """
+    id = models.BigAutoField(primary_key=True)
+    canal = models.CharField(max_length=30)
+    type_evenement = models.CharField(max_length=30)
+    donnees = models.JSONField(default=dict)
+    date_creation = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = 'evenements'
+        indexes = [
+            models.Index(fields=['canal', 'id'], name='evenements_canal_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.canal}:{self.type_evenement}"
+
+
+class ConsommationQuota(models.Model):
+    """
+    Journal des mouvements du quota d'affectations manuelles des chefs
+    d'escale (ChefEscale.nbr_aff_manuelle), écrit par manutention.quotas
+    dans la même transaction que le compteur.
+    """
+    CONSOMMATION = 'consommation'
+    REMBOURSEMENT = 'remboursement'
+    REINITIALISATION = 'reinitialisation'
+    AJUSTEMENT = 'ajustement'
+    OPERATION_CHOICES = [
+        (CONSOMMATION, 'Consommation'),
+        (REMBOURSEMENT, 'Remboursement'),
+        (REINITIALISATION, 'Réinitialisation'),
+        (AJUSTEMENT, 'Ajustement manuel'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    id_chef_escale = models.CharField(max_length=30)
+    operation = models.CharField(max_length=20, choices=OPERATION_CHOICES)
+    delta = models.IntegerField()
+    restant = models.IntegerField()
+    reference = models.CharField(max_length=100, blank=True, null=True)
+    date_operation = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'consommations_quota'
+        indexes = [
+            models.Index(fields=['id_chef_escale', 'date_operation'], name='conso_quota_chef_date_idx'),
+            models.Index(fields=['operation', 'reference'], name='conso_quota_operation_ref_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id_chef_escale} {self.operation} {self.delta:+d} → {self.restant}"
+
+
+class AffectationConducteur(models.Model):
+    """
+    Conducteur affecté à un engin pour un shift par le moteur d'affectation
+    automatique (manutention.affectation_auto). La ligne affectations
+    correspondante (équipe / engin / shift) est référencée par id_affectation.
+    """
+    id = models.BigAutoField(primary_key=True)
+    id_shift = models.IntegerField()
+    matricule = models.CharField(max_length=30)
+    code_engin = models.CharField(max_length=30)
+    poids = models.FloatField()
+    id_affectation = models.IntegerField(blank=True, null=True)
+    date_creation = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'affectations_conducteurs'
+        constraints = [
+            models.UniqueConstraint(fields=['id_shift', 'matricule'], name='affectations_conducteurs_un_engin'),
+            models.UniqueConstraint(fields=['id_shift', 'code_engin'], name='affectations_conducteurs_un_conducteur'),
+        ]
+
+    def __str__(self):
+        return f"Shift {self.id_shift}: {self.matricule} → {self.code_engin}"
@@ -0,0 +1,61 @@
+"""
+Lecture en cache du CSV des navires produit par le scraper.
+
+Le fichier n'est relu que si son mtime ou sa taille change : un
+rafraîchissement de tableau de bord ne coûte qu'un stat().
+"""
+
+import csv
+import os
+import threading
+
+from .navires_ingestion import LigneInvalide, parser_date
+
+# Fichier écrit par navire_scraper et lu par l'endpoint csv_data
+CSV_NAVIRES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "navires_agadir.csv")
+
+CHAMPS_CSV = ('nom', 'type', 'statut', 'date', 'heure', 'port', 'consignataire', 'operateur')
+
+_cache = {}
+_verrou = threading.Lock()
+
+
+def etag_fichier(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _parser_csv(chemin):
+    navires = []
+    with open(chemin, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # En-tête
+        for row in reader:
+            if len(row) < 8:
+                continue
+            navire = dict(zip(CHAMPS_CSV, row))
+            try:
+                date_arrivee = parser_date(navire['date'])
+            except LigneInvalide:
+                date_arrivee = None
+            navires.append((date_arrivee, navire))
+    return navires
+
+
+def lire_csv_navires(chemin=CSV_NAVIRES):
+    """
+    Retourne (stat, navires) où navires est une liste de
+    (date d'arrivée ou None, dict des colonnes). Lève FileNotFoundError.
+    """
+    stat = os.stat(chemin)
+    cle = (stat.st_mtime_ns, stat.st_size)
+    entree = _cache.get(chemin)
+    if entree is not None and entree[0] == cle:
+        return stat, entree[1]
+
+    with _verrou:
+        # Un autre thread a pu recharger le fichier pendant l'attente du verrou
+        entree = _cache.get(chemin)
+        if entree is None or entree[0] != cle:
+            entree = (cle, _parser_csv(chemin))
+            _cache[chemin] = entree
+    return stat, entree[1]
@@ -0,0 +1,142 @@
+"""
+Ingestion des navires scrapés : normalisation, validation puis upsert par lots.
+
+La clé naturelle d'un navire est (nom, date_arrivee, port) ; une même escale
+relue à chaque rafraîchissement met à jour la ligne existante au lieu d'en
+créer une nouvelle.
+"""
+
+import re
+from datetime import datetime
+
+from django.db import transaction
+
+from .models import NavirePrevisionnel
+
+CLE_NATURELLE = ('nom', 'date_arrivee', 'port')
+CHAMPS_MIS_A_JOUR = ('type', 'statut', 'heure_arrivee', 'consignataire', 'operateur')
+TAILLE_LOT_NAVIRES = 500
+
+FORMATS_DATE = ("%d/%m/%Y", "%Y-%m-%d", "%m/%d/%Y")
+NOMS_INVALIDES = ("", "Non spécifié")
+
+
+class LigneInvalide(ValueError):
+    """Ligne scrapée rejetée à la validation"""
+
+
+def nettoyer_texte(valeur):
+    return re.sub(r"\s+", " ", valeur or "").strip()
+
+
+def parser_date(valeur):
+    for format_date in FORMATS_DATE:
+        try:
+            return datetime.strptime(valeur, format_date).date()
+        except ValueError:
+            continue
+    raise LigneInvalide(f"date invalide: {valeur}")
+
+
+def parser_heure(valeur):
+    """Accepte HH:MM, HHhMM, HHMM et HMM"""
+    heure = valeur.replace(':', '').replace('h', '').replace('H', '')
+    if len(heure) == 3:
+        heure = '0' + heure
+    try:
+        return datetime.strptime(heure, "%H%M").time()
+    except ValueError:
+        raise LigneInvalide(f"heure invalide: {valeur}")
+
+
+def normaliser_ligne(cols):
+    """Transforme les cellules d'une ligne du tableau ANP en champs du modèle"""
+    if len(cols) < 8:
+        raise LigneInvalide(f"{len(cols)} colonnes au lieu de 8")
+    nom, type_navire, statut, date_str, heure_str, port, consignataire, operateur = map(nettoyer_texte, cols[:8])
+    if nom in NOMS_INVALIDES:
+        raise LigneInvalide(f"nom invalide: {nom}")
+
+    navire = {
+        'nom': nom,
+        'type': type_navire,
+        'statut': statut,
+        'date_arrivee': parser_date(date_str),
+        'heure_arrivee': parser_heure(heure_str),
+        'port': port,
+        'consignataire': consignataire,
+        'operateur': operateur,
+    }
+    for champ, valeur in navire.items():
+        max_length = NavirePrevisionnel._meta.get_field(champ).max_length
+        if max_length and len(valeur) > max_length:
+            raise LigneInvalide(f"{champ} dépasse {max_length} caractères")
+    return navire
+
+
+def cle_navire(navire):
+    return tuple(navire[champ] for champ in CLE_NATURELLE)
+
+
+def _upsert_lot(lot, compteurs):
+    """Une requête pour lire les lignes existantes du lot, une pour l'upsert"""
+    existants = {
+        cle_navire(navire): navire
+        for navire in NavirePrevisionnel.objects.filter(
+            nom__in={navire['nom'] for navire in lot},
+            date_arrivee__in={navire['date_arrivee'] for navire in lot},
+            port__in={navire['port'] for navire in lot},
+        ).values(*CLE_NATURELLE, *CHAMPS_MIS_A_JOUR)
+    }
+
+    a_ecrire = []
+    for navire in lot:
+        existant = existants.get(cle_navire(navire))
+        if existant is None:
+            compteurs['inseres'] += 1
+        elif all(existant[champ] == navire[champ] for champ in CHAMPS_MIS_A_JOUR):
+            compteurs['inchanges'] += 1
+            continue
+        else:
+            compteurs['mis_a_jour'] += 1
+        a_ecrire.append(NavirePrevisionnel(**navire))
+
+    if a_ecrire:
+        NavirePrevisionnel.objects.bulk_create(
+            a_ecrire,
+            update_conflicts=True,
+            unique_fields=list(CLE_NATURELLE),
+            update_fields=list(CHAMPS_MIS_A_JOUR),
+        )
+
+
+def ingerer_navires(lignes, taille_lot=TAILLE_LOT_NAVIRES):
+    """
+    Valide et upsert les lignes scrapées dans une seule transaction.
+
+    Retourne les compteurs inseres / mis_a_jour / inchanges / doublons /
+    rejetes et la liste des rejets (ligne, raison).
+    """
+    compteurs = {'inseres': 0, 'mis_a_jour': 0, 'inchanges': 0, 'doublons': 0, 'rejetes': 0}
+    rejets = []
+
+    # Dédoublonnage sur la clé naturelle : la dernière occurrence l'emporte
+    navires = {}
+    for cols in lignes:
+        try:
+            navire = normaliser_ligne(cols)
+        except LigneInvalide as e:
+            compteurs['rejetes'] += 1
+            rejets.append((cols, str(e)))
+            continue
+        cle = cle_navire(navire)
+        if cle in navires:
+            compteurs['doublons'] += 1
+        navires[cle] = navire
+
+    navires = list(navires.values())
+    with transaction.atomic():
+        for debut in range(0, len(navires), taille_lot):
+            _upsert_lot(navires[debut:debut + taille_lot], compteurs)
+
+    return compteurs, rejets
@@ -0,0 +1,195 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Pagination par curseur (keyset), à activer sur une vue avec
+    `pagination_class = KeysetPagination`.
+
+    Les colonnes de tri naturelles sont déclarées sur la vue avec
+    `cursor_ordering` (clé primaire par défaut), la clé primaire départage les
+    égalités. Le curseur contient la valeur de toutes ces colonnes pour la
+    dernière ligne servie, et la page suivante est obtenue par une comparaison
+    de tuples `(a, b, pk) > (a0, b0, pk0)` au lieu d'un OFFSET : le temps de
+    réponse ne dépend ni de la taille de la table ni du nombre d'égalités sur
+    la première colonne.
+
+    - ?cursor=...       curseur opaque renvoyé dans `next` / `previous`
+    - ?page_size=N      taille de page, plafonnée par CURSOR_PAGINATION['MAX_PAGE_SIZE']
+    - ?pagination=off   liste complète non paginée pour les anciens clients
+    """
+    page_size_query_param = 'page_size'
+    desactivation_query_param = 'pagination'
+
+    def __init__(self):
+        config = getattr(settings, 'CURSOR_PAGINATION', {})
+        self.page_size = config.get('PAGE_SIZE', 100)
+        self.max_page_size = config.get('MAX_PAGE_SIZE', 1000)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.desactivation_query_param) in ('off', 'false', '0'):
+            return None
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering, self.champs_curseur = self.preparer_tri(queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordre = _reverse_ordering(self.ordering) if reverse else self.ordering
+        valeurs = None
+        if self.cursor is not None and self.cursor.position is not None:
+            valeurs = self.decoder_position(self.cursor.position)
+
+        # Au plus une requête par section (NULL / non NULL) de la première colonne
+        resultats = []
+        for section in self.sections(queryset, ordre, valeurs):
+            resultats.extend(section[:self.page_size + 1 - len(resultats)])
+            if len(resultats) > self.page_size:
+                break
+        self.page = resultats[:self.page_size]
+        encore = len(resultats) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = encore
+        else:
+            self.has_next = encore
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.position(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.position(self.page[0]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def position(self, instance):
+        """Valeurs des colonnes de tri de l'instance, encodées en JSON dans le curseur"""
+        valeurs = []
+        for colonne in self.ordering:
+            valeur = getattr(instance, colonne.lstrip('-'))
+            valeurs.append(None if valeur is None else str(valeur))
+        return json.dumps(valeurs)
+
+    def decoder_position(self, position):
+        """Valeurs typées de la position d'un curseur, NotFound si elle est invalide"""
+        try:
+            valeurs = json.loads(position)
+            if not isinstance(valeurs, list) or len(valeurs) != len(self.ordering):
+                raise ValueError(position)
+            return [
+                None if valeur is None else self.champs_curseur[colonne.lstrip('-')].to_python(valeur)
+                for colonne, valeur in zip(self.ordering, valeurs)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def sections(self, queryset, ordre, valeurs):
+        """
+        Requêtes successives de la page, dans l'ordre `ordre`. NULL est la plus
+        petite valeur : en tête en tri croissant, en fin en tri décroissant.
+
+        Une première colonne nullable est lue en deux sections (non NULL puis
+        NULL, ou l'inverse). La section non NULL est triée sur la colonne
+        brute et filtrée par a >= a0 : un index btree ordinaire sur la colonne
+        sert à la fois le filtre et le tri, sans COALESCE. Les sections
+        entièrement avant le curseur sont omises.
+        """
+        colonnes = [(colonne.lstrip('-'), colonne.startswith('-')) for colonne in ordre]
+        (nom, descendant), suite = colonnes[0], colonnes[1:]
+        # Colonnes suivantes : NULL placés explicitement comme les plus petites valeurs
+        tri_suite = [
+            F(nom_suite).desc(nulls_last=True) if desc else F(nom_suite).asc(nulls_first=True)
+            for nom_suite, desc in suite
+        ]
+        non_nulles = queryset.order_by(ordre[0], *tri_suite)
+        if not self.champs_curseur[nom].null:
+            sections = [(non_nulles, False)]
+        else:
+            sections = [
+                (non_nulles.filter(**{f'{nom}__isnull': False}), False),
+                (queryset.filter(**{f'{nom}__isnull': True}).order_by(*tri_suite), True),
+            ]
+            if not descendant:
+                sections.reverse()
+
+        if valeurs is None:
+            return [section for section, _ in sections]
+        curseur_nul = valeurs[0] is None
+        retenues = []
+        depasse = False
+        for section, nulle in sections:
+            if depasse:
+                retenues.append(section)
+            elif nulle == curseur_nul:
+                # Section du curseur : seules les lignes strictement après lui
+                depasse = True
+                condition = self.filtre_apres(colonnes, valeurs)
+                if condition is None:
+                    continue
+                if not curseur_nul:
+                    condition = Q(**{f"{nom}__{'lte' if descendant else 'gte'}": valeurs[0]}) & condition
+                retenues.append(section.filter(condition))
+        return retenues
+
+    def apres_colonne(self, nom, descendant, valeur):
+        """Lignes après `valeur` sur une colonne, NULL étant la plus petite valeur ; None si aucune"""
+        if valeur is None:
+            return None if descendant else Q(**{f'{nom}__isnull': False})
+        if descendant:
+            apres = Q(**{f'{nom}__lt': valeur})
+            return apres | Q(**{f'{nom}__isnull': True}) if self.champs_curseur[nom].null else apres
+        return Q(**{f'{nom}__gt': valeur})
+
+    def filtre_apres(self, colonnes, valeurs):
+        """
+        Lignes strictement après la position dans l'ordre des colonnes :
+        (a > a0) OR (a = a0 AND b > b0) OR (a = a0 AND b = b0 AND pk > pk0),
+        None si aucune ligne ne peut suivre
+        """
+        condition = None
+        egalites = Q()
+        for (nom, descendant), valeur in zip(colonnes, valeurs):
+            apres = self.apres_colonne(nom, descendant, valeur)
+            if apres is not None:
+                condition = egalites & apres if condition is None else condition | (egalites & apres)
+            egalites &= Q(**{f'{nom}__isnull': True}) if valeur is None else Q(**{nom: valeur})
+        return condition
+
+    def preparer_tri(self, queryset, view):
+        """
+        Retourne l'ordre de tri complet (colonnes naturelles puis clé primaire
+        pour départager les égalités) et le champ de chaque colonne
+        """
+        ordre = getattr(view, 'cursor_ordering', None) or ()
+        if isinstance(ordre, str):
+            ordre = (ordre,)
+        ordre = list(ordre)
+
+        meta = queryset.model._meta
+        pk = meta.pk.name
+        descendant = bool(ordre) and ordre[0].startswith('-')
+        if pk not in (colonne.lstrip('-') for colonne in ordre):
+            ordre.append(('-' if descendant else '') + pk)
+
+        champs = {
+            colonne.lstrip('-'): meta.pk if colonne.lstrip('-') == pk else meta.get_field(colonne.lstrip('-'))
+            for colonne in ordre
+        }
+        return tuple(ordre), champs
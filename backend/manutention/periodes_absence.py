@@ -0,0 +1,98 @@
+"""
+Chevauchement d'une absence avec un instant ou une période, en prédicat indexable.
+
+Une absence couvre la période fermée [date_debut_abs, date_fin_abs], donnée
+par la fonction SQL periode_absence(debut, fin) (tstzrange, bornes remises
+dans l'ordre, NULL si une borne manque). Le test « absent à l'instant T » ou
+« absent pendant [debut, fin[ » devient periode_absence(...) @> T ou
+&& tstzrange(debut, fin), servi par un index GiST sur cette expression au lieu
+d'un DATE(colonne) BETWEEN ... qui impose un parcours séquentiel.
+
+La fonction a deux versions : les tables historiques ont des colonnes
+TIMESTAMP sans fuseau (valeurs en UTC, fuseau de connexion de Django), les
+tables créées par l'ORM des TIMESTAMPTZ. Chacune est IMMUTABLE, ce qui
+autorise l'index d'expression. Elle est installée par la migration 0016 et
+réinstallée après chaque migrate (apps.py).
+"""
+
+from django.db import connection
+
+# Tables d'absences et condition propre à chacune (absence refusée = pas d'absence)
+TABLES_ABSENCES = (
+    ('absences', "etat IS DISTINCT FROM 'refusée'"),
+    ('absences_non_déclarées', None),
+)
+
+SQL_FONCTIONS_PERIODE = '''
+    CREATE OR REPLACE FUNCTION periode_absence(debut TIMESTAMPTZ, fin TIMESTAMPTZ)
+    RETURNS TSTZRANGE AS $$
+        SELECT tstzrange(LEAST(debut, fin), GREATEST(debut, fin), '[]')
+    $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+    CREATE OR REPLACE FUNCTION periode_absence(debut TIMESTAMP, fin TIMESTAMP)
+    RETURNS TSTZRANGE AS $$
+        SELECT tstzrange(LEAST(debut, fin) AT TIME ZONE 'UTC', GREATEST(debut, fin) AT TIME ZONE 'UTC', '[]')
+    $$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+'''
+
+# Index créés seulement si la table existe (tables historiques hors migrations)
+SQL_INDEX_PERIODES = '''
+    DO $$
+    BEGIN
+        IF to_regclass('absences') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS absences_periode_gist
+                ON absences USING gist (periode_absence(date_debut_abs, date_fin_abs));
+            CREATE INDEX IF NOT EXISTS absences_matricule_idx ON absences (matricule);
+        END IF;
+        IF to_regclass('"absences_non_déclarées"') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS absences_non_declarees_periode_gist
+                ON "absences_non_déclarées" USING gist (periode_absence(date_debut_abs, date_fin_abs));
+        END IF;
+    END $$;
+'''
+
+SQL_SUPPRESSION_PERIODES = '''
+    DROP INDEX IF EXISTS absences_periode_gist;
+    DROP INDEX IF EXISTS absences_matricule_idx;
+    DROP INDEX IF EXISTS absences_non_declarees_periode_gist;
+    DROP FUNCTION IF EXISTS periode_absence(TIMESTAMPTZ, TIMESTAMPTZ);
+    DROP FUNCTION IF EXISTS periode_absence(TIMESTAMP, TIMESTAMP);
+'''
+
+
+def installer_periodes_absence():
+    """(Ré)installe les fonctions periode_absence"""
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_FONCTIONS_PERIODE)
+
+
+def chevauchement(alias, debut, fin=None):
+    """
+    Condition SQL : l'absence `alias` couvre l'instant `debut` (fin None) ou
+    chevauche la période [debut, fin[. debut et fin sont des expressions SQL
+    (colonnes, %s...).
+    """
+    periode = f'periode_absence({alias}.date_debut_abs, {alias}.date_fin_abs)'
+    if fin is None:
+        return f'{periode} @> ({debut})::timestamptz'
+    return f"{periode} && tstzrange({debut}, {fin}, '[)')"
+
+
+def matricules_absents(debut, fin=None, matricules=None):
+    """
+    Matricules absents (absence déclarée non refusée ou non déclarée) à
+    l'instant `debut`, ou pendant [debut, fin[ si fin est donnée.
+    """
+    requetes, params = [], []
+    for table, condition in TABLES_ABSENCES:
+        conditions = [chevauchement('a', '%s', '%s' if fin is not None else None)]
+        params.extend([debut, fin] if fin is not None else [debut])
+        if condition:
+            conditions.append(f'a.{condition}')
+        if matricules is not None:
+            conditions.append('a.matricule = ANY(%s)')
+            params.append(list(matricules))
+        requetes.append(f'SELECT a.matricule FROM {connection.ops.quote_name(table)} a WHERE {" AND ".join(conditions)}')
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION '.join(requetes), params)
+        return {ligne[0] for ligne in cursor.fetchall()}
@@ -0,0 +1,203 @@
+"""
+Présence journalière du personnel (info_equipe).
+
+La table presence_journaliere contient une ligne par matricule et par jour
+avec le statut present / absent (absence déclarée) / absent_non_declare.
+Elle est recalculée de façon ensembliste (INSERT ... SELECT ... ON CONFLICT)
+pour les jours touchés à chaque écriture d'absence, et remplie en masse par
+la commande snapshot_presence. Les statistiques deviennent de simples
+lectures indexées par jour ; une ligne manquante vaut « présent ». Chaque
+recalcul effectif est publié sur le bus d'événements (canal « presence »).
+
+Un employé est absent le jour J si une absence non refusée couvre J : le test
+de chevauchement (periodes_absence) porte sur la période de l'absence et reste
+servi par l'index GiST de cette expression.
+"""
+
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .caching import invalider, lire_ou_calculer
+from .evenements import publier
+from .models import PresenceJournaliere
+from .periodes_absence import chevauchement
+
+# Tables lues : toute écriture invalide les statistiques en cache
+TABLES_PRESENCE = ('presence_journaliere', 'info_equipe')
+
+# Borne de la période demandée à l'historique
+JOURS_HISTORIQUE_MAX = 400
+
+SQL_RECALCUL_PRESENCE = f'''
+    INSERT INTO presence_journaliere (matricule, jour, statut, date_maj)
+    SELECT
+        m.matricule,
+        j.jour::date,
+        CASE
+            WHEN EXISTS (
+                SELECT 1 FROM absences a
+                WHERE a.matricule = m.matricule AND a.etat IS DISTINCT FROM 'refusée'
+                  AND {chevauchement('a', 'j.jour', "j.jour + INTERVAL '1 day'")}
+            ) THEN 'absent'
+            WHEN EXISTS (
+                SELECT 1 FROM "absences_non_déclarées" n
+                WHERE n.matricule = m.matricule
+                  AND {chevauchement('n', 'j.jour', "j.jour + INTERVAL '1 day'")}
+            ) THEN 'absent_non_declare'
+            ELSE 'present'
+        END,
+        NOW()
+    FROM (
+        SELECT matricule FROM info_equipe
+        WHERE matricule IS NOT NULL {{filtre_matricules}}
+    ) m
+    CROSS JOIN generate_series(%s::date, %s::date, INTERVAL '1 day') AS j(jour)
+    ON CONFLICT (matricule, jour) DO UPDATE
+        SET statut = EXCLUDED.statut, date_maj = EXCLUDED.date_maj
+        WHERE presence_journaliere.statut IS DISTINCT FROM EXCLUDED.statut
+'''
+
+SQL_COMPTES_PRESENCE = '''
+    SELECT
+        COUNT(*) AS total,
+        COUNT(*) FILTER (WHERE p.statut = 'absent') AS absents,
+        COUNT(*) FILTER (WHERE p.statut = 'absent_non_declare') AS absents_non_declares
+    FROM info_equipe ie
+    LEFT JOIN presence_journaliere p ON p.matricule = ie.matricule AND p.jour = %s
+    WHERE ie.matricule IS NOT NULL {filtre}
+'''
+
+SQL_DETAILS_PRESENCE = '''
+    SELECT
+        ie.matricule,
+        ie.nom,
+        ie.prenom,
+        ie.fonction,
+        COALESCE(p.statut, 'present') AS statut
+    FROM info_equipe ie
+    LEFT JOIN presence_journaliere p ON p.matricule = ie.matricule AND p.jour = %s
+    WHERE ie.matricule IS NOT NULL {filtre}
+    ORDER BY ie.matricule ASC
+'''
+
+SQL_HISTORIQUE_PRESENCE = '''
+    SELECT
+        p.jour,
+        COUNT(*) FILTER (WHERE p.statut = 'absent') AS absents,
+        COUNT(*) FILTER (WHERE p.statut = 'absent_non_declare') AS absents_non_declares
+    FROM presence_journaliere p
+    JOIN info_equipe ie ON ie.matricule = p.matricule
+    WHERE p.jour BETWEEN %s AND %s {filtre}
+    GROUP BY p.jour
+'''
+
+
+def _filtre_fonction(fonction):
+    return ('AND ie.fonction = %s', [fonction]) if fonction else ('', [])
+
+
+def recalculer_presence(debut, fin, matricules=None):
+    """
+    Recalcule en une requête la présence des jours [debut, fin] pour les
+    matricules donnés (tout le personnel par défaut). Retourne le nombre de
+    lignes insérées ou modifiées.
+    """
+    filtre, params = ('', [])
+    if matricules is not None:
+        filtre, params = ('AND matricule = ANY(%s)', [list(matricules)])
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_RECALCUL_PRESENCE.format(filtre_matricules=filtre), params + [debut, fin])
+        modifiees = cursor.rowcount
+    if modifiees:
+        invalider('presence_journaliere')
+        publier('presence', 'recalcul', {
+            'debut': debut, 'fin': fin, 'matricules': list(matricules) if matricules is not None else None, 'modifiees': modifiees,
+        })
+    return modifiees
+
+
+def jour_local(valeur):
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).date() if timezone.is_aware(valeur) else valeur.date()
+    return valeur
+
+
+def maj_presence_absences(intervalles):
+    """
+    Met à jour la présence après l'écriture d'absences.
+    `intervalles` : itérable de (matricule, date_debut_abs, date_fin_abs).
+    """
+    for matricule, debut, fin in intervalles:
+        if matricule and debut is not None and fin is not None:
+            debut, fin = jour_local(debut), jour_local(fin)
+            recalculer_presence(min(debut, fin), max(debut, fin), [matricule])
+
+
+def supprimer_presence(matricule):
+    """Supprime l'historique de présence d'un employé retiré du personnel"""
+    PresenceJournaliere.objects.filter(matricule=matricule).delete()
+    invalider('presence_journaliere')
+    publier('presence', 'suppression', {'matricules': [matricule]})
+
+
+def calculer_stats_presence(jour, fonction=None, details=False):
+    filtre, params_filtre = _filtre_fonction(fonction)
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_COMPTES_PRESENCE.format(filtre=filtre), [jour] + params_filtre)
+        total, absents, absents_non_declares = cursor.fetchone()
+        stats = {
+            'date': jour.isoformat(),
+            'fonction': fonction,
+            'presents': total - absents - absents_non_declares,
+            'absents': absents,
+            'absents_non_declares': absents_non_declares,
+            'total': total,
+        }
+        if details:
+            cursor.execute(SQL_DETAILS_PRESENCE.format(filtre=filtre), [jour] + params_filtre)
+            columns = [col[0] for col in cursor.description]
+            stats['details'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return stats
+
+
+def lire_stats_presence(jour, fonction=None, details=False):
+    """Statistiques de présence du jour, en cache jusqu'à la prochaine écriture"""
+    return lire_ou_calculer(
+        'stats_presence', TABLES_PRESENCE, f'{jour.isoformat()}:{fonction or ""}:{int(details)}',
+        lambda: calculer_stats_presence(jour, fonction, details),
+    )
+
+
+def calculer_historique_presence(debut, fin, fonction=None):
+    """Comptes de présence par jour sur [debut, fin] (effectif actuel)"""
+    filtre, params_filtre = _filtre_fonction(fonction)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COUNT(*) FROM info_equipe ie WHERE ie.matricule IS NOT NULL ' + filtre, params_filtre
+        )
+        total = cursor.fetchone()[0]
+        cursor.execute(SQL_HISTORIQUE_PRESENCE.format(filtre=filtre), [debut, fin] + params_filtre)
+        absences_par_jour = {jour: (absents, non_declares) for jour, absents, non_declares in cursor.fetchall()}
+
+    historique = []
+    jour = debut
+    while jour <= fin:
+        absents, non_declares = absences_par_jour.get(jour, (0, 0))
+        historique.append({
+            'date': jour.isoformat(),
+            'presents': total - absents - non_declares,
+            'absents': absents,
+            'absents_non_declares': non_declares,
+            'total': total,
+        })
+        jour += timedelta(days=1)
+    return historique
+
+
+def lire_historique_presence(debut, fin, fonction=None):
+    return lire_ou_calculer(
+        'historique_presence', TABLES_PRESENCE, f'{debut.isoformat()}:{fin.isoformat()}:{fonction or ""}',
+        lambda: calculer_historique_presence(debut, fin, fonction),
+    )
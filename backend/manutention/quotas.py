@@ -0,0 +1,196 @@
+"""
+Quota d'affectations manuelles des chefs d'escale (ChefEscale.nbr_aff_manuelle).
+
+Chaque mouvement est une seule instruction UPDATE conditionnelle
+(... SET n = n - 1 WHERE n > 0 RETURNING n) : PostgreSQL sérialise les
+écritures concurrentes sur la ligne et la condition est réévaluée après
+l'attente du verrou, si bien qu'aucun quota ne peut être dépensé deux fois.
+Le mouvement est journalisé dans consommations_quota dans la même transaction.
+"""
+
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import invalider
+from .models import ChefEscale, ConsommationQuota
+
+QUOTA_AFF_MANUELLE = 4
+
+
+class QuotaEpuise(Exception):
+    """Plus aucune affectation manuelle disponible pour ce chef d'escale"""
+
+
+class QuotaComplet(Exception):
+    """Remboursement impossible : le quota est déjà au maximum"""
+
+
+def _table():
+    return connection.ops.quote_name(ChefEscale._meta.db_table)
+
+
+def _mouvement(id_chef_escale, operation, delta, condition, params_condition, reference):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE {_table()}
+                SET nbr_aff_manuelle = nbr_aff_manuelle + %s
+                WHERE id_chef_escale = %s AND {condition}
+                RETURNING nbr_aff_manuelle
+            ''', [delta, id_chef_escale] + params_condition)
+            ligne = cursor.fetchone()
+        if ligne is None:
+            return None
+        ConsommationQuota.objects.create(
+            id_chef_escale=id_chef_escale, operation=operation, delta=delta, restant=ligne[0], reference=reference
+        )
+    invalider('chef_escale')
+    return ligne[0]
+
+
+def _verifier_existence(id_chef_escale):
+    if not ChefEscale.objects.filter(pk=id_chef_escale).exists():
+        raise ChefEscale.DoesNotExist(f"Chef d'escale {id_chef_escale} introuvable")
+
+
+def consommer_affectation_manuelle(id_chef_escale, reference=None):
+    """Consomme une affectation manuelle ; retourne le nombre restant"""
+    restant = _mouvement(
+        id_chef_escale, ConsommationQuota.CONSOMMATION, -1, 'nbr_aff_manuelle > 0', [], reference
+    )
+    if restant is None:
+        _verifier_existence(id_chef_escale)
+        raise QuotaEpuise(f"Quota d'affectations manuelles épuisé pour {id_chef_escale}")
+    return restant
+
+
+def rembourser_affectation_manuelle(id_chef_escale, reference=None):
+    """Rend une affectation manuelle (affectation annulée) ; retourne le nombre restant"""
+    restant = _mouvement(
+        id_chef_escale, ConsommationQuota.REMBOURSEMENT, 1, 'nbr_aff_manuelle < %s', [QUOTA_AFF_MANUELLE], reference
+    )
+    if restant is None:
+        _verifier_existence(id_chef_escale)
+        raise QuotaComplet(f"Quota d'affectations manuelles déjà complet pour {id_chef_escale}")
+    return restant
+
+
+def valider_quota(valeur):
+    """Valeur saisie pour nbr_aff_manuelle : entier entre 0 et QUOTA_AFF_MANUELLE"""
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, str)):
+        raise ValueError("nbr_aff_manuelle doit être un entier")
+    try:
+        valeur = int(valeur)
+    except ValueError:
+        raise ValueError("nbr_aff_manuelle doit être un entier")
+    if not 0 <= valeur <= QUOTA_AFF_MANUELLE:
+        raise ValueError(f"Le nombre d'affectations manuelles doit être compris entre 0 et {QUOTA_AFF_MANUELLE}")
+    return valeur
+
+
+def ajuster_quota(id_chef_escale, valeur, reference=None):
+    """
+    Fixe le quota restant (modification par les RH) et journalise l'écart.
+    L'ancienne valeur est lue dans la même instruction que l'écriture.
+    """
+    valeur = valider_quota(valeur)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE {_table()} ce
+                SET nbr_aff_manuelle = %s
+                FROM (
+                    SELECT id_chef_escale, nbr_aff_manuelle AS ancien
+                    FROM {_table()} WHERE id_chef_escale = %s FOR UPDATE
+                ) precedent
+                WHERE ce.id_chef_escale = precedent.id_chef_escale
+                RETURNING precedent.ancien
+            ''', [valeur, id_chef_escale])
+            ligne = cursor.fetchone()
+        if ligne is None:
+            raise ChefEscale.DoesNotExist(f"Chef d'escale {id_chef_escale} introuvable")
+        if ligne[0] != valeur:
+            ConsommationQuota.objects.create(
+                id_chef_escale=id_chef_escale, operation=ConsommationQuota.AJUSTEMENT,
+                delta=valeur - ligne[0], restant=valeur, reference=reference,
+            )
+    invalider('chef_escale')
+    return valeur
+
+
+def reinitialiser_quotas(ids_chefs, reference=None, une_fois=False):
+    """
+    Remet le quota des chefs donnés au maximum en une instruction et journalise
+    chaque chef (delta nul s'il était déjà plein). Retourne le nombre de
+    compteurs modifiés.
+
+    Avec `une_fois`, les chefs ayant déjà une réinitialisation journalisée sous
+    `reference` sont ignorés. Le journal est lu après le verrouillage des lignes
+    des chefs : une exécution concurrente attend le COMMIT de la première puis
+    voit ses lignes de journal.
+    """
+    ids_chefs = list(ids_chefs)
+    if not ids_chefs:
+        return 0
+    with transaction.atomic():
+        if une_fois:
+            with connection.cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT id_chef_escale FROM {_table()}
+                    WHERE id_chef_escale = ANY(%s) ORDER BY id_chef_escale FOR UPDATE
+                ''', [ids_chefs])
+            # Nouvelle instruction, donc nouvel instantané en READ COMMITTED : journal à jour
+            deja_traites = set(ConsommationQuota.objects.filter(
+                operation=ConsommationQuota.REINITIALISATION, reference=reference, id_chef_escale__in=ids_chefs,
+            ).values_list('id_chef_escale', flat=True))
+            ids_chefs = [id_chef for id_chef in ids_chefs if id_chef not in deja_traites]
+            if not ids_chefs:
+                return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                WITH precedent AS (
+                    SELECT id_chef_escale, nbr_aff_manuelle AS ancien
+                    FROM {_table()} WHERE id_chef_escale = ANY(%s) FOR UPDATE
+                ), maj AS (
+                    UPDATE {_table()} ce
+                    SET nbr_aff_manuelle = %s
+                    FROM precedent
+                    WHERE ce.id_chef_escale = precedent.id_chef_escale AND precedent.ancien <> %s
+                )
+                SELECT id_chef_escale, ancien FROM precedent
+            ''', [ids_chefs, QUOTA_AFF_MANUELLE, QUOTA_AFF_MANUELLE])
+            lignes = cursor.fetchall()
+        # Une ligne de journal par chef, y compris inchangé : elle marque le shift comme traité
+        ConsommationQuota.objects.bulk_create([
+            ConsommationQuota(
+                id_chef_escale=id_chef, operation=ConsommationQuota.REINITIALISATION,
+                delta=QUOTA_AFF_MANUELLE - ancien, restant=QUOTA_AFF_MANUELLE, reference=reference,
+            )
+            for id_chef, ancien in lignes
+        ])
+    modifies = sum(1 for _, ancien in lignes if ancien != QUOTA_AFF_MANUELLE)
+    if modifies:
+        invalider('chef_escale')
+    return modifies
+
+
+def reinitialiser_quotas_shifts_commences(maintenant=None):
+    """
+    Réinitialise une fois par shift le quota des chefs dont le shift a
+    commencé. La référence « shift:<id> » du journal rend l'opération
+    idempotente : la commande peut être planifiée toutes les quelques minutes.
+    Retourne le nombre de chefs réinitialisés.
+    """
+    maintenant = maintenant or timezone.now()
+    chefs_par_shift = defaultdict(list)
+    for id_chef, id_shift in ChefEscale.objects.filter(
+        id_shift__date_debut_shift__lte=maintenant, id_shift__date_fin_shift__gt=maintenant
+    ).values_list('id_chef_escale', 'id_shift'):
+        chefs_par_shift[id_shift].append(id_chef)
+
+    return sum(
+        reinitialiser_quotas(ids_chefs, f'shift:{id_shift}', une_fois=True)
+        for id_shift, ids_chefs in chefs_par_shift.items()
+    )
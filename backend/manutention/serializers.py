@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from django.db import connection
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from .models import (
     Conducteur, Affectation, Absences, Shifts, AbsenceNonDeclaree, ChefEscale,
@@ -8,7 +10,7 @@ from .models import (
     CumulHeures, Equipe, Conducteurs, Dockers, AbsencesNonDeclarees,
     Maintenance, Incidents, Utilisateurs, Superviseurs,
     HistoriqueAffectations, Notifications, Rapports, Parametres, Logs,
-    InfoEquipe, NavirePrevisionnel
+    InfoEquipe, NavirePrevisionnel, Job
 )
 import os
 
@@ -43,27 +45,76 @@ class EnginDetailSerializer(serializers.ModelSerializer):
         model = Engins
         fields = '__all__'
 
+    @staticmethod
+    def optimiser_queryset(queryset):
+        """
+        Précalcule les champs de détail au niveau du queryset : la liste complète
+        coûte alors 2 requêtes (engins annotés + qualifications) quel que soit
+        le nombre d'engins
+        """
+        derniere_affectation = Affectations.objects.filter(
+            code_engin=OuterRef('pk')
+        ).order_by('-date_affectation')
+        cumul = CumulHeures.objects.filter(code_engin=OuterRef('pk')).order_by().values('code_engin')
+        affectations = Affectations.objects.filter(code_engin=OuterRef('pk')).order_by().values('code_engin')
+        return queryset.annotate(
+            heures_cumulees_total=Coalesce(
+                Subquery(cumul.annotate(total=Sum('heure_par_engin')).values('total')),
+                Value(0.0)
+            ),
+            nombre_affectations_total=Coalesce(
+                Subquery(affectations.annotate(total=Count('pk')).values('total')),
+                Value(0)
+            ),
+            dernier_shift_id=Subquery(derniere_affectation.values('id_shift')[:1]),
+            derniere_equipe_id=Subquery(derniere_affectation.values('id_equipe')[:1]),
+        ).prefetch_related(
+            Prefetch(
+                'qualificationsconducteurs_set',
+                queryset=QualificationsConducteurs.objects.only('code_engin', 'matricule', 'niveau', 'date_obtention'),
+                to_attr='qualifications_prefetch'
+            )
+        )
+
     def get_heures_cumulees(self, obj):
-        cumul = CumulHeures.objects.filter(code_engin=obj.code_engin).first()
-        return cumul.heure_par_engin if cumul else 0
+        if hasattr(obj, 'heures_cumulees_total'):
+            return obj.heures_cumulees_total
+        total = CumulHeures.objects.filter(code_engin=obj.code_engin).aggregate(total=Sum('heure_par_engin'))['total']
+        return total or 0
 
     def get_nombre_affectations(self, obj):
+        if hasattr(obj, 'nombre_affectations_total'):
+            return obj.nombre_affectations_total
         return Affectations.objects.filter(code_engin=obj.code_engin).count()
 
+    def _derniere_affectation(self, obj):
+        # Une seule requête partagée par dernier_shift et equipe_affectee
+        if not hasattr(obj, '_derniere_affectation_cache'):
+            affectation = Affectations.objects.filter(code_engin=obj.code_engin).order_by('-date_affectation').first()
+            obj._derniere_affectation_cache = (
+                (affectation.id_shift_id, affectation.id_equipe_id) if affectation else (None, None)
+            )
+        return obj._derniere_affectation_cache
+
     def get_dernier_shift(self, obj):
-        affectation = Affectations.objects.filter(code_engin=obj.code_engin).order_by('-date_affectation').first()
-        if affectation and affectation.id_shift:
-            return f"Shift {affectation.id_shift.id_shift}"
-        return None
+        if hasattr(obj, 'dernier_shift_id'):
+            id_shift = obj.dernier_shift_id
+        else:
+            id_shift = self._derniere_affectation(obj)[0]
+        return f"Shift {id_shift}" if id_shift else None
 
     def get_equipe_affectee(self, obj):
-        affectation = Affectations.objects.filter(code_engin=obj.code_engin).order_by('-date_affectation').first()
-        if affectation and affectation.id_equipe:
-            return f"Équipe {affectation.id_equipe.id_equipe}"
-        return None
+        if hasattr(obj, 'derniere_equipe_id'):
+            id_equipe = obj.derniere_equipe_id
+        else:
+            id_equipe = self._derniere_affectation(obj)[1]
+        return f"Équipe {id_equipe}" if id_equipe else None
 
     def get_conducteurs_qualifies(self, obj):
-        qualifications = QualificationsConducteurs.objects.filter(code_engin=obj.code_engin)
+        if hasattr(obj, 'qualifications_prefetch'):
+            qualifications = obj.qualifications_prefetch
+        else:
+            qualifications = QualificationsConducteurs.objects.filter(code_engin=obj.code_engin)
         return [
             {
                 'matricule': q.matricule,
@@ -120,7 +171,58 @@ class DockersSerializer(serializers.ModelSerializer):
         model = Dockers
         fields = '__all__'
 
-class AbsencesSerializer(serializers.ModelSerializer):
+def charger_matricule_info(matricules):
+    """Charge en une seule requête l'identité INFO_EQUIPE d'un ensemble de matricules"""
+    matricules = {matricule for matricule in matricules if matricule}
+    if not matricules:
+        return {}
+    try:
+        lignes = InfoEquipe.objects.filter(matricule__in=matricules).values_list(
+            'matricule', 'nom', 'prenom', 'fonction'
+        )
+        return {
+            matricule: {
+                'matricule': matricule,
+                'nom': nom or 'Non renseigné',
+                'prenom': prenom or 'Non renseigné',
+                'fonction': fonction or 'Non renseigné'
+            }
+            for matricule, nom, prenom, fonction in lignes
+        }
+    except Exception:
+        return {}
+
+class MatriculeInfoListSerializer(serializers.ListSerializer):
+    """
+    Précharge matricule_info pour toute la liste avec un seul `matricule IN (...)`
+    au lieu d'une requête par objet sérialisé
+    """
+
+    def to_representation(self, data):
+        objets = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child._matricule_info_cache = charger_matricule_info(
+            getattr(obj, 'matricule', None) for obj in objets
+        )
+        try:
+            return super().to_representation(objets)
+        finally:
+            self.child._matricule_info_cache = None
+
+class MatriculeInfoMixin:
+    """
+    Ajoute le champ matricule_info (identité INFO_EQUIPE) à un serializer.
+    Déclarer `list_serializer_class = MatriculeInfoListSerializer` dans le Meta
+    pour que les listes (many=True) partagent une seule requête.
+    """
+    _matricule_info_cache = None
+
+    def get_matricule_info(self, obj):
+        cache = self._matricule_info_cache
+        if cache is None:
+            cache = charger_matricule_info([obj.matricule])
+        return cache.get(obj.matricule)
+
+class AbsencesSerializer(MatriculeInfoMixin, serializers.ModelSerializer):
     justification_file = serializers.FileField(write_only=True, required=False)
     justification = serializers.CharField(required=False, allow_blank=True)
     date_debut_formatted = serializers.SerializerMethodField()
@@ -131,6 +233,7 @@ class AbsencesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Absences
         fields = '__all__'
+        list_serializer_class = MatriculeInfoListSerializer
     
     def get_date_debut_formatted(self, obj):
         if obj.date_debut_abs:
@@ -147,26 +250,6 @@ class AbsencesSerializer(serializers.ModelSerializer):
             return obj.uploaded_at.strftime('%d/%m/%Y %H:%M')
         return None
 
-    def get_matricule_info(self, obj):
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute('''
-                    SELECT matricule, nom, prenom, fonction 
-                    FROM info_equipe 
-                    WHERE matricule = %s
-                ''', [obj.matricule.matricule if hasattr(obj.matricule, 'matricule') else obj.matricule])
-                row = cursor.fetchone()
-                if row:
-                    return {
-                        'matricule': row[0],
-                        'nom': row[1] or 'Non renseigné',
-                        'prenom': row[2] or 'Non renseigné',
-                        'fonction': row[3] or 'Non renseigné'
-                    }
-        except Exception:
-            pass
-        return None
-    
     def validate_matricule(self, value):
         """Valider que le matricule existe dans info_equipe"""
         from .models import InfoEquipe
@@ -182,7 +265,43 @@ class AbsencesSerializer(serializers.ModelSerializer):
             print(f"Erreur de validation du matricule '{value}': {str(e)}")
             # En cas d'erreur, on accepte quand même le matricule
             return value
-    
+
+    def refuser_chevauchements(self, attrs, chercher):
+        """Lève une ValidationError si `chercher` trouve des absences chevauchant celle-ci"""
+        from .index_absences import formater_conflit
+
+        def valeur(champ):
+            return attrs.get(champ, getattr(self.instance, champ, None))
+
+        matricule, debut, fin = valeur('matricule'), valeur('date_debut_abs'), valeur('date_fin_abs')
+        if matricule and debut and fin and valeur('etat') != 'refusée':
+            exclure = ('declaree', self.instance.pk) if self.instance is not None else None
+            conflits = chercher(matricule, debut, fin, exclure=exclure)
+            if conflits:
+                raise serializers.ValidationError({
+                    'non_field_errors': [f"L'absence chevauche {len(conflits)} absence(s) existante(s) du matricule {matricule}"],
+                    'conflits': [formater_conflit(conflit) for conflit in conflits],
+                })
+
+    def validate(self, attrs):
+        """Refuser une absence qui chevauche une absence existante du même matricule"""
+        from .index_absences import index_absences
+
+        self.refuser_chevauchements(attrs, index_absences.conflits)
+        return attrs
+
+    def save(self, **kwargs):
+        """
+        Revérifie les chevauchements en base sous le verrou du matricule, dans
+        la transaction d'écriture : l'index peut ne pas encore connaître une
+        absence écrite par un autre processus
+        """
+        from .index_absences import verifier_en_base
+
+        with transaction.atomic():
+            self.refuser_chevauchements({**self.validated_data, **kwargs}, verifier_en_base)
+            return super().save(**kwargs)
+
     def create(self, validated_data):
         """Créer une absence avec gestion des fichiers"""
         justification_file = validated_data.pop('justification_file', None)
@@ -351,4 +470,17 @@ class EquipeDetailSerializer(serializers.ModelSerializer):
 class NavirePrevisionnelSerializer(serializers.ModelSerializer):
     class Meta:
         model = NavirePrevisionnel
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__'
+
+class JobSerializer(serializers.ModelSerializer):
+    erreur = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        # Les paramètres (fichiers importés, personnel...) ne sont pas exposés
+        exclude = ['parametres']
+
+    def get_erreur(self, obj):
+        # Dernière ligne seulement : les anciens jobs enregistraient la trace complète
+        lignes = [ligne for ligne in (obj.erreur or '').strip().splitlines() if ligne.strip()]
+        return lignes[-1].strip() if lignes else ''
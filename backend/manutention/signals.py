@@ -0,0 +1,99 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from dev_tech.models import Engin
+from .alertes import reevaluer_alertes_absences
+from .caching import invalider
+from .evenements import publier_journalise
+from .index_absences import publier_ecriture
+from .models import AbsenceNonDeclaree, Absences, AbsencesNonDeclarees, ChefEscale, Engins, Equipe, InfoEquipe
+from .presence import maj_presence_absences
+
+# Table lue par les endpoints en cache pour chaque modèle écrit via l'ORM
+TABLES_PAR_MODELE = {
+    Engins: 'engins',
+    Engin: 'engins',
+    Equipe: 'equipe',
+    ChefEscale: 'chef_escale',
+    Absences: 'absences',
+    InfoEquipe: 'info_equipe',
+}
+
+
+def invalider_cache_endpoints(sender, **kwargs):
+    invalider(TABLES_PAR_MODELE[sender])
+
+
+for modele in TABLES_PAR_MODELE:
+    post_save.connect(invalider_cache_endpoints, sender=modele, dispatch_uid=f'cache_endpoints_save_{modele.__name__}')
+    post_delete.connect(invalider_cache_endpoints, sender=modele, dispatch_uid=f'cache_endpoints_delete_{modele.__name__}')
+
+
+# Présence journalière et alertes d'heures : recalcul des jours couverts par
+# l'absence écrite, avant et après modification ; l'écriture est publiée pour
+# l'index des absences de chaque processus (index_absences.py)
+MODELES_ABSENCE = (Absences, AbsenceNonDeclaree, AbsencesNonDeclarees)
+
+
+def memoriser_intervalle_absence(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._intervalle_precedent = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list('matricule', 'date_debut_abs', 'date_fin_abs')
+            .first()
+        )
+
+
+def maj_presence_absence(sender, instance, **kwargs):
+    intervalles = [(instance.matricule, instance.date_debut_abs, instance.date_fin_abs)]
+    precedent = getattr(instance, '_intervalle_precedent', None)
+    if precedent and precedent != intervalles[0]:
+        intervalles.append(precedent)
+    maj_presence_absences(intervalles)
+    reevaluer_alertes_absences(intervalles)
+    publier_ecriture(matricule for matricule, _, _ in intervalles if matricule)
+
+
+for modele in MODELES_ABSENCE:
+    pre_save.connect(memoriser_intervalle_absence, sender=modele, dispatch_uid=f'presence_pre_save_{modele.__name__}')
+    post_save.connect(maj_presence_absence, sender=modele, dispatch_uid=f'presence_save_{modele.__name__}')
+    post_delete.connect(maj_presence_absence, sender=modele, dispatch_uid=f'presence_delete_{modele.__name__}')
+
+
+
+# Kanban Dev Tech : chaque transition d'état d'engin est journalisée et
+# diffusée (flux SSE /api/flux/engins/), quel que soit l'endpoint utilisé
+MODELES_ENGIN = (Engins, Engin)
+
+
+def memoriser_etat_engin(sender, instance, **kwargs):
+    instance._etat_precedent = (
+        sender.objects.filter(pk=instance.pk).values_list('etat_engin', flat=True).first()
+        if instance.pk is not None else None
+    )
+
+
+def publier_etat_engin(sender, instance, created, **kwargs):
+    ancien_etat = getattr(instance, '_etat_precedent', None)
+    if created or ancien_etat != instance.etat_engin:
+        publier_journalise('engins', 'creation' if created else 'transition', {
+            'code_engin': instance.code_engin,
+            'ancien_etat': None if created else ancien_etat,
+            'nouvel_etat': instance.etat_engin,
+            'date': timezone.now().isoformat(),
+        })
+
+
+def publier_suppression_engin(sender, instance, **kwargs):
+    publier_journalise('engins', 'suppression', {
+        'code_engin': instance.code_engin,
+        'ancien_etat': instance.etat_engin,
+        'nouvel_etat': None,
+        'date': timezone.now().isoformat(),
+    })
+
+
+for modele in MODELES_ENGIN:
+    pre_save.connect(memoriser_etat_engin, sender=modele, dispatch_uid=f'engins_pre_save_{modele.__name__}')
+    post_save.connect(publier_etat_engin, sender=modele, dispatch_uid=f'engins_save_{modele.__name__}')
+    post_delete.connect(publier_suppression_engin, sender=modele, dispatch_uid=f'engins_delete_{modele.__name__}')
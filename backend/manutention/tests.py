@@ -1,7 +1,47 @@
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from datetime import datetime
-from .serializers import AbsenceSerializer
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from io import StringIO
+import asyncio
+from asgiref.sync import sync_to_async
+import json
+import re
+import numpy as np
+import tempfile
+import threading
+import time
+from unittest import mock
+from rest_framework.test import APIClient
+from .affectation_auto import construire_matrice, resoudre_affectation
+from .models import (
+    AbsenceNonDeclaree, AffectationConducteur, Absences, Affectations, AlerteHeures, ChefEscale, ConsommationQuota, CumulHeures, Engins, Equipe, Evenement, InfoEquipe, Job, Logs,
+    NavirePrevisionnel, PresenceJournaliere, QualificationsConducteurs, Shifts
+)
+from .alertes import installer_moteur_alertes, lire_limites_alertes
+from .anp_fetchers import HttpFetcher
+from .caching import get_cache
+from .conseil_index import analyser_requetes, extraire_requetes, script_index
+from .detection_absences import detecter_absences_non_declarees
+from .exports import generer_async, generer_ndjson, lignes_curseur_serveur
+from . import evenements
+from .evenements import arreter_ecoute, bus, demarrer_ecoute, publier_journalise
+from .flux import flux_evenements
+from .index_absences import IntervallesMatricule, index_absences
+from .jobs import REGISTRE_TACHES, liberer_jobs_orphelins, mettre_a_jour_progression, soumettre_job, tache
+from .navire_scraper import scrape_navires_anp
+from .navires_csv import lire_csv_navires
+from .navires_ingestion import ingerer_navires
+from .periodes_absence import SQL_INDEX_PERIODES, matricules_absents
+from .presence import recalculer_presence
+from .quotas import QuotaEpuise, consommer_affectation_manuelle, reinitialiser_quotas_shifts_commences
+from .serializers import AbsencesSerializer
 import pytz
 
 # Create your tests here.
@@ -9,7 +49,7 @@ import pytz
 class AbsenceSerializerTimezoneTest(TestCase):
     def test_naive_datetime_conversion_logic(self):
         """Test the datetime conversion logic directly"""
-        serializer = AbsenceSerializer()
+        serializer = AbsencesSerializer()
         
         # Test data with naive datetime strings (as sent from frontend)
         test_data = {
@@ -39,7 +79,7 @@ class AbsenceSerializerTimezoneTest(TestCase):
     
     def test_timezone_aware_datetime_handling_logic(self):
         """Test that already timezone-aware datetimes are handled correctly"""
-        serializer = AbsenceSerializer()
+        serializer = AbsencesSerializer()
         
         # Test data with timezone-aware datetime strings
         test_data = {
@@ -69,7 +109,7 @@ class AbsenceSerializerTimezoneTest(TestCase):
     
     def test_empty_datetime_handling(self):
         """Test that empty datetime fields are handled gracefully"""
-        serializer = AbsenceSerializer()
+        serializer = AbsencesSerializer()
         
         test_data = {
             'matricule': 'TEST123',
@@ -90,3 +130,1501 @@ class AbsenceSerializerTimezoneTest(TestCase):
         
         # If we get here, the empty string handling worked correctly
         self.assertTrue(True)
+
+def creer_tables_non_gerees(*modeles):
+    """Crée dans la base de test les tables des modèles managed = False"""
+    with connection.schema_editor() as editor:
+        for modele in modeles:
+            editor.create_model(modele)
+
+class AbsencesMatriculeInfoQueryCountTest(TestCase):
+    """matricule_info ne doit pas coûter une requête par absence"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def creer_absences(self, nombre):
+        debut = timezone.now()
+        for i in range(nombre):
+            matricule = f'MAT{i:03d}'
+            InfoEquipe.objects.create(matricule=matricule, nom=f'Nom{i}', prenom=f'Prenom{i}', fonction='docker')
+            Absences.objects.create(matricule=matricule, date_debut_abs=debut, date_fin_abs=debut + timedelta(hours=8))
+
+    def test_nombre_de_requetes_constant(self):
+        for nombre in (1, 10, 50):
+            Absences.objects.all().delete()
+            InfoEquipe.objects.all().delete()
+            self.creer_absences(nombre)
+            # Absences datées puis sans date (page incomplète : les deux sections
+            # de la pagination) + 1 requête IN (...) pour info_equipe
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/absences/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), nombre)
+
+    def test_matricule_info_contenu(self):
+        self.creer_absences(1)
+        Absences.objects.create(matricule='INCONNU', date_debut_abs=timezone.now(), date_fin_abs=timezone.now())
+        data = AbsencesSerializer(Absences.objects.order_by('id_absence'), many=True).data
+        self.assertEqual(data[0]['matricule_info'], {
+            'matricule': 'MAT000', 'nom': 'Nom0', 'prenom': 'Prenom0', 'fonction': 'docker'
+        })
+        self.assertIsNone(data[1]['matricule_info'])
+
+    def test_objet_unique(self):
+        self.creer_absences(1)
+        absence = Absences.objects.get()
+        with self.assertNumQueries(1):
+            data = AbsencesSerializer(absence).data
+        self.assertEqual(data['matricule_info']['nom'], 'Nom0')
+
+class EnginDetailQueryCountTest(TestCase):
+    """La vue détaillée des engins coûte un nombre fixe de requêtes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # La table engins est déjà créée par le modèle géré de dev_tech
+        creer_tables_non_gerees(Equipe, Affectations, CumulHeures, QualificationsConducteurs)
+        cls.equipe = Equipe.objects.create(id_equipe='EQ1')
+        cls.shift = Shifts.objects.create(date_debut_shift=timezone.now(), date_fin_shift=timezone.now())
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def creer_engins(self, nombre):
+        for i in range(nombre):
+            engin = Engins.objects.create(code_engin=f'ENG{i:03d}', famille_engin='grue', capacite_max=40, etat_engin='disponible')
+            Affectations.objects.create(code_engin=engin, date_affectation=datetime(2025, 1, 1).date(), id_equipe=self.equipe)
+            Affectations.objects.create(code_engin=engin, date_affectation=datetime(2025, 1, 2).date(), id_shift=self.shift)
+            CumulHeures.objects.create(code_engin=engin, heure_par_engin=3.5)
+            CumulHeures.objects.create(code_engin=engin, heure_par_engin=1.5)
+            QualificationsConducteurs.objects.create(code_engin=engin, matricule=f'C{i}', niveau='expert')
+
+    def test_nombre_de_requetes_constant(self):
+        for nombre in (1, 20):
+            for modele in (QualificationsConducteurs, CumulHeures, Affectations, Engins):
+                modele.objects.all().delete()
+            self.creer_engins(nombre)
+            # 1 requête pour les engins annotés + 1 pour les qualifications
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/engins/?details=1')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), nombre)
+
+    def test_valeurs_precalculees(self):
+        self.creer_engins(1)
+        engin = self.client.get('/api/engins/ENG000/').json()
+        self.assertEqual(engin['heures_cumulees'], 5.0)
+        self.assertEqual(engin['nombre_affectations'], 2)
+        self.assertEqual(engin['dernier_shift'], f'Shift {self.shift.id_shift}')
+        self.assertIsNone(engin['equipe_affectee'])
+        self.assertEqual(engin['conducteurs_qualifies'][0]['matricule'], 'C0')
+
+class EnginsStatistiquesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Schéma réel de cumul_heures (date, heure_par_jour), pas celui déduit du modèle
+        creer_table_cumul_heures()
+        etats = ['disponible', 'disponible', 'en maintenance', 'affecté']
+        for i, etat in enumerate(etats):
+            famille = 'grue' if i < 2 else 'chariot'
+            Engins.objects.create(code_engin=f'E{i}', famille_engin=famille, capacite_max=10, etat_engin=etat)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO cumul_heures (code_engin, heure_par_jour, date) VALUES (%s, %s, %s)',
+                    [f'E{i}', 2 * (i + 1), datetime(2025, 1, i + 1).date()]
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_agregation_en_une_requete(self):
+        with self.assertNumQueries(1):
+            stats = self.client.get('/api/engins/statistiques/').json()
+        self.assertEqual(stats['total_engins'], 4)
+        self.assertEqual(stats['en_maintenance'], 1)
+        self.assertEqual(stats['disponibles'], 2)
+        self.assertEqual(stats['moyenne_heures'], 5.0)
+        self.assertEqual(stats['taux_disponibilite'], 50.0)
+
+    def test_filtres(self):
+        stats = self.client.get('/api/engins/statistiques/?famille=grue&date_from=2025-01-02').json()
+        self.assertEqual(stats['total_engins'], 2)
+        self.assertEqual(stats['moyenne_heures'], 4.0)
+        # Aucun cumul dans la période : moyenne nulle
+        stats = self.client.get('/api/engins/statistiques/?date_from=2026-01-01').json()
+        self.assertEqual((stats['total_engins'], stats['moyenne_heures']), (4, 0))
+        response = self.client.get('/api/engins/statistiques/?date_to=hier')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/engins/statistiques/?date_from=2025-02-30')
+        self.assertEqual(response.status_code, 400)
+
+class KeysetPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Logs)
+        debut = timezone.now()
+        for i in range(7):
+            # Deux logs sans date et deux logs à la même date
+            date_action = None if i < 2 else debut - timedelta(minutes=min(i, 5))
+            Logs.objects.create(utilisateur=f'u{i}', action='test', date_action=date_action)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_parcours_complet_par_curseur(self):
+        vus = []
+        url = '/api/logs/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            vus.extend(log['id_log'] for log in page['results'])
+            url = page['next']
+        self.assertEqual(sorted(vus), sorted(Logs.objects.values_list('id_log', flat=True)))
+        self.assertEqual(len(vus), len(set(vus)))
+
+    def test_tri_par_date_action(self):
+        resultats = self.client.get('/api/logs/').json()['results']
+        dates = [log['date_action'] for log in resultats]
+        self.assertEqual(dates[-2:], [None, None])
+        self.assertEqual(dates[:-2], sorted(dates[:-2], reverse=True))
+
+    def test_taille_de_page_plafonnee(self):
+        with self.settings(CURSOR_PAGINATION={'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3}):
+            page = self.client.get('/api/logs/?page_size=50').json()
+        self.assertEqual(len(page['results']), 3)
+
+    def test_desactivation_pour_anciens_clients(self):
+        response = self.client.get('/api/logs/?pagination=off')
+        self.assertIsInstance(response.json(), list)
+        self.assertEqual(len(response.json()), 7)
+
+    def test_egalites_sur_la_premiere_colonne(self):
+        # Plus de lignes à la même date que la taille de page : le curseur
+        # porte (date_action, id_log), sans OFFSET
+        meme_date = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            Logs.objects.create(utilisateur=f'v{i}', action='test', date_action=meme_date)
+        vus = []
+        url = '/api/logs/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            vus.extend(log['id_log'] for log in page['results'])
+            url = page['next']
+        plancher = timezone.make_aware(datetime(2000, 1, 1))
+        attendus = sorted(Logs.objects.all(), key=lambda log: (log.date_action or plancher, log.id_log), reverse=True)
+        self.assertEqual(vus, [log.id_log for log in attendus])
+
+    def test_retour_par_previous(self):
+        premiere = self.client.get('/api/logs/?page_size=3').json()
+        seconde = self.client.get(premiere['next']).json()
+        retour = self.client.get(seconde['previous']).json()
+        self.assertEqual(retour['results'], premiere['results'])
+        self.assertIsNone(retour['previous'])
+
+    def test_aller_retour_entre_sections_nulle_et_non_nulle(self):
+        pages = []
+        url = '/api/logs/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            pages.append([log['id_log'] for log in page['results']])
+            url = page['next']
+        # 5 logs datés puis les 2 sans date, la frontière tombe au milieu d'une page
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+        retour = [pages[-1]]
+        url = page['previous']
+        while url:
+            page = self.client.get(url).json()
+            retour.insert(0, [log['id_log'] for log in page['results']])
+            url = page['previous']
+        self.assertEqual(sum(retour, []), sum(pages, []))
+
+    def test_index_de_la_premiere_colonne_utilise(self):
+        debut = timezone.now()
+        Logs.objects.bulk_create([
+            Logs(utilisateur='u', action='volume', date_action=debut - timedelta(seconds=i)) for i in range(5000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE INDEX logs_date_action_test ON logs (date_action)')
+            cursor.execute('ANALYZE logs')
+        premiere = self.client.get('/api/logs/?page_size=20').json()
+        with CaptureQueriesContext(connection) as requetes:
+            self.client.get(premiere['next'])
+        requetes_logs = [q['sql'] for q in requetes.captured_queries if 'FROM "logs"' in q['sql']]
+        # Page pleine dans la section non NULL : une seule requête, sans COALESCE
+        self.assertEqual(len(requetes_logs), 1)
+        self.assertNotIn('COALESCE', requetes_logs[0])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + requetes_logs[0])
+            plan = '\n'.join(ligne[0] for ligne in cursor.fetchall())
+        self.assertIn('Index Scan Backward using logs_date_action_test', plan)
+        # Au plus un tri incrémental des égalités sur la clé primaire, jamais de la table
+        self.assertIsNone(re.search(r'(^|->\s+)Sort\b', plan, re.MULTILINE))
+
+    def test_curseur_invalide(self):
+        response = self.client.get('/api/logs/?cursor=invalide')
+        self.assertEqual(response.status_code, 404)
+
+    def test_vues_non_paginees(self):
+        creer_tables_non_gerees(Equipe)
+        Equipe.objects.create(id_equipe='EQ1')
+        response = self.client.get('/api/equipes/')
+        self.assertEqual(response.json()[0]['id_equipe'], 'EQ1')
+
+def creer_table_cumul_heures():
+    """Table cumul_heures telle qu'utilisée par les requêtes SQL brutes des vues"""
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            CREATE TABLE cumul_heures (
+                id_cumul_heures SERIAL PRIMARY KEY,
+                matricule VARCHAR(30),
+                code_engin VARCHAR(30),
+                heure_par_jour DOUBLE PRECISION,
+                date DATE
+            )
+        ''')
+
+class CumulDumpStreamingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe)
+        creer_table_cumul_heures()
+        InfoEquipe.objects.create(matricule='D1', nom='Docker', prenom='Un', fonction='docker')
+        InfoEquipe.objects.create(matricule='C1', nom='Conducteur', prenom='Un', fonction='conducteur')
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO cumul_heures (matricule, code_engin, heure_par_jour, date)
+                VALUES ('D1', NULL, 7.5, '2025-01-01'), ('D1', NULL, 3, '2025-01-02'), ('C1', 'ENG1', 9, '2025-01-01')
+            ''')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def contenu(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export_ndjson(self):
+        response = self.client.get('/api/cumul/dockers/dump/?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        lignes = [json.loads(ligne) for ligne in self.contenu(response).splitlines()]
+        self.assertEqual([ligne['date'] for ligne in lignes], ['2025-01-02', '2025-01-01'])
+        self.assertEqual(lignes[0]['nom'], 'Docker')
+
+    def test_export_csv(self):
+        response = self.client.get('/api/cumul/dump/?format=csv')
+        lignes = self.contenu(response).splitlines()
+        self.assertTrue(lignes[0].startswith('id_cumul_heures,matricule,code_engin'))
+        self.assertEqual(len(lignes), 4)
+
+    async def test_export_asgi_par_lots_asynchrones(self):
+        response = await self.async_client.get('/api/cumul/dockers/dump/?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        # Contenu asynchrone : Django ne le lit pas en entier avant d'envoyer
+        self.assertTrue(response.is_async)
+        contenu = b''.join([morceau async for morceau in response.streaming_content]).decode('utf-8')
+        lignes = [json.loads(ligne) for ligne in contenu.splitlines()]
+        self.assertEqual([ligne['date'] for ligne in lignes], ['2025-01-02', '2025-01-01'])
+
+        @sync_to_async
+        def curseurs_ouverts():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT count(*) FROM pg_cursors')
+                return cursor.fetchone()[0]
+
+        # Client déconnecté après le premier lot : curseur serveur fermé
+        contenu = generer_async(generer_ndjson(lignes_curseur_serveur('SELECT * FROM cumul_heures')), taille_lot=1)
+        await anext(contenu)
+        self.assertEqual(await curseurs_ouverts(), 1)
+        await contenu.aclose()
+        self.assertEqual(await curseurs_ouverts(), 0)
+
+    def test_curseur_ferme_a_la_deconnexion(self):
+        def curseurs_ouverts():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT is_holdable FROM pg_cursors')
+                return [ligne[0] for ligne in cursor.fetchall()]
+
+        contenu = generer_ndjson(lignes_curseur_serveur('SELECT * FROM cumul_heures'))
+        next(contenu)
+        self.assertEqual(curseurs_ouverts(), [False])
+        # Le serveur ferme le contenu de la réponse quand le client se déconnecte
+        contenu.close()
+        self.assertEqual(curseurs_ouverts(), [])
+
+    def test_json_inchange(self):
+        response = self.client.get('/api/cumul/conducteurs/dump/')
+        self.assertEqual(response.json()[0]['matricule'], 'C1')
+
+class CacheEndpointsTest(TestCase):
+    """Les endpoints de référence sont servis depuis le cache jusqu'à la prochaine écriture"""
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        Engins.objects.create(code_engin='E1', famille_engin='grue', capacite_max=10, etat_engin='disponible')
+
+    def test_reponse_en_cache(self):
+        premiere = self.client.get('/api/engins/familles/').json()
+        with self.assertNumQueries(0):
+            seconde = self.client.get('/api/engins/familles/').json()
+        self.assertEqual(premiere, seconde)
+
+    def test_invalidation_apres_ecriture(self):
+        self.assertEqual(self.client.get('/api/engins/familles/').json()['familles'], ['grue'])
+        Engins.objects.create(code_engin='E2', famille_engin='chariot', capacite_max=10, etat_engin='disponible')
+        self.assertEqual(sorted(self.client.get('/api/engins/familles/').json()['familles']), ['chariot', 'grue'])
+
+FIXTURES_ANP = Path(__file__).resolve().parent / 'test_data' / 'anp'
+
+class FauxSiteANP(BaseHTTPRequestHandler):
+    """Rejoue les pages ANP enregistrées : formulaire, postbacks puis lien de pagination"""
+
+    def envoyer(self, fixture, status=200):
+        contenu = (FIXTURES_ANP / fixture).read_bytes() if fixture else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(contenu)))
+        self.end_headers()
+        self.wfile.write(contenu)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/fr/services/mvm-navires':
+            return self.envoyer(None, 404)
+        page = parse_qs(url.query).get('page', [None])[0]
+        self.envoyer('page3.html' if page == '3' else 'formulaire.html')
+
+    def do_POST(self):
+        longueur = int(self.headers.get('Content-Length', 0))
+        champs = {cle: valeurs[0] for cle, valeurs in parse_qs(self.rfile.read(longueur).decode(), keep_blank_values=True).items()}
+        evenement = (champs.get('__EVENTTARGET'), champs.get('__EVENTARGUMENT'), champs.get('__VIEWSTATE'))
+        if evenement == ('Ports', '', 'etat-initial') and champs.get('Ports') == 'AGA':
+            return self.envoyer('page1.html')
+        if evenement == ('grille', 'Page$2', 'etat-page-1'):
+            return self.envoyer('page2.html')
+        self.envoyer(None, 400)
+
+    def log_message(self, format, *args):
+        pass
+
+class ScraperANPHttpTest(TestCase):
+    """Le backend HTTP parcourt toutes les pages sans navigateur"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.serveur = ThreadingHTTPServer(('127.0.0.1', 0), FauxSiteANP)
+        threading.Thread(target=cls.serveur.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.serveur.server_port}/fr/services/mvm-navires'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.serveur.shutdown()
+        cls.serveur.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(NavirePrevisionnel)
+
+    def test_pagination_complete(self):
+        lignes = HttpFetcher(url=self.url).recuperer_lignes()
+        self.assertEqual([ligne[0] for ligne in lignes], ['TINA THERESA', 'HIZIR', 'ATLANTIC STAR'])
+        self.assertEqual(len(lignes[0]), 8)
+
+    def test_scraping_enregistre_les_navires(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            csv_filename = str(Path(dossier) / 'navires.csv')
+            etapes = []
+            with mock.patch('sys.stdout', new_callable=StringIO) as sortie, \
+                    self.assertLogs('manutention.navire_scraper', 'INFO') as journal:
+                result = scrape_navires_anp(
+                    backends=[HttpFetcher(url=self.url)], csv_filename=csv_filename,
+                    progression=lambda pourcentage, message: etapes.append(pourcentage),
+                )
+            self.assertEqual(len(Path(csv_filename).read_text(encoding='utf-8').splitlines()), 4)
+        # Progression par le rappel du job et le logger, rien sur la sortie standard
+        self.assertEqual(sortie.getvalue(), '')
+        self.assertEqual(etapes, [5, 60, 80])
+        self.assertTrue(any('3 ajoutés' in ligne for ligne in journal.output))
+        self.assertTrue(result['success'])
+        self.assertEqual(result['navires_ajoutes'], 3)
+        self.assertEqual(NavirePrevisionnel.objects.get(nom='ATLANTIC STAR').heure_arrivee.strftime('%H:%M'), '09:30')
+
+    def test_page_introuvable(self):
+        result = scrape_navires_anp(backends=[HttpFetcher(url=self.url.replace('mvm-navires', 'introuvable'))])
+        self.assertFalse(result['success'])
+
+class NaviresIngestionTest(TestCase):
+    """Upsert par lots des navires scrapés sur (nom, date d'arrivée, port)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(NavirePrevisionnel)
+
+    def ligne(self, nom, statut='EN RADE', date='04/08/2025', heure='14:12', port='CARTAGENA'):
+        return [nom, 'VRAQUIER', statut, date, heure, port, 'SOCONAV SARL', 'MARSA MAROC']
+
+    def test_rafraichissement_idempotent(self):
+        lignes = [self.ligne('HIZIR'), self.ligne('TINA  THERESA '), self.ligne('HIZIR', port='VARNA')]
+        compteurs, _ = ingerer_navires(lignes)
+        self.assertEqual(compteurs['inseres'], 3)
+
+        lignes[0] = self.ligne('HIZIR', statut='A QUAI')
+        compteurs, _ = ingerer_navires(lignes)
+        self.assertEqual((compteurs['inseres'], compteurs['mis_a_jour'], compteurs['inchanges']), (0, 1, 2))
+        self.assertEqual(NavirePrevisionnel.objects.count(), 3)
+        self.assertEqual(NavirePrevisionnel.objects.get(nom='HIZIR', port='CARTAGENA').statut, 'A QUAI')
+        self.assertTrue(NavirePrevisionnel.objects.filter(nom='TINA THERESA').exists())
+
+    def test_doublons_et_rejets(self):
+        lignes = [self.ligne('HIZIR'), self.ligne('HIZIR', heure='0930'), self.ligne('X', date='demain'), ['incomplet']]
+        compteurs, rejets = ingerer_navires(lignes)
+        self.assertEqual((compteurs['inseres'], compteurs['doublons'], compteurs['rejetes']), (1, 1, 2))
+        self.assertEqual(NavirePrevisionnel.objects.get().heure_arrivee.strftime('%H:%M'), '09:30')
+        self.assertIn('date invalide', rejets[0][1])
+
+    def test_deux_requetes_par_lot(self):
+        lignes = [self.ligne(f'NAVIRE {i}') for i in range(10)]
+        with CaptureQueriesContext(connection) as requetes:
+            ingerer_navires(lignes, taille_lot=4)
+        requetes_table = [q for q in requetes.captured_queries if 'navires_previsionnels' in q['sql']]
+        self.assertEqual(len(requetes_table), 6)
+
+@tache('test_addition')
+def tache_addition(job, a, b):
+    mettre_a_jour_progression(job, 50, 'calcul')
+    if a < 0:
+        raise ValueError('a négatif')
+    return {'somme': a + b}
+
+class JobsSoumissionTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_un_seul_job_actif_par_type(self):
+        job, cree = soumettre_job('test_addition', {'a': 1, 'b': 2})
+        doublon, cree_doublon = soumettre_job('test_addition', {'a': 1, 'b': 2})
+        self.assertTrue(cree)
+        self.assertFalse(cree_doublon)
+        self.assertEqual(job.pk, doublon.pk)
+
+        Job.objects.filter(pk=job.pk).update(statut=Job.TERMINE)
+        _, cree = soumettre_job('test_addition', {'a': 1, 'b': 2})
+        self.assertTrue(cree)
+
+    def test_update_navires_soumet_un_job(self):
+        response = self.client.post('/api/navires-previsionnels/update_navires/')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job']['id']
+        self.assertEqual(self.client.post('/api/navires-previsionnels/update_navires/').json()['job']['id'], job_id)
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').json()['statut'], 'en attente')
+
+    def test_parametres_et_trace_non_exposes(self):
+        job = Job.objects.create(
+            type_job='test_addition', statut=Job.ECHOUE, parametres={'chemin': '/tmp/import.xlsx'},
+            erreur='Traceback (most recent call last):\n  File "jobs.py", line 1\nValueError: a négatif\n',
+        )
+        donnees = self.client.get(f'/api/jobs/{job.pk}/').json()
+        self.assertNotIn('parametres', donnees)
+        self.assertEqual(donnees['erreur'], 'ValueError: a négatif')
+
+    def test_orphelins_selon_heartbeat(self):
+        maintenant = timezone.now()
+        ancien = maintenant - timedelta(hours=2)
+        perdu = Job.objects.create(type_job='perdu', statut=Job.EN_COURS, date_debut=ancien, date_heartbeat=ancien)
+        actif = Job.objects.create(
+            type_job='actif', statut=Job.EN_COURS, date_debut=ancien, date_heartbeat=maintenant - timedelta(seconds=5)
+        )
+        sans_heartbeat = Job.objects.create(type_job='sans_heartbeat', statut=Job.EN_COURS, date_debut=ancien)
+
+        with self.settings(JOBS_DELAI_ORPHELINS=60):
+            self.assertEqual(liberer_jobs_orphelins(), 2)
+        statuts = dict(Job.objects.values_list('pk', 'statut'))
+        self.assertEqual(statuts[perdu.pk], Job.ECHOUE)
+        self.assertEqual(statuts[sans_heartbeat.pk], Job.ECHOUE)
+        self.assertEqual(statuts[actif.pk], Job.EN_COURS)
+
+        # La progression renouvelle le heartbeat
+        mettre_a_jour_progression(actif, 10)
+        actif.refresh_from_db()
+        self.assertGreater(actif.date_heartbeat, maintenant)
+
+class RunJobsTest(TransactionTestCase):
+    """Le worker exécute les jobs dans ses propres threads et connexions"""
+
+    def test_execution_des_jobs(self):
+        succes, _ = soumettre_job('test_addition', {'a': 1, 'b': 2})
+        Job.objects.create(type_job='test_addition', statut=Job.TERMINE)
+        call_command('run_jobs', '--une-fois', '--workers', '2', stdout=StringIO())
+
+        succes.refresh_from_db()
+        self.assertEqual((succes.statut, succes.progression, succes.resultat), (Job.TERMINE, 100, {'somme': 3}))
+
+        echec, _ = soumettre_job('test_addition', {'a': -1, 'b': 2})
+        call_command('run_jobs', '--une-fois', stdout=StringIO())
+        echec.refresh_from_db()
+        self.assertEqual(echec.statut, Job.ECHOUE)
+        self.assertEqual(echec.erreur, 'ValueError: a négatif')
+        self.assertEqual(echec.message, 'calcul')
+
+class NaviresCsvDataTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_fichier_relu_seulement_si_modifie(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = Path(dossier) / 'navires.csv'
+            entete = 'Nom,Type,Statut,Date,Heure,Port,Consignataire,Opérateur\n'
+            chemin.write_text(entete + 'HIZIR,VRAQUIER,A QUAI,04/08/2025,07:40,VARNA,TRADE NAV,MARSA MAROC\n', encoding='utf-8')
+            _, premiers = lire_csv_navires(str(chemin))
+            _, seconds = lire_csv_navires(str(chemin))
+            self.assertIs(premiers, seconds)
+
+            chemin.write_text(entete + 'X,Y,Z,05/08/2025,08:00,P,C,O\nW,Y,Z,06/08/2025,08:00,P,C,O\n', encoding='utf-8')
+            _, relus = lire_csv_navires(str(chemin))
+            self.assertEqual([navire['nom'] for _, navire in relus], ['X', 'W'])
+
+    def test_etag_et_304(self):
+        response = self.client.get('/api/navires-previsionnels/csv_data/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/api/navires-previsionnels/csv_data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/navires-previsionnels/csv_data/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_filtre_since(self):
+        self.assertEqual(self.client.get('/api/navires-previsionnels/csv_data/?since=2100-01-01').json()['count'], 0)
+        self.assertEqual(self.client.get('/api/navires-previsionnels/csv_data/?since=hier').status_code, 400)
+
+class StatsPresenceTest(TestCase):
+    """Comptes de présence calculés en SQL, sans doublons ni détails superflus"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+        for matricule, fonction in (('C1', 'conducteur'), ('C2', 'conducteur'), ('D1', 'docker')):
+            InfoEquipe.objects.create(matricule=matricule, nom=matricule, prenom='P', fonction=fonction)
+        debut = datetime(2025, 3, 10, 8, tzinfo=pytz.UTC)
+        # Deux absences qui se chevauchent pour C1 : il ne compte qu'une fois
+        Absences.objects.create(matricule='C1', date_debut_abs=debut, date_fin_abs=debut + timedelta(days=2))
+        Absences.objects.create(matricule='C1', date_debut_abs=debut, date_fin_abs=debut + timedelta(hours=4))
+        Absences.objects.create(matricule='D1', date_debut_abs=debut + timedelta(days=5), date_fin_abs=debut + timedelta(days=6))
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_comptes_par_fonction(self):
+        stats = self.client.get('/api/stats/presence/?fonction=conducteur&date=2025-03-11').json()
+        self.assertEqual((stats['total'], stats['presents'], stats['absents']), (2, 1, 1))
+        self.assertNotIn('details', stats)
+
+        stats = self.client.get('/api/stats/presence/?date=2025-03-15&details=1').json()
+        self.assertEqual((stats['total'], stats['absents']), (3, 1))
+        self.assertEqual([ligne['statut'] for ligne in stats['details']], ['present', 'present', 'absent'])
+        self.assertEqual(self.client.get('/api/stats/presence/?date=demain').status_code, 400)
+
+    def test_cache_invalide_par_les_absences(self):
+        url = '/api/stats/presence/?fonction=conducteur&date=2025-03-11'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()['absents'], 1)
+        Absences.objects.create(matricule='C2', date_debut_abs=datetime(2025, 3, 11, 9, tzinfo=pytz.UTC), date_fin_abs=datetime(2025, 3, 11, 17, tzinfo=pytz.UTC))
+        self.assertEqual(self.client.get(url).json()['absents'], 2)
+
+    def test_anciens_endpoints(self):
+        stats = self.client.get('/api/stats/dockers/presence/').json()
+        self.assertEqual(stats['total'], 1)
+        self.assertEqual(stats['details'][0]['matricule'], 'D1')
+
+class PresenceJournaliereTest(TestCase):
+    """La table presence_journaliere suit les écritures d'absences"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+        InfoEquipe.objects.create(matricule='C1', nom='C1', prenom='P', fonction='conducteur')
+        InfoEquipe.objects.create(matricule='D1', nom='D1', prenom='P', fonction='docker')
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def statuts(self, matricule):
+        return dict(PresenceJournaliere.objects.filter(matricule=matricule).values_list('jour', 'statut'))
+
+    def jour(self, numero):
+        return datetime(2025, 3, numero).date()
+
+    def test_maintenance_incrementale(self):
+        absence = Absences.objects.create(
+            matricule='C1', date_debut_abs=datetime(2025, 3, 10, 8, tzinfo=pytz.UTC), date_fin_abs=datetime(2025, 3, 11, 17, tzinfo=pytz.UTC)
+        )
+        self.assertEqual(self.statuts('C1'), {self.jour(10): 'absent', self.jour(11): 'absent'})
+
+        # Déplacement : les anciens jours redeviennent présents
+        absence.date_debut_abs = datetime(2025, 3, 11, 8, tzinfo=pytz.UTC)
+        absence.date_fin_abs = datetime(2025, 3, 12, 17, tzinfo=pytz.UTC)
+        absence.save()
+        self.assertEqual(
+            self.statuts('C1'), {self.jour(10): 'present', self.jour(11): 'absent', self.jour(12): 'absent'}
+        )
+
+        AbsenceNonDeclaree.objects.create(
+            matricule='D1', id_shift=1, date_debut_abs=datetime(2025, 3, 11, 8, tzinfo=pytz.UTC), date_fin_abs=datetime(2025, 3, 11, 16, tzinfo=pytz.UTC)
+        )
+        stats = self.client.get('/api/stats/presence/?date=2025-03-11').json()
+        self.assertEqual((stats['total'], stats['presents'], stats['absents'], stats['absents_non_declares']), (2, 0, 1, 1))
+
+        absence.delete()
+        self.assertEqual(set(self.statuts('C1').values()), {'present'})
+        self.assertEqual(self.client.get('/api/stats/presence/?date=2025-03-11').json()['absents'], 0)
+
+    def test_absence_refusee_ignoree(self):
+        absence = Absences.objects.create(
+            matricule='C1', date_debut_abs=datetime(2025, 3, 10, 8, tzinfo=pytz.UTC),
+            date_fin_abs=datetime(2025, 3, 10, 17, tzinfo=pytz.UTC), etat='refusée',
+        )
+        self.assertEqual(self.statuts('C1'), {self.jour(10): 'present'})
+        self.assertEqual(self.client.get('/api/stats/presence/?date=2025-03-10').json()['absents'], 0)
+
+        absence.etat = 'validée'
+        absence.save()
+        self.assertEqual(self.statuts('C1'), {self.jour(10): 'absent'})
+        # Refus après coup : l'employé redevient présent
+        absence.etat = 'refusée'
+        absence.save()
+        self.assertEqual(self.statuts('C1'), {self.jour(10): 'present'})
+
+    def test_historique_et_backfill(self):
+        Absences.objects.create(
+            matricule='C1', date_debut_abs=datetime(2025, 3, 10, 8, tzinfo=pytz.UTC), date_fin_abs=datetime(2025, 3, 10, 17, tzinfo=pytz.UTC)
+        )
+        historique = self.client.get('/api/stats/presence/historique/?debut=2025-03-09&fin=2025-03-11&fonction=conducteur').json()
+        self.assertEqual([jour['absents'] for jour in historique], [0, 1, 0])
+        self.assertEqual(historique[0]['total'], 1)
+        self.assertEqual(self.client.get('/api/stats/presence/historique/?debut=2025-03-11&fin=2025-03-09').status_code, 400)
+
+        PresenceJournaliere.objects.all().delete()
+        call_command('snapshot_presence', '--debut', '2025-03-01', '--fin', '2025-03-31', '--jours-par-lot', '10', stdout=StringIO())
+        self.assertEqual(PresenceJournaliere.objects.count(), 2 * 31)
+        self.assertEqual(PresenceJournaliere.objects.filter(statut='absent').get().jour, self.jour(10))
+
+
+class AlertesHeuresTest(TestCase):
+    """Les alertes sont ouvertes et fermées par le trigger sur cumul_heures"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe)
+        creer_table_cumul_heures()
+        installer_moteur_alertes()
+        InfoEquipe.objects.create(matricule='C1', nom='C1', prenom='P', fonction='conducteur')
+        InfoEquipe.objects.create(matricule='D1', nom='D1', prenom='P', fonction='docker')
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def executer(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def test_ouverture_et_fermeture(self):
+        self.executer("INSERT INTO cumul_heures (matricule, code_engin, heure_par_jour, date) VALUES ('C1', 'E1', 9.5, CURRENT_DATE)")
+        self.executer("INSERT INTO cumul_heures (matricule, code_engin, heure_par_jour, date) VALUES ('D1', 'E1', 4, CURRENT_DATE)")
+
+        alertes = self.client.get('/api/alertes/conducteurs/').json()['alertes']
+        self.assertEqual([(a['matricule'], a['type_alerte'], a['message']) for a in alertes], [('C1', 'excess', 'Surcharge: 9.5h/jour')])
+        self.assertEqual(self.client.get('/api/alertes/dockers/').json()['alertes'], [])
+
+        # Passage en sous-charge : l'alerte de surcharge est fermée, une nouvelle est ouverte
+        self.executer("UPDATE cumul_heures SET heure_par_jour = 1 WHERE matricule = 'C1'")
+        self.assertEqual(AlerteHeures.objects.filter(date_fermeture__isnull=True).get().type_alerte, 'lack')
+        self.executer("DELETE FROM cumul_heures WHERE matricule = 'C1'")
+        self.assertFalse(AlerteHeures.objects.filter(date_fermeture__isnull=True).exists())
+
+        historique = self.client.get('/api/alertes/historique/?matricule=C1').json()['alertes']
+        self.assertEqual(sorted(a['type_alerte'] for a in historique), ['excess', 'lack'])
+        self.assertTrue(all(a['date_fermeture'] for a in historique))
+
+    def test_limites_configurees(self):
+        self.executer("CREATE TABLE configuration (cle VARCHAR(50) PRIMARY KEY, valeur VARCHAR(50))")
+        self.executer("INSERT INTO configuration VALUES ('limite_min_heures', '1'), ('limite_max_heures', '10')")
+        self.assertEqual(self.client.get('/api/limites/alertes/').json(), {'limite_min': 1, 'limite_max': 10})
+
+        self.executer("INSERT INTO cumul_heures (matricule, code_engin, heure_par_jour, date) VALUES ('C1', 'E1', 9.5, CURRENT_DATE)")
+        self.assertFalse(AlerteHeures.objects.exists())
+
+        # Abaissement de la limite puis réévaluation de la période
+        self.executer("UPDATE configuration SET valeur = '9' WHERE cle = 'limite_max_heures'")
+        call_command('evaluer_alertes', stdout=StringIO())
+        alerte = AlerteHeures.objects.get()
+        self.assertEqual((alerte.type_alerte, alerte.limite), ('excess', 9))
+        # Limites en cache invalidées : endpoint et affectation automatique lisent la nouvelle valeur
+        self.assertEqual(self.client.get('/api/limites/alertes/').json(), {'limite_min': 1, 'limite_max': 9})
+        self.assertEqual(lire_limites_alertes()['limite_max'], 9)
+
+
+@override_settings(EVENEMENTS={'LISTEN': False, 'HEARTBEAT': 1})
+class FluxEvenementsTest(TestCase):
+    """Diffusion locale du bus et flux SSE des événements RH"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+        InfoEquipe.objects.create(matricule='C1', nom='C1', prenom='P', fonction='conducteur')
+
+    def test_publication_apres_commit(self):
+        loop = asyncio.new_event_loop()
+        try:
+            async def abonner():
+                return bus.abonner({'presence'})
+            abonnement = loop.run_until_complete(abonner())
+            with self.captureOnCommitCallbacks(execute=True):
+                recalculer_presence(datetime(2025, 3, 10).date(), datetime(2025, 3, 11).date(), ['C1'])
+                # Rien n'est diffusé avant le commit
+                self.assertIsNone(loop.run_until_complete(abonnement.suivant(0.05)))
+            evenement = loop.run_until_complete(abonnement.suivant(1))
+            self.assertEqual((evenement['canal'], evenement['type']), ('presence', 'recalcul'))
+            self.assertEqual((evenement['donnees']['matricules'], evenement['donnees']['modifiees']), (['C1'], 2))
+            bus.desabonner(abonnement)
+        finally:
+            loop.close()
+
+    async def test_flux_sse(self):
+        response = await self.async_client.get('/api/flux/rh/?canaux=alertes')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(b': connecte', await anext(aiter(response.streaming_content)))
+        await response._iterator.aclose()
+
+        flux = flux_evenements({'alertes'})
+        self.assertIn(': connecte', await anext(flux))
+
+        bus.diffuser({'canal': 'presence', 'type': 'recalcul', 'donnees': {}})
+        bus.diffuser({'canal': 'alertes', 'type': 'ouverte', 'donnees': {'matricule': 'C1'}})
+        morceau = await anext(flux)
+        self.assertTrue(morceau.startswith('event: alertes\n'))
+        self.assertEqual(json.loads(morceau.split('data: ', 1)[1])['donnees'], {'matricule': 'C1'})
+        # Keep-alive quand rien ne se passe
+        self.assertEqual(await anext(flux), ': ping\n\n')
+
+        await flux.aclose()
+        self.assertEqual(bus.nombre_abonnes(), 0)
+        self.assertEqual((await self.async_client.get('/api/flux/rh/?canaux=inconnu')).status_code, 400)
+
+    def test_flux_indisponible_sous_wsgi(self):
+        self.assertEqual(APIClient().get('/api/flux/rh/').status_code, 501)
+
+
+class EcouteurPostgresTest(TransactionTestCase):
+    """NOTIFY émis par le trigger des alertes, reçu par le thread LISTEN"""
+
+    def setUp(self):
+        creer_table_cumul_heures()
+        installer_moteur_alertes()
+
+    def tearDown(self):
+        arreter_ecoute()
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE cumul_heures')
+
+    def test_alerte_diffusee_a_tous_les_abonnes(self):
+        loop = asyncio.new_event_loop()
+        try:
+            async def abonner():
+                return bus.abonner({'alertes'})
+            abonnement = loop.run_until_complete(abonner())
+            self.assertTrue(demarrer_ecoute().pret.wait(5))
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO cumul_heures (matricule, code_engin, heure_par_jour, date) VALUES ('C1', 'E1', 12, CURRENT_DATE)"
+                )
+            evenement = loop.run_until_complete(abonnement.suivant(5))
+            self.assertEqual((evenement['type'], evenement['donnees']['matricule']), ('ouverte', 'C1'))
+            self.assertEqual(evenement['donnees']['heures'], 12)
+            bus.desabonner(abonnement)
+        finally:
+            loop.close()
+
+    def test_ecriture_configuration_invalide_les_limites(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE configuration (cle VARCHAR(50) PRIMARY KEY, valeur VARCHAR(50))")
+            cursor.execute("INSERT INTO configuration VALUES ('limite_max_heures', '10')")
+        try:
+            installer_moteur_alertes()
+            get_cache().clear()
+            self.assertEqual(lire_limites_alertes()['limite_max'], 10)
+            self.assertTrue(demarrer_ecoute().pret.wait(5))
+
+            # Écriture hors de l'application, sans evaluer_alertes
+            with connection.cursor() as cursor:
+                cursor.execute("UPDATE configuration SET valeur = '7' WHERE cle = 'limite_max_heures'")
+            fin = time.monotonic() + 5
+            while lire_limites_alertes()['limite_max'] != 7 and time.monotonic() < fin:
+                time.sleep(0.05)
+            self.assertEqual(lire_limites_alertes()['limite_max'], 7)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TABLE configuration')
+
+
+@override_settings(EVENEMENTS={'LISTEN': False, 'HEARTBEAT': 1, 'REPRISE_MAX': 2})
+class FluxEnginsTest(TestCase):
+    """Transitions d'état des engins journalisées et rejouables par id"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Engins.objects.create(code_engin='E1', famille_engin='grue', capacite_max=10, etat_engin='disponible')
+
+    def test_transitions_journalisees(self):
+        client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.patch('/api/engins/E1/update_etat/', {'etat_engin': 'en maintenance'}, format='json').status_code, 200)
+            # Même état : aucune transition
+            client.patch('/api/engins/E1/update_etat/', {'etat_engin': 'en maintenance'}, format='json')
+            client.patch('/api/engins/E1/', {'etat_engin': 'affecté'}, format='json')
+
+        transitions = [
+            (e.type_evenement, e.donnees['ancien_etat'], e.donnees['nouvel_etat'])
+            for e in Evenement.objects.filter(canal='engins').order_by('id')
+        ]
+        self.assertEqual(transitions[-2:], [
+            ('transition', 'disponible', 'en maintenance'), ('transition', 'en maintenance', 'affecté'),
+        ])
+
+    async def test_reprise_apres_last_event_id(self):
+        evenements = []
+        for etat in ('a', 'b', 'c'):
+            evenements.append(await sync_to_async(publier_journalise)('engins', 'transition', {'nouvel_etat': etat}))
+        premier, deuxieme, troisieme = (e.id for e in evenements)
+
+        flux = flux_evenements(('engins',), journal=True, depuis=premier)
+        await anext(flux)
+        self.assertTrue((await anext(flux)).startswith(f'id: {deuxieme}\n'))
+        self.assertTrue((await anext(flux)).startswith(f'id: {troisieme}\n'))
+        # Déjà rejoué : ignoré ; nouvel id : transmis
+        bus.diffuser({'id': troisieme, 'canal': 'engins', 'type': 'transition', 'donnees': {}})
+        bus.diffuser({'id': troisieme + 1, 'canal': 'engins', 'type': 'transition', 'donnees': {}})
+        self.assertTrue((await anext(flux)).startswith(f'id: {troisieme + 1}\n'))
+        await flux.aclose()
+
+        # Plus d'événements manqués que REPRISE_MAX : resynchronisation complète
+        flux = flux_evenements(('engins',), journal=True, depuis=premier - 1)
+        await anext(flux)
+        self.assertIn('event: resync', await anext(flux))
+        await flux.aclose()
+
+        response = await self.async_client.get('/api/flux/engins/', headers={'Last-Event-ID': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class QuotaAffectationsManuellesTest(TestCase):
+    """Consommation, remboursement et réinitialisation du quota des chefs d'escale"""
+
+    def setUp(self):
+        self.client = APIClient()
+        debut = timezone.now() - timedelta(hours=1)
+        self.shift = Shifts.objects.create(date_debut_shift=debut, date_fin_shift=debut + timedelta(hours=8))
+        ChefEscale.objects.create(id_chef_escale='CE1', nbr_aff_manuelle=1, id_shift=self.shift)
+
+    def test_consommation_et_remboursement(self):
+        reponse = self.client.post('/api/chef-escale/CE1/quota/consommer/', {'reference': 'aff-1'}, format='json')
+        self.assertEqual(reponse.json(), {'nbr_aff_manuelle': 0})
+        self.assertEqual(self.client.post('/api/chef-escale/CE1/quota/consommer/').status_code, 409)
+        self.assertEqual(self.client.post('/api/chef-escale/INCONNU/quota/consommer/').status_code, 404)
+
+        self.assertEqual(self.client.post('/api/chef-escale/CE1/quota/rembourser/').json(), {'nbr_aff_manuelle': 1})
+        historique = self.client.get('/api/chef-escale/CE1/quota/historique/').json()
+        self.assertEqual([(m['operation'], m['delta'], m['restant']) for m in historique], [
+            ('remboursement', 1, 1), ('consommation', -1, 0),
+        ])
+
+    def test_modification_validee_et_journalisee(self):
+        for valeur in (5, -1, 'deux', True):
+            self.assertEqual(
+                self.client.patch('/api/chef-escale/modifier/CE1/', {'nbr_aff_manuelle': valeur}, format='json').status_code, 400
+            )
+        self.assertEqual(self.client.patch('/api/chef-escale/modifier/CE1/', {'nbr_aff_manuelle': 3}, format='json').status_code, 200)
+        mouvement = ConsommationQuota.objects.get()
+        self.assertEqual((mouvement.operation, mouvement.delta, mouvement.restant), ('ajustement', 2, 3))
+
+    def test_reinitialisation_une_fois_par_shift(self):
+        ChefEscale.objects.create(id_chef_escale='CE2', nbr_aff_manuelle=0)
+        call_command('reinitialiser_quotas', stdout=StringIO())
+        self.assertEqual(ChefEscale.objects.get(pk='CE1').nbr_aff_manuelle, 4)
+        # Chef sans shift en cours : inchangé
+        self.assertEqual(ChefEscale.objects.get(pk='CE2').nbr_aff_manuelle, 0)
+
+        consommer_affectation_manuelle('CE1')
+        call_command('reinitialiser_quotas', stdout=StringIO())
+        self.assertEqual(ChefEscale.objects.get(pk='CE1').nbr_aff_manuelle, 3)
+        self.assertEqual(ConsommationQuota.objects.filter(operation='reinitialisation').count(), 1)
+
+
+class QuotaConcurrenceTest(TransactionTestCase):
+    """Des écrivains parallèles ne dépensent jamais plus que le quota"""
+
+    def test_aucun_quota_depense_deux_fois(self):
+        ChefEscale.objects.create(id_chef_escale='CE1', nbr_aff_manuelle=4)
+        depart = threading.Barrier(16)
+        resultats = []
+
+        def ecrivain(numero):
+            try:
+                depart.wait()
+                resultats.append(consommer_affectation_manuelle('CE1', reference=f'aff-{numero}'))
+            except QuotaEpuise:
+                resultats.append(None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=ecrivain, args=(numero,)) for numero in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(r for r in resultats if r is not None), [0, 1, 2, 3])
+        self.assertEqual(resultats.count(None), 12)
+        self.assertEqual(ChefEscale.objects.get(pk='CE1').nbr_aff_manuelle, 0)
+        self.assertEqual(ConsommationQuota.objects.filter(operation='consommation').count(), 4)
+
+    def test_reinitialisation_concurrente_une_fois(self):
+        debut = timezone.now() - timedelta(hours=1)
+        shift = Shifts.objects.create(date_debut_shift=debut, date_fin_shift=debut + timedelta(hours=8))
+        ChefEscale.objects.create(id_chef_escale='CE1', nbr_aff_manuelle=0, id_shift=shift)
+        depart = threading.Barrier(8)
+        resultats = []
+
+        def planificateur():
+            try:
+                depart.wait()
+                resultats.append(reinitialiser_quotas_shifts_commences())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=planificateur) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(resultats), [0] * 7 + [1])
+        self.assertEqual(ConsommationQuota.objects.filter(operation='reinitialisation').count(), 1)
+
+class AffectationAutomatiqueTest(TestCase):
+    """Éligibilité, couplage de poids maximal et écriture groupée des affectations d'un shift"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences, Affectations)
+        creer_table_cumul_heures()
+        with connection.cursor() as cursor:
+            # Colonne niveau_expertise de la base réelle (celle lue par les vues SQL)
+            cursor.execute('''
+                CREATE TABLE qualifications_conducteurs (
+                    id_qualification SERIAL PRIMARY KEY,
+                    matricule VARCHAR(20),
+                    code_engin VARCHAR(30),
+                    niveau_expertise VARCHAR(20)
+                )
+            ''')
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        self.debut = timezone.now().replace(hour=6, minute=0, second=0, microsecond=0)
+        self.shift = Shifts.objects.create(date_debut_shift=self.debut, date_fin_shift=self.debut + timedelta(hours=6))
+        equipe = Equipe.objects.create(id_equipe='EQ1')
+        for matricule in ('C1', 'C2', 'C3', 'C4', 'C5'):
+            InfoEquipe.objects.create(id_equipe=equipe, matricule=matricule, fonction='conducteur')
+        InfoEquipe.objects.create(id_equipe=equipe, matricule='D1', fonction='docker')
+        for code, etat in (('GR1', 'disponible'), ('GR2', 'disponible'), ('GR3', 'en_panne')):
+            Engins.objects.create(code_engin=code, famille_engin='grue', capacite_max=40, etat_engin=etat)
+        qualifications = [
+            ('C1', 'GR1', 'expert'), ('C1', 'GR2', 'confirmé'), ('C2', 'GR1', 'confirmé'),
+            ('C3', 'GR2', 'expert'), ('C3', 'GR3', 'expert'), ('C4', 'GR1', 'expert'),
+            ('C5', 'GR2', 'expert'), ('D1', 'GR1', 'expert'),
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO qualifications_conducteurs (matricule, code_engin, niveau_expertise) VALUES (%s, %s, %s)',
+                qualifications,
+            )
+            # C4 a déjà 4 h ce jour : 4 + 6 dépasse la limite max de 8 h
+            cursor.execute('INSERT INTO cumul_heures (matricule, heure_par_jour, date) VALUES (%s, 4, %s)', ['C4', self.debut.date()])
+        # C3 absent pendant le shift, absence refusée de C1 ignorée
+        Absences.objects.create(matricule='C3', date_debut_abs=self.debut + timedelta(hours=2), date_fin_abs=self.debut + timedelta(hours=3))
+        Absences.objects.create(matricule='C1', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=6), etat='refusée')
+        AbsenceNonDeclaree.objects.create(matricule='C5', id_shift=self.shift.id_shift, date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=1))
+
+    def test_eligibilite_et_couplage_optimal(self):
+        reponse = self.client.post(f'/api/shifts/{self.shift.id_shift}/affectation-auto/', {'simulation': True}, format='json')
+        self.assertEqual(reponse.status_code, 200)
+        resultat = reponse.json()
+        self.assertEqual((resultat['conducteurs_eligibles'], resultat['engins_eligibles']), (2, 2))
+        # C1 prendrait GR1 seul, mais C1-GR2 + C2-GR1 maximise le poids total
+        self.assertEqual(
+            sorted((a['matricule'], a['code_engin']) for a in resultat['affectations']),
+            [('C1', 'GR2'), ('C2', 'GR1')],
+        )
+        self.assertFalse(Affectations.objects.exists())
+
+    def test_ecriture_groupee_et_relance(self):
+        with self.assertNumQueries(8):
+            reponse = self.client.post(f'/api/shifts/{self.shift.id_shift}/affectation-auto/')
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual(Affectations.objects.filter(id_shift=self.shift, date_affectation=self.debut.date()).count(), 2)
+        lien = AffectationConducteur.objects.get(matricule='C2')
+        self.assertEqual(Affectations.objects.get(pk=lien.id_affectation).code_engin_id, 'GR1')
+
+        # Relance : tout est déjà affecté pour ce shift
+        self.assertEqual(self.client.post(f'/api/shifts/{self.shift.id_shift}/affectation-auto/').json()['affectations'], [])
+        self.assertEqual(self.client.post('/api/shifts/999999/affectation-auto/').status_code, 404)
+
+    def test_repli_numpy_optimal(self):
+        generateur = np.random.default_rng(1)
+        for conducteurs, engins in ((30, 20), (15, 25), (20, 20)):
+            lignes, colonnes = np.nonzero(generateur.random((conducteurs, engins)) < 0.3)
+            _, _, matrice = construire_matrice(
+                [f'C{l}' for l in lignes], [f'E{c}' for c in colonnes], generateur.random(len(lignes)) + 1
+            )
+            totaux = []
+            for solveur in ('numpy', 'scipy'):
+                choix_lignes, choix_colonnes = resoudre_affectation(matrice, solveur=solveur)
+                self.assertEqual(len(set(choix_lignes)), len(choix_lignes))
+                self.assertEqual(len(set(choix_colonnes)), len(choix_colonnes))
+                totaux.append(matrice[choix_lignes, choix_colonnes].sum())
+            self.assertAlmostEqual(*totaux)
+
+class DetectionAbsencesNonDeclareesTest(TestCase):
+    """Attendus du shift moins absences déclarées et heures saisies, insérés une seule fois"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences, Affectations)
+        creer_table_cumul_heures()
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        self.debut = datetime(2025, 3, 10, 6, tzinfo=pytz.UTC)
+        self.shift = Shifts.objects.create(date_debut_shift=self.debut, date_fin_shift=self.debut + timedelta(hours=8))
+        # Shift pas encore terminé : ignoré
+        Shifts.objects.create(date_debut_shift=timezone.now(), date_fin_shift=timezone.now() + timedelta(hours=8))
+        equipe = Equipe.objects.create(id_equipe='EQ1')
+        Equipe.objects.create(id_equipe='EQ2')
+        for matricule in ('D1', 'D2', 'D3', 'D4'):
+            InfoEquipe.objects.create(id_equipe=equipe, matricule=matricule, fonction='docker')
+        InfoEquipe.objects.create(id_equipe_id='EQ2', matricule='X1', fonction='docker')
+        Affectations.objects.create(id_equipe=equipe, id_shift=self.shift, date_affectation=self.debut.date())
+        AffectationConducteur.objects.create(id_shift=self.shift.id_shift, matricule='C1', code_engin='GR1', poids=1)
+        # D1 déclaré absent, D2 a travaillé, D3 absence refusée : D3, D4 et C1 sont manquants
+        Absences.objects.create(matricule='D1', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=2))
+        Absences.objects.create(matricule='D3', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=8), etat='refusée')
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO cumul_heures (matricule, heure_par_jour, date) VALUES (%s, 8, %s)', ['D2', self.debut.date()])
+
+    def test_detection_idempotente(self):
+        debut, fin = datetime(2025, 3, 1, tzinfo=pytz.UTC), timezone.now() + timedelta(days=1)
+        # Détection et recalcul de présence ; les NOTIFY partent après le commit
+        with self.assertNumQueries(4), self.captureOnCommitCallbacks() as rappels:
+            creees = detecter_absences_non_declarees(debut, fin)
+        self.assertEqual(len(rappels), 3)
+        self.assertEqual(sorted(matricule for matricule, _, _ in creees), ['C1', 'D3', 'D4'])
+        self.assertEqual(
+            PresenceJournaliere.objects.get(matricule='D4', jour=self.debut.date()).statut, 'absent_non_declare'
+        )
+        self.assertEqual(detecter_absences_non_declarees(debut, fin), [])
+        self.assertEqual(AbsenceNonDeclaree.objects.count(), 3)
+
+    def test_commande_et_lecture(self):
+        sortie = StringIO()
+        call_command('detecter_absences_non_declarees', '--debut', '2025-03-10', '--fin', '2025-03-10', stdout=sortie)
+        self.assertIn('3 absence(s)', sortie.getvalue())
+
+        reponse = self.client.get(f'/api/absences-avancees/absences_non_declarees/?debut=2025-03-01&fin=2025-03-31&id_shift={self.shift.id_shift}')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([a['matricule'] for a in reponse.json()], ['C1', 'D3', 'D4'])
+        self.assertEqual(reponse.json()[1]['fonction'], 'docker')
+        self.assertEqual(self.client.get('/api/absences-avancees/absences_non_declarees/?debut=mars').status_code, 400)
+
+class ConseilIndexTest(TestCase):
+    """EXPLAIN des requêtes brutes de views.py et script d'index CONCURRENTLY"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+        creer_table_cumul_heures()
+        for i in range(50):
+            InfoEquipe.objects.create(matricule=f'D{i}', nom='N', prenom='P', fonction='docker' if i % 2 else 'conducteur')
+            Absences.objects.create(matricule=f'D{i}', date_debut_abs=timezone.now(), date_fin_abs=timezone.now())
+
+    def test_extraction_des_requetes(self):
+        requetes = extraire_requetes(Path(__file__).parent / 'views.py')
+        origines = {requete['origine'] for requete in requetes}
+        self.assertIn('SQL_CUMUL_DUMP', origines)
+        self.assertIn('supprimer_docker', origines)
+        # Fragments dynamiques retirés
+        self.assertFalse(any('{filtre}' in requete['sql'] for requete in requetes))
+
+    def test_propositions_et_annulation(self):
+        requetes = [
+            {'origine': 'liste', 'ligne': 1, 'sql': 'SELECT matricule FROM info_equipe WHERE fonction = %s ORDER BY nom'},
+            {'origine': 'liste_bis', 'ligne': 2, 'sql': 'SELECT nom FROM info_equipe WHERE fonction = %s'},
+            {'origine': 'chevauchement', 'ligne': 3, 'sql': (
+                'SELECT id_absence FROM absences WHERE matricule = %s AND date_debut_abs < %s AND date_fin_abs >= %s'
+            )},
+            {'origine': 'purge', 'ligne': 4, 'sql': 'DELETE FROM absences WHERE matricule <> %s'},
+            {'origine': 'cassee', 'ligne': 5, 'sql': 'SELECT * FROM table_absente'},
+        ]
+        resultats, propositions = analyser_requetes(requetes)
+        self.assertIn('table_absente', resultats[4]['erreur'])
+        self.assertEqual(list(propositions), [
+            ('info_equipe', ('fonction',)), ('absences', ('matricule', 'date_debut_abs', 'date_fin_abs')),
+        ])
+        self.assertEqual(len(propositions[('info_equipe', ('fonction',))]), 2)
+        # Le DELETE expliqué avec ANALYZE a été annulé
+        self.assertEqual(resultats[3]['scans'][0]['lignes'], 50)
+        self.assertEqual(Absences.objects.count(), 50)
+
+        script = script_index(propositions)
+        self.assertIn(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS "absences_matricule_date_debut_abs_date_fin_abs_idx" '
+            'ON "absences" ("matricule", "date_debut_abs", "date_fin_abs");', script
+        )
+        # Index déjà couvert : plus proposé
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute('CREATE INDEX info_equipe_fonction_matricule_idx ON info_equipe (fonction, matricule)')
+        self.assertNotIn(('info_equipe', ('fonction',)), analyser_requetes(requetes)[1])
+
+    def test_commande(self):
+        sortie = StringIO()
+        with tempfile.NamedTemporaryFile(suffix='.sql') as fichier:
+            call_command('conseiller_index', '--sortie', fichier.name, stdout=sortie, stderr=StringIO())
+            self.assertTrue(Path(fichier.name).read_text().startswith('-- Index conseillés'))
+        self.assertIn('requête(s) analysée(s)', sortie.getvalue())
+
+class PeriodesAbsenceTest(TestCase):
+    """Chevauchements d'absences servis par l'index GiST de periode_absence()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+        creer_table_cumul_heures()
+        installer_moteur_alertes()
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_INDEX_PERIODES)
+        InfoEquipe.objects.create(matricule='C1', nom='C1', prenom='P', fonction='conducteur')
+
+    def setUp(self):
+        self.debut = datetime(2025, 3, 10, 8, tzinfo=pytz.UTC)
+        Absences.objects.create(matricule='C1', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=4))
+        Absences.objects.create(matricule='C2', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=4), etat='refusée')
+        # Bornes saisies à l'envers : remises dans l'ordre
+        AbsenceNonDeclaree.objects.create(
+            matricule='C3', id_shift=1, date_debut_abs=self.debut + timedelta(days=1), date_fin_abs=self.debut + timedelta(hours=20)
+        )
+
+    def test_instant_et_periode(self):
+        self.assertEqual(matricules_absents(self.debut + timedelta(hours=4)), {'C1'})
+        self.assertEqual(matricules_absents(self.debut + timedelta(hours=5)), set())
+        self.assertEqual(matricules_absents(self.debut, self.debut + timedelta(days=2)), {'C1', 'C3'})
+        self.assertEqual(matricules_absents(self.debut, self.debut + timedelta(days=2), matricules=['C3']), {'C3'})
+        # Période [debut, fin[ : une absence qui commence à la fin n'est pas comptée
+        self.assertEqual(matricules_absents(self.debut - timedelta(hours=1), self.debut), set())
+
+    def test_index_gist_utilise(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(
+                "EXPLAIN SELECT matricule FROM absences a WHERE periode_absence(a.date_debut_abs, a.date_fin_abs) @> %s::timestamptz",
+                [self.debut],
+            )
+            self.assertIn('absences_periode_gist', ''.join(ligne[0] for ligne in cursor.fetchall()))
+            # Colonnes TIMESTAMP sans fuseau des tables historiques : expression également indexable
+            cursor.execute('CREATE TEMPORARY TABLE absences_historiques (date_debut_abs TIMESTAMP, date_fin_abs TIMESTAMP)')
+            cursor.execute('CREATE INDEX ON absences_historiques USING gist (periode_absence(date_debut_abs, date_fin_abs))')
+
+    def test_pas_de_sous_charge_un_jour_absent(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO cumul_heures (matricule, heure_par_jour, date) VALUES ('C1', 1, %s), ('C4', 1, %s)", [self.debut.date()] * 2)
+        self.assertEqual(list(AlerteHeures.objects.values_list('matricule', flat=True)), ['C4'])
+
+        # Absence déclarée après coup : l'alerte existante est fermée
+        Absences.objects.create(matricule='C4', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=2))
+        self.assertFalse(AlerteHeures.objects.filter(date_fermeture__isnull=True).exists())
+
+
+@override_settings(EVENEMENTS={'LISTEN': False})
+class IndexAbsencesTest(TestCase):
+    """Chevauchements refusés à la création, vérifiés sur l'index en mémoire"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+
+    def setUp(self):
+        # Index du processus : les données des tests précédents ont été annulées
+        index_absences.invalider()
+        self.client = APIClient()
+        self.debut = timezone.now().replace(microsecond=0) + timedelta(days=3)
+        self.absence = Absences.objects.create(matricule='C1', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=8))
+
+    def test_intervalles(self):
+        t = self.debut
+        # Absence longue englobante : le maximum cumulé des fins la retrouve
+        intervalles = IntervallesMatricule([
+            (t, t + timedelta(days=10), 'declaree', 1),
+            (t + timedelta(days=1), t + timedelta(days=1, hours=2), 'declaree', 2),
+            (t + timedelta(days=20), t + timedelta(days=21), 'non_declaree', 3),
+        ])
+        self.assertTrue(intervalles.chevauche(t + timedelta(days=5), t + timedelta(days=6)))
+        self.assertEqual([a[3] for a in intervalles.conflits(t + timedelta(days=1, hours=1), t + timedelta(days=20))], [1, 2, 3])
+        self.assertFalse(intervalles.chevauche(t + timedelta(days=11), t + timedelta(days=19)))
+        self.assertEqual(intervalles.conflits(t - timedelta(days=2), t - timedelta(days=1)), [])
+
+    def test_creation_chevauchante_refusee(self):
+        donnees = {
+            'matricule': 'C1',
+            'date_debut_abs': (self.debut + timedelta(hours=6)).isoformat(),
+            'date_fin_abs': (self.debut + timedelta(days=1)).isoformat(),
+        }
+        for url in ('/api/absences-avancees/', '/api/absences/'):
+            reponse = self.client.post(url, donnees, format='json')
+            self.assertEqual(reponse.status_code, 400)
+            self.assertEqual(reponse.json()['conflits'][0]['id'], str(self.absence.id_absence))
+
+        # Une absence refusée n'occupe pas la période
+        Absences.objects.filter(pk=self.absence.pk).update(etat='refusée')
+        index_absences.invalider()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/absences-avancees/', donnees, format='json').status_code, 201)
+        # Écriture publiée sur le bus : la nouvelle absence est prise en compte sans rechargement complet
+        with self.assertNumQueries(1):
+            conflits = index_absences.conflits('C1', self.debut + timedelta(hours=7), self.debut + timedelta(hours=7))
+        self.assertEqual(len(conflits), 1)
+
+    def test_modification_et_lot(self):
+        # L'absence modifiée ne chevauche pas sa propre version précédente
+        reponse = self.client.patch(
+            f'/api/absences-avancees/{self.absence.pk}/', {'date_fin_abs': (self.debut + timedelta(hours=9)).isoformat()}, format='json'
+        )
+        self.assertEqual(reponse.status_code, 200)
+
+        lot = [
+            ('C1', self.debut + timedelta(hours=1), self.debut + timedelta(hours=2)),
+            ('C2', self.debut, self.debut + timedelta(hours=2)),
+            ('C2', self.debut + timedelta(hours=1), self.debut + timedelta(hours=3)),
+            ('C3', self.debut, self.debut + timedelta(hours=2)),
+        ]
+        conflits = index_absences.conflits_lot(lot)
+        self.assertEqual(sorted(conflits), [0, 2])
+        self.assertEqual(conflits[2][0][2:], ('lot', 1))
+
+    def test_reverification_en_base_a_l_ecriture(self):
+        # Index chargé, puis absence écrite par un autre processus dont la
+        # notification n'est pas encore arrivée
+        index_absences.conflits('C2', self.debut, self.debut)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO absences (matricule, date_debut_abs, date_fin_abs, etat) VALUES (%s, %s, %s, 'en attente')",
+                ['C2', self.debut, self.debut + timedelta(hours=4)]
+            )
+        self.assertEqual(index_absences.conflits('C2', self.debut, self.debut), [])
+
+        donnees = {
+            'matricule': 'C2',
+            'date_debut_abs': (self.debut + timedelta(hours=1)).isoformat(),
+            'date_fin_abs': (self.debut + timedelta(hours=2)).isoformat(),
+        }
+        for url in ('/api/absences/', '/api/absences-avancees/'):
+            reponse = self.client.post(url, donnees, format='json')
+            self.assertEqual(reponse.status_code, 400)
+            self.assertEqual(reponse.json()['conflits'][0]['source'], 'declaree')
+        self.assertEqual(Absences.objects.filter(matricule='C2').count(), 1)
+
+        # Modification qui crée le chevauchement : même réponse
+        reponse = self.client.patch(f'/api/absences-avancees/{self.absence.id_absence}/', {
+            'matricule': 'C2', 'date_debut_abs': donnees['date_debut_abs'], 'date_fin_abs': donnees['date_fin_abs'],
+        }, format='json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('conflits', reponse.json())
+
+    @override_settings(EVENEMENTS={'LISTEN': True})
+    def test_index_mis_a_jour_au_commit_sans_attendre_le_notify(self):
+        with mock.patch('manutention.index_absences.connexion_ecoute', return_value=('ecouteur', 1)), \
+                mock.patch('manutention.evenements.demarrer_ecoute'):
+            index_absences.conflits('C2', self.debut, self.debut)
+            with self.captureOnCommitCallbacks(execute=True):
+                Absences.objects.create(matricule='C2', date_debut_abs=self.debut, date_fin_abs=self.debut + timedelta(hours=1))
+            self.assertEqual(len(index_absences.conflits('C2', self.debut, self.debut)), 1)
+
+    def test_hors_fenetre(self):
+        debut = self.debut + timedelta(days=800)
+        Absences.objects.create(matricule='C1', date_debut_abs=debut, date_fin_abs=debut + timedelta(hours=1))
+        self.assertEqual(len(index_absences.conflits('C1', debut, debut + timedelta(minutes=5))), 1)
+
+
+@override_settings(EVENEMENTS={'LISTEN': False})
+class ImportAbsencesTest(TestCase):
+    """POST /api/absences/bulk/ : COPY dans une table temporaire puis fusion"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe, Absences)
+        creer_table_cumul_heures()
+        for matricule in ('C1', 'C2', 'C3'):
+            InfoEquipe.objects.create(matricule=matricule, nom=matricule, prenom='P', fonction='conducteur')
+
+    def setUp(self):
+        index_absences.invalider()
+        self.client = APIClient()
+        self.jour = (timezone.now() + timedelta(days=10)).date()
+        debut = timezone.make_aware(datetime.combine(self.jour, datetime.min.time())) + timedelta(hours=8)
+        Absences.objects.create(matricule='C3', date_debut_abs=debut, date_fin_abs=debut + timedelta(hours=4))
+
+    def test_import_csv(self):
+        j = self.jour.strftime('%d/%m/%Y')
+        lendemain = (self.jour + timedelta(days=1)).isoformat()
+        contenu = '\n'.join([
+            'matricule;debut;fin;etat',
+            f'C1;{j} 08:00;{j} 12:00;',
+            'X9;2025-01-01;2025-01-02;',
+            f'C2;31/02/2025;{j};',
+            f'C3;{j} 10:00;{j} 11:00;',
+            f'C1;{j} 11:00;{j} 18:00;',
+            f'C3;{j} 09:00;{j} 10:00;refusée',
+            f'C2;{lendemain};{lendemain};validée',
+        ])
+        fichier = SimpleUploadedFile('absences.csv', contenu.encode('utf-8'), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post('/api/absences/bulk/', {'fichier': fichier}, format='multipart')
+        self.assertEqual(reponse.status_code, 201)
+        rapport = reponse.json()
+        self.assertEqual((rapport['lignes'], rapport['importees'], rapport['rejetees']), (7, 3, 4))
+        erreurs = {erreur['ligne']: erreur['erreurs'] for erreur in rapport['erreurs']}
+        self.assertEqual(sorted(erreurs), [2, 3, 4, 5])
+        self.assertIn('matricule inconnu : X9', erreurs[2])
+        self.assertTrue(erreurs[3][0].startswith('date_debut_abs : date invalide'))
+        self.assertIn('existante', erreurs[4][0])
+        self.assertEqual(erreurs[5], ['chevauche la ligne 1 du fichier'])
+
+        # Date seule : journée entière
+        absence = Absences.objects.get(matricule='C2')
+        self.assertEqual(timezone.localtime(absence.date_fin_abs).time(), datetime.strptime('23:59:59', '%H:%M:%S').time())
+        # Absences importées visibles de l'index sans rechargement complet
+        self.assertEqual(len(index_absences.conflits('C1', absence.date_debut_abs - timedelta(days=1), absence.date_debut_abs)), 1)
+
+    @override_settings(EVENEMENTS={'LISTEN': True})
+    def test_import_volumineux_notifie_apres_commit(self):
+        matricules = [f'CONDUCTEUR{numero:04d}' for numero in range(900)]
+        InfoEquipe.objects.bulk_create([
+            InfoEquipe(matricule=matricule, nom=matricule, prenom='P', fonction='conducteur') for matricule in matricules
+        ])
+        self.assertGreater(len(json.dumps(matricules)), 8000)
+        debut = timezone.make_aware(datetime.combine(self.jour, datetime.min.time()))
+        absences = [
+            {'matricule': matricule, 'date_debut_abs': debut.isoformat(), 'date_fin_abs': (debut + timedelta(hours=2)).isoformat()}
+            for matricule in matricules
+        ]
+        notifications = []
+        notifier = evenements._notifier
+        with mock.patch('manutention.evenements.demarrer_ecoute'), \
+                mock.patch('manutention.evenements._notifier', side_effect=lambda charge: notifications.append(charge) or notifier(charge)):
+            with self.captureOnCommitCallbacks(execute=True) as rappels:
+                reponse = self.client.post('/api/absences/bulk/', absences, format='json')
+                # Rien n'est notifié avant le commit
+                self.assertEqual(notifications, [])
+        self.assertEqual((reponse.status_code, reponse.json()['importees']), (201, 900))
+        self.assertGreater(len(rappels), 0)
+        charges = [json.loads(charge) for charge in notifications]
+        self.assertEqual({(c['canal'], c['type']) for c in charges}, {('presence', 'recalcul'), ('absences', 'ecriture')})
+        self.assertTrue(all(c['donnees']['volumineux'] and 'matricules' not in c['donnees'] for c in charges))
+        self.assertTrue(all(len(charge.encode()) < 8000 for charge in notifications))
+
+    def test_json_strict(self):
+        debut = timezone.make_aware(datetime.combine(self.jour, datetime.min.time()))
+        absences = [
+            {'matricule': 'C1', 'date_debut_abs': debut.isoformat(), 'date_fin_abs': (debut + timedelta(hours=2)).isoformat()},
+            {'matricule': 'C2', 'date_debut_abs': debut.isoformat(), 'date_fin_abs': (debut - timedelta(hours=2)).isoformat()},
+        ]
+        reponse = self.client.post('/api/absences/bulk/?strict=1', {'absences': absences}, format='json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(reponse.json()['erreurs'], [{'ligne': 2, 'erreurs': ['date_fin_abs antérieure à date_debut_abs']}])
+        self.assertFalse(Absences.objects.filter(matricule='C1').exists())
+
+        reponse = self.client.post('/api/absences/bulk/', absences[:1], format='json')
+        self.assertEqual((reponse.status_code, reponse.json()['importees']), (201, 1))
+        self.assertEqual(self.client.post('/api/absences/bulk/', {'absences': 'C1'}, format='json').status_code, 400)
+
+
+class ImportPersonnelTest(TestCase):
+    """POST /api/personnel/bulk/ : équipes validées en une requête, ON CONFLICT (matricule)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creer_tables_non_gerees(Equipe, InfoEquipe)
+        Equipe.objects.create(id_equipe='E1')
+        InfoEquipe.objects.create(matricule='C1', nom='Ancien', prenom='P', fonction='conducteur')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.personnel = [
+            {'matricule': 'C2', 'nom': 'Nouveau', 'prenom': 'P', 'equipe': 'E1', 'date_embauche': '01/09/2025'},
+            {'matricule': 'D1', 'nom': 'Docker', 'prenom': 'P', 'fonction': 'docker', 'id_equipe': 'E9'},
+            {'matricule': 'C1', 'nom': 'Modifié', 'prenom': 'P'},
+            {'matricule': 'C2', 'nom': 'Doublon', 'prenom': 'P'},
+            {'matricule': 'C3', 'prenom': 'P', 'disponibilite': 'absent'},
+        ]
+
+    def test_import_json(self):
+        with self.assertNumQueries(2):
+            reponse = self.client.post('/api/personnel/bulk/?fonction=conducteur', self.personnel, format='json')
+        self.assertEqual(reponse.status_code, 201)
+        rapport = reponse.json()
+        self.assertEqual((rapport['inseres'], rapport['mis_a_jour'], rapport['existants'], rapport['rejetees']), (1, 0, ['C1'], 3))
+        erreurs = {erreur['ligne']: erreur['erreurs'] for erreur in rapport['erreurs']}
+        self.assertEqual(erreurs[2], ['équipe inconnue : E9'])
+        self.assertEqual(erreurs[4], ['matricule C2 déjà présent ligne 1'])
+        self.assertEqual(len(erreurs[5]), 2)
+
+        employe = InfoEquipe.objects.get(matricule='C2')
+        self.assertEqual((employe.fonction, employe.id_equipe_id, employe.date_embauche.isoformat()), ('conducteur', 'E1', '2025-09-01'))
+        self.assertEqual(InfoEquipe.objects.get(matricule='C1').nom, 'Ancien')
+
+        reponse = self.client.post('/api/personnel/bulk/?fonction=conducteur&mise_a_jour=1', {'personnel': self.personnel[2:3]}, format='json')
+        self.assertEqual((reponse.status_code, reponse.json()['mis_a_jour']), (201, 1))
+        self.assertEqual(InfoEquipe.objects.get(matricule='C1').nom, 'Modifié')
+
+    def test_gros_import_en_tache_de_fond(self):
+        contenu = 'matricule,nom,prenom,fonction\n' + '\n'.join(f'D{i},Docker,P,docker' for i in range(10, 14))
+        fichier = SimpleUploadedFile('personnel.csv', contenu.encode('utf-8'), content_type='text/csv')
+        with mock.patch('manutention.views.SEUIL_JOB_PERSONNEL', 3):
+            reponse = self.client.post('/api/personnel/bulk/', {'fichier': fichier}, format='multipart')
+            self.assertEqual(reponse.status_code, 202)
+            # Un seul import actif à la fois
+            self.assertEqual(self.client.post('/api/personnel/bulk/', [{'matricule': 'X'}] * 4, format='json').status_code, 409)
+        job = Job.objects.get(pk=reponse.json()['job']['id'])
+        self.assertEqual((job.type_job, len(job.parametres['lignes'])), ('import_personnel', 4))
+
+        rapport = REGISTRE_TACHES[job.type_job](job, **job.parametres)
+        self.assertEqual(rapport['inseres'], 4)
+        self.assertEqual(InfoEquipe.objects.filter(fonction='docker').count(), 4)
@@ -10,17 +10,20 @@ from .views import (
     AbsencesViewSet, AbsencesNonDeclareesViewSet, MaintenanceViewSet, IncidentsViewSet,
     UtilisateursViewSet, ChefEscaleViewSet, SuperviseursViewSet, HistoriqueAffectationsViewSet,
     NotificationsViewSet, RapportsViewSet, ParametresViewSet, LogsViewSet, NavirePrevisionnelViewSet,
+    JobViewSet,
     # Fonctions API
     matricules_list, equipe_list, equipe_membres, cumul_conducteurs, cumul_dockers, 
     cumul_heures_dump, ajouter_conducteur_cumul, supprimer_conducteur_cumul, 
-    conducteurs_info_equipe, conducteurs_liste, dockers_liste, ajouter_docker, 
-    supprimer_docker, stats_conducteurs_presence, stats_dockers_presence, 
-    alertes_conducteurs, alertes_dockers, cumul_dockers_dump, cumul_conducteurs_dump,
+    conducteurs_info_equipe, conducteurs_liste, dockers_liste, ajouter_docker, importer_personnel_bulk, 
+    supprimer_docker, stats_presence, stats_presence_historique, stats_conducteurs_presence, stats_dockers_presence, 
+    alertes_conducteurs, alertes_dockers, alertes_historique, cumul_dockers_dump, cumul_conducteurs_dump,
     qualifications_conducteurs, modifier_qualification_conducteur, limites_alertes,
     chef_escale_liste, chef_escale_ajouter, chef_escale_modifier, chef_escale_stats,
+    chef_escale_quota_consommer, chef_escale_quota_rembourser, chef_escale_quota_historique,
     absences_non_declarees_completes
 )
 from . import auth_views
+from .flux import flux_engins, flux_rh
 
 # Router principal
 router = DefaultRouter()
@@ -57,6 +60,7 @@ router.register(r'rapports', RapportsViewSet)
 router.register(r'parametres', ParametresViewSet)
 router.register(r'logs', LogsViewSet)
 router.register(r'navires-previsionnels', NavirePrevisionnelViewSet)
+router.register(r'jobs', JobViewSet)
 
 # URLs d'authentification
 auth_urlpatterns = [
@@ -90,19 +94,32 @@ urlpatterns = [
     path('dockers/liste/', dockers_liste, name='dockers-liste'),
     path('dockers/ajouter/', ajouter_docker, name='ajouter-docker'),
     path('dockers/supprimer/<str:matricule>/', supprimer_docker, name='supprimer-docker'),
+
+    # Import en masse du personnel (conducteurs et dockers)
+    path('personnel/bulk/', importer_personnel_bulk, name='importer-personnel-bulk'),
     
     # Statistiques et alertes
+    path('stats/presence/', stats_presence, name='stats-presence'),
+    path('stats/presence/historique/', stats_presence_historique, name='stats-presence-historique'),
     path('stats/conducteurs/presence/', stats_conducteurs_presence, name='stats-conducteurs-presence'),
     path('stats/dockers/presence/', stats_dockers_presence, name='stats-dockers-presence'),
     path('alertes/conducteurs/', alertes_conducteurs, name='alertes-conducteurs'),
     path('alertes/dockers/', alertes_dockers, name='alertes-dockers'),
+    path('alertes/historique/', alertes_historique, name='alertes-historique'),
     path('limites/alertes/', limites_alertes, name='limites-alertes'),
+
+    # Flux temps réel (SSE, serveur ASGI)
+    path('flux/rh/', flux_rh, name='flux-rh'),
+    path('flux/engins/', flux_engins, name='flux-engins'),
     
     # Gestion des chefs d'escale
     path('chef-escale/liste/', chef_escale_liste, name='chef-escale-liste'),
     path('chef-escale/ajouter/', chef_escale_ajouter, name='chef-escale-ajouter'),
     path('chef-escale/modifier/<str:id_chef_escale>/', chef_escale_modifier, name='chef-escale-modifier'),
     path('chef-escale/stats/', chef_escale_stats, name='chef-escale-stats'),
+    path('chef-escale/<str:id_chef_escale>/quota/consommer/', chef_escale_quota_consommer, name='chef-escale-quota-consommer'),
+    path('chef-escale/<str:id_chef_escale>/quota/rembourser/', chef_escale_quota_rembourser, name='chef-escale-quota-rembourser'),
+    path('chef-escale/<str:id_chef_escale>/quota/historique/', chef_escale_quota_historique, name='chef-escale-quota-historique'),
     
     # Absences non déclarées
     path('absences-non-declarees-completes/', absences_non_declarees_completes, name='absences-non-declarees-completes'),
@@ -1,20 +1,26 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, action, renderer_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from django.db import connection
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from django.db import connection, transaction
 from datetime import datetime
 import os
-import threading
 import time
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotModified, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Q, Count, Sum, Avg, Max, Value, Subquery, FloatField
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, parse_http_date_safe
 from datetime import timedelta
 import json
 import requests
@@ -27,20 +33,40 @@ from .models import (
     Engins, Affectations, EnginsAffectees, QualificationsConducteurs, CumulHeures,
     Equipe, InfoEquipe, Conducteurs, Dockers, AbsencesNonDeclarees, Maintenance,
     Incidents, Utilisateurs, Superviseurs, HistoriqueAffectations, Notifications,
-    Rapports, Parametres, Logs, NavirePrevisionnel
+    Rapports, Parametres, Logs, NavirePrevisionnel, Job, ConsommationQuota
 )
 
 from .serializers import (
     ConducteurSerializer, AffectationSerializer, AbsencesSerializer, ShiftsSerializer,
-    AbsenceNonDeclareeSerializer, ChefEscaleSerializer, EnginsSerializer,
+    AbsenceNonDeclareeSerializer, ChefEscaleSerializer, EnginsSerializer, EnginDetailSerializer,
     AffectationsSerializer, EnginsAffecteesSerializer, QualificationsConducteursSerializer,
     CumulHeuresSerializer, EquipeSerializer, InfoEquipeSerializer, ConducteursSerializer,
     DockersSerializer, AbsencesNonDeclareesSerializer, MaintenanceSerializer,
     IncidentsSerializer, UtilisateursSerializer, SuperviseursSerializer,
     HistoriqueAffectationsSerializer, NotificationsSerializer, RapportsSerializer,
-    ParametresSerializer, LogsSerializer, NavirePrevisionnelSerializer
+    ParametresSerializer, LogsSerializer, NavirePrevisionnelSerializer, JobSerializer
 )
 
+from .affectation_auto import affecter_shift
+from .alertes import (
+    LIMITE_MAX_DEFAUT, LIMITE_MIN_DEFAUT, lire_alertes_actives, lire_historique_alertes, lire_limites_alertes,
+)
+from .caching import cache_endpoint, invalider
+from .detection_absences import lire_absences_non_declarees
+from .exports import FORMATS_EXPORT, RENDERERS_EXPORT, reponse_export_streaming
+from .imports import SEUIL_JOB_PERSONNEL, ImportInvalide, importer_absences, importer_personnel, lire_fichier, lire_json
+from .jobs import soumettre_job
+from .navires_csv import CSV_NAVIRES, etag_fichier, lire_csv_navires
+from .pagination import KeysetPagination
+from .presence import JOURS_HISTORIQUE_MAX, lire_historique_presence, lire_stats_presence, supprimer_presence
+from .quotas import (
+    QUOTA_AFF_MANUELLE, QuotaComplet, QuotaEpuise, ajuster_quota, consommer_affectation_manuelle,
+    rembourser_affectation_manuelle, valider_quota,
+)
+
+# Les dumps acceptent ?format=ndjson|csv en plus des renderers par défaut
+RENDERERS_DUMP = list(api_settings.DEFAULT_RENDERER_CLASSES) + RENDERERS_EXPORT
+
 # Create your views here.
 
 class ConducteurViewSet(viewsets.ModelViewSet):
@@ -52,11 +78,15 @@ class AffectationViewSet(viewsets.ModelViewSet):
     queryset = Affectation.objects.all()
     serializer_class = AffectationSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-date', '-heure_debut')
 
 class AbsenceViewSet(viewsets.ModelViewSet):
     queryset = Absences.objects.all()
     serializer_class = AbsencesSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_debut_abs'
 
     def partial_update(self, request, *args, **kwargs):
         try:
@@ -71,15 +101,43 @@ class AbsenceViewSet(viewsets.ModelViewSet):
             traceback.print_exc()
             raise
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Import en masse des absences
+        - fichier CSV, XLSX ou JSON dans le champ « fichier » (multipart)
+        - ou corps JSON : liste d'absences ou {"absences": [...]}
+        - ?strict=1 : rien n'est importé si une ligne est rejetée
+        """
+        strict = request.query_params.get('strict', '').lower() in ('1', 'true', 'oui')
+        try:
+            fichier = request.FILES.get('fichier')
+            if fichier is not None:
+                lignes = lire_fichier(fichier.read(), fichier.name)
+            else:
+                lignes = lire_json(request.data)
+            rapport = importer_absences(lignes, strict=strict)
+        except ImportInvalide as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+        if rapport['importees']:
+            return Response(rapport, status=201)
+        return Response(rapport, status=400 if rapport['erreurs'] else 200)
+
 class ShiftsViewSet(viewsets.ModelViewSet):
     queryset = Shifts.objects.all()
     serializer_class = ShiftsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_debut_shift'
 
 class AbsenceNonDeclareeViewSet(viewsets.ModelViewSet):
     queryset = AbsenceNonDeclaree.objects.all()
     serializer_class = AbsenceNonDeclareeSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_debut_abs'
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -120,6 +178,7 @@ def absences_non_declarees_completes(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_endpoint('absences')
 def matricules_list(request):
     with connection.cursor() as cursor:
         cursor.execute('SELECT DISTINCT matricule FROM "absences"')
@@ -131,6 +190,7 @@ def matricules_list(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_endpoint('equipe')
 def equipe_list(request):
     with connection.cursor() as cursor:
         cursor.execute('SELECT DISTINCT id_equipe FROM equipe')
@@ -205,30 +265,43 @@ def cumul_dockers(request):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def cumul_heures_dump(request):
-    """Récupère tous les cumuls d'heures avec les informations de la table INFO_EQUIPE"""
+SQL_CUMUL_DUMP = '''
+    SELECT 
+        ch.id_cumul_heures,
+        ch.matricule,
+        ch.code_engin,
+        ch.heure_par_jour,
+        ch.date,
+        ie.nom,
+        ie.prenom,
+        ie.fonction,
+        ie.email,
+        ie.phone_number,
+        ie.date_embauche,
+        ie.disponibilité
+    FROM cumul_heures ch
+    LEFT JOIN info_equipe ie ON ch.matricule = ie.matricule
+    {filtre}
+    ORDER BY ch.matricule ASC, ch.date DESC
+'''
+
+def _cumul_dump(request, fonction=None):
+    """
+    Dump des cumuls d'heures joints à INFO_EQUIPE, éventuellement filtré par fonction.
+    ?format=ndjson|csv : export en streaming via un curseur serveur (mémoire constante)
+    """
+    sql = SQL_CUMUL_DUMP.format(filtre='WHERE ie.fonction = %s' if fonction else '')
+    params = [fonction] if fonction else []
     try:
+        format_export = request.query_params.get('format')
+        if format_export in FORMATS_EXPORT:
+            nom_fichier = f'cumul_heures_{fonction}s' if fonction else 'cumul_heures'
+            return reponse_export_streaming(
+                sql, params, format_export, nom_fichier, asynchrone=isinstance(request._request, ASGIRequest)
+            )
+
         with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    ch.id_cumul_heures,
-                    ch.matricule,
-                    ch.code_engin,
-                    ch.heure_par_jour,
-                    ch.date,
-                    ie.nom,
-                    ie.prenom,
-                    ie.fonction,
-                    ie.email,
-                    ie.phone_number,
-                    ie.date_embauche,
-                    ie.disponibilité
-                FROM cumul_heures ch
-                LEFT JOIN info_equipe ie ON ch.matricule = ie.matricule
-                ORDER BY ch.matricule ASC, ch.date DESC
-            ''')
+            cursor.execute(sql, params)
             columns = [col[0] for col in cursor.description]
             rows = cursor.fetchall()
         data = [
@@ -239,6 +312,13 @@ def cumul_heures_dump(request):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes(RENDERERS_DUMP)
+def cumul_heures_dump(request):
+    """Récupère tous les cumuls d'heures avec les informations de la table INFO_EQUIPE"""
+    return _cumul_dump(request)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def ajouter_conducteur_cumul(request):
@@ -285,6 +365,7 @@ def ajouter_conducteur_cumul(request):
             ''', [id_equipe, matricule, fonction, nom, prenom, email, phone_number, date_embauche, disponibilite])
             
             id_info_equipe = cursor.fetchone()[0]
+        invalider('info_equipe')
             
         return Response({
             'success': True,
@@ -338,6 +419,8 @@ def supprimer_conducteur_cumul(request, matricule):
                 DELETE FROM info_equipe 
                 WHERE matricule = %s AND fonction = 'conducteur'
             ''', [matricule])
+        supprimer_presence(matricule)
+        invalider('absences', 'info_equipe')
             
         return Response({
             'success': True,
@@ -504,6 +587,7 @@ def ajouter_docker(request):
                 data['date_embauche'],
                 data.get('disponibilite', 'disponible')  # Valeurs autorisées: 'en service', 'en repos', 'disponible', 'non disponible'
             ])
+        invalider('info_equipe')
             
         return Response({
             'success': True,
@@ -551,6 +635,8 @@ def supprimer_docker(request, matricule):
                 DELETE FROM info_equipe 
                 WHERE matricule = %s AND fonction = 'docker'
             ''', [matricule])
+        supprimer_presence(matricule)
+        invalider('absences', 'info_equipe')
             
         return Response({
             'success': True,
@@ -562,44 +648,109 @@ def supprimer_docker(request, matricule):
             'error': f'Erreur lors de la suppression: {str(e)}'
         }, status=500)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def importer_personnel_bulk(request):
+    """
+    Import en masse de conducteurs et dockers dans INFO_EQUIPE
+    - fichier CSV, XLSX ou JSON dans le champ « fichier » (multipart)
+    - ou corps JSON : liste d'employés ou {"personnel": [...]}
+    - ?fonction=conducteur|docker : fonction des lignes qui n'en précisent pas
+    - ?mise_a_jour=1 : met à jour les matricules existants au lieu de les ignorer
+    - ?strict=1 : rien n'est importé si une ligne est rejetée
+    Au-delà de SEUIL_JOB_PERSONNEL lignes, l'import est exécuté en tâche de fond (202)
+    """
+    options = {
+        'fonction_defaut': request.query_params.get('fonction', ''),
+        'mise_a_jour': request.query_params.get('mise_a_jour', '').lower() in ('1', 'true', 'oui'),
+        'strict': request.query_params.get('strict', '').lower() in ('1', 'true', 'oui'),
+    }
+    try:
+        fichier = request.FILES.get('fichier')
+        if fichier is not None:
+            lignes = lire_fichier(fichier.read(), fichier.name, cle='personnel')
+        else:
+            lignes = lire_json(request.data, cle='personnel')
+
+        if len(lignes) > SEUIL_JOB_PERSONNEL:
+            # Paramètres du job en JSON : dates des cellules XLSX en ISO
+            lignes = [
+                {cle: valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur for cle, valeur in ligne.items()}
+                for ligne in lignes
+            ]
+            job, cree = soumettre_job('import_personnel', {'lignes': lignes, **options})
+            if not cree:
+                return Response({
+                    'error': 'Un import du personnel est déjà en cours, réessayez à sa fin.',
+                    'job': JobSerializer(job).data,
+                }, status=409)
+            return Response({
+                'message': f'{len(lignes)} lignes : import lancé en arrière-plan.',
+                'job': JobSerializer(job).data,
+                'statut_url': reverse('job-detail', args=[job.id], request=request),
+            }, status=status.HTTP_202_ACCEPTED)
+
+        rapport = importer_personnel(lignes, **options)
+    except ImportInvalide as e:
+        return Response({'error': str(e)}, status=400)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+    if rapport['inseres'] or rapport['mis_a_jour']:
+        return Response(rapport, status=201)
+    return Response(rapport, status=400 if rapport['erreurs'] else 200)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def stats_presence(request):
+    """
+    Statistiques de présence/absence du personnel
+    - ?fonction=conducteur|docker : restreint à une fonction (tout le personnel sinon)
+    - ?date=YYYY-MM-DD : journée concernée (aujourd'hui par défaut)
+    - ?details=1 : ajoute le statut de chaque employé
+    """
+    try:
+        jour = timezone.localdate()
+        if request.query_params.get('date'):
+            jour = parse_date(request.query_params['date'])
+            if jour is None:
+                return Response({'error': 'Paramètre date invalide (format YYYY-MM-DD)'}, status=400)
+        details = request.query_params.get('details') in ('1', 'true')
+        return Response(lire_stats_presence(jour, request.query_params.get('fonction'), details))
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def stats_presence_historique(request):
+    """
+    Présents/absents par jour, lus dans la table presence_journaliere
+    - ?debut=YYYY-MM-DD&fin=YYYY-MM-DD (30 derniers jours par défaut)
+    - ?fonction=conducteur|docker
+    """
+    try:
+        fin = timezone.localdate()
+        debut = fin - timedelta(days=29)
+        for param in ('debut', 'fin'):
+            if request.query_params.get(param):
+                valeur = parse_date(request.query_params[param])
+                if valeur is None:
+                    return Response({'error': f'Paramètre {param} invalide (format YYYY-MM-DD)'}, status=400)
+                if param == 'debut':
+                    debut = valeur
+                else:
+                    fin = valeur
+        if debut > fin or (fin - debut).days >= JOURS_HISTORIQUE_MAX:
+            return Response({'error': f'Période invalide (au plus {JOURS_HISTORIQUE_MAX} jours)'}, status=400)
+        return Response(lire_historique_presence(debut, fin, request.query_params.get('fonction')))
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def stats_conducteurs_presence(request):
     """Récupère les statistiques de présence/absence des conducteurs pour aujourd'hui"""
     try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    ie.matricule,
-                    ie.nom,
-                    ie.prenom,
-                    ie.fonction,
-                    CASE 
-                        WHEN a.date_debut_abs IS NOT NULL AND CURRENT_DATE BETWEEN DATE(a.date_debut_abs) AND DATE(a.date_fin_abs) THEN 'absent'
-                        ELSE 'present'
-                    END as statut
-                FROM info_equipe ie
-                LEFT JOIN absences a ON ie.matricule = a.matricule AND CURRENT_DATE BETWEEN DATE(a.date_debut_abs) AND DATE(a.date_fin_abs)
-                WHERE ie.fonction = 'conducteur'
-                ORDER BY ie.matricule ASC
-            ''')
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-        data = [
-            {col: (val.isoformat() if hasattr(val, 'isoformat') else val) for col, val in zip(columns, row)}
-            for row in rows
-        ]
-        
-        # Compter les présents et absents
-        presents = len([row for row in data if row['statut'] == 'present'])
-        absents = len([row for row in data if row['statut'] == 'absent'])
-        
-        return Response({
-            'presents': presents,
-            'absents': absents,
-            'total': len(data),
-            'details': data
-        })
+        return Response(lire_stats_presence(timezone.localdate(), 'conducteur', details=True))
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
@@ -608,213 +759,75 @@ def stats_conducteurs_presence(request):
 def stats_dockers_presence(request):
     """Récupère les statistiques de présence/absence des dockers pour aujourd'hui"""
     try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    ie.matricule,
-                    ie.nom,
-                    ie.prenom,
-                    ie.fonction,
-                    CASE 
-                        WHEN a.date_debut_abs IS NOT NULL AND CURRENT_DATE BETWEEN DATE(a.date_debut_abs) AND DATE(a.date_fin_abs) THEN 'absent'
-                        ELSE 'present'
-                    END as statut
-                FROM info_equipe ie
-                LEFT JOIN absences a ON ie.matricule = a.matricule AND CURRENT_DATE BETWEEN DATE(a.date_debut_abs) AND DATE(a.date_fin_abs)
-                WHERE ie.fonction = 'docker'
-                ORDER BY ie.matricule ASC
-            ''')
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-        data = [
-            {col: (val.isoformat() if hasattr(val, 'isoformat') else val) for col, val in zip(columns, row)}
-            for row in rows
-        ]
-        
-        # Compter les présents et absents
-        presents = len([row for row in data if row['statut'] == 'present'])
-        absents = len([row for row in data if row['statut'] == 'absent'])
-        
-        return Response({
-            'presents': presents,
-            'absents': absents,
-            'total': len(data),
-            'details': data
-        })
+        return Response(lire_stats_presence(timezone.localdate(), 'docker', details=True))
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def alertes_conducteurs(request):
-    """Récupère les alertes pour les conducteurs (heures > 8 ou < 2)"""
+def _alertes_du_jour(request, fonction):
+    """Alertes actives lues dans alertes_heures (?date=YYYY-MM-DD, aujourd'hui par défaut)"""
     try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    ch.matricule,
-                    ch.heure_par_jour,
-                    ch.date,
-                    ie.nom,
-                    ie.prenom,
-                    ie.fonction,
-                    CASE 
-                        WHEN ch.heure_par_jour > 8 THEN 'excess'
-                        WHEN ch.heure_par_jour < 2 THEN 'lack'
-                        ELSE NULL
-                    END as type_alerte
-                FROM cumul_heures ch
-                LEFT JOIN info_equipe ie ON ch.matricule = ie.matricule
-                WHERE ie.fonction = 'conducteur'
-                AND (ch.heure_par_jour > 8 OR ch.heure_par_jour < 2)
-                AND ch.date = CURRENT_DATE
-                ORDER BY ch.matricule ASC
-            ''')
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-        data = [
-            {col: (val.isoformat() if hasattr(val, 'isoformat') else val) for col, val in zip(columns, row)}
-            for row in rows
-        ]
-        
-        # Formater les données pour le frontend
-        alertes = []
-        for row in data:
-            if row['type_alerte']:
-                message = f"Surcharge: {row['heure_par_jour']}h/jour" if row['type_alerte'] == 'excess' else f"Sous-charge: {row['heure_par_jour']}h/jour"
-                alertes.append({
-                    'matricule': row['matricule'],
-                    'nom': row['nom'],
-                    'prenom': row['prenom'],
-                    'heure_par_jour': row['heure_par_jour'],
-                    'type_alerte': row['type_alerte'],
-                    'message': message
-                })
-        
-        return Response({'alertes': alertes})
+        jour = timezone.localdate()
+        if request.query_params.get('date'):
+            jour = parse_date(request.query_params['date'])
+            if jour is None:
+                return Response({'error': 'Paramètre date invalide (format YYYY-MM-DD)'}, status=400)
+        return Response({'alertes': lire_alertes_actives(jour, fonction)})
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def alertes_conducteurs(request):
+    """Récupère les alertes actives des conducteurs (heures hors des limites configurées)"""
+    return _alertes_du_jour(request, 'conducteur')
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def alertes_dockers(request):
-    """Récupère les alertes pour les dockers (heures > 8 ou < 2)"""
+    """Récupère les alertes actives des dockers (heures hors des limites configurées)"""
+    return _alertes_du_jour(request, 'docker')
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def alertes_historique(request):
+    """
+    Historique des alertes d'heures, actives et fermées
+    - ?debut=YYYY-MM-DD&fin=YYYY-MM-DD (30 derniers jours par défaut)
+    - ?fonction=conducteur|docker, ?matricule=
+    """
     try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    ch.matricule,
-                    ch.heure_par_jour,
-                    ch.date,
-                    ie.nom,
-                    ie.prenom,
-                    ie.fonction,
-                    CASE 
-                        WHEN ch.heure_par_jour > 8 THEN 'excess'
-                        WHEN ch.heure_par_jour < 2 THEN 'lack'
-                        ELSE NULL
-                    END as type_alerte
-                FROM cumul_heures ch
-                LEFT JOIN info_equipe ie ON ch.matricule = ie.matricule
-                WHERE ie.fonction = 'docker'
-                AND (ch.heure_par_jour > 8 OR ch.heure_par_jour < 2)
-                AND ch.date = CURRENT_DATE
-                ORDER BY ch.matricule ASC
-            ''')
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-        data = [
-            {col: (val.isoformat() if hasattr(val, 'isoformat') else val) for col, val in zip(columns, row)}
-            for row in rows
-        ]
-        
-        # Formater les données pour le frontend
-        alertes = []
-        for row in data:
-            if row['type_alerte']:
-                message = f"Surcharge: {row['heure_par_jour']}h/jour" if row['type_alerte'] == 'excess' else f"Sous-charge: {row['heure_par_jour']}h/jour"
-                alertes.append({
-                    'matricule': row['matricule'],
-                    'nom': row['nom'],
-                    'prenom': row['prenom'],
-                    'heure_par_jour': row['heure_par_jour'],
-                    'type_alerte': row['type_alerte'],
-                    'message': message
-                })
-        
-        return Response({'alertes': alertes})
+        fin = timezone.localdate()
+        debut = fin - timedelta(days=29)
+        for param in ('debut', 'fin'):
+            if request.query_params.get(param):
+                valeur = parse_date(request.query_params[param])
+                if valeur is None:
+                    return Response({'error': f'Paramètre {param} invalide (format YYYY-MM-DD)'}, status=400)
+                if param == 'debut':
+                    debut = valeur
+                else:
+                    fin = valeur
+        if debut > fin or (fin - debut).days >= JOURS_HISTORIQUE_MAX:
+            return Response({'error': f'Période invalide (au plus {JOURS_HISTORIQUE_MAX} jours)'}, status=400)
+        return Response({'alertes': lire_historique_alertes(
+            debut, fin, request.query_params.get('fonction'), request.query_params.get('matricule')
+        )})
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(RENDERERS_DUMP)
 def cumul_dockers_dump(request):
     """Récupère les cumuls d'heures des dockers avec les informations de la table INFO_EQUIPE"""
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    ch.id_cumul_heures,
-                    ch.matricule,
-                    ch.code_engin,
-                    ch.heure_par_jour,
-                    ch.date,
-                    ie.nom,
-                    ie.prenom,
-                    ie.fonction,
-                    ie.email,
-                    ie.phone_number,
-                    ie.date_embauche,
-                    ie.disponibilité
-                FROM cumul_heures ch
-                LEFT JOIN info_equipe ie ON ch.matricule = ie.matricule
-                WHERE ie.fonction = 'docker'
-                ORDER BY ch.matricule ASC, ch.date DESC
-            ''')
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-        data = [
-            {col: (val.isoformat() if hasattr(val, 'isoformat') else val) for col, val in zip(columns, row)}
-            for row in rows
-        ]
-        return Response(data)
-    except Exception as e:
-        return Response({'error': str(e)}, status=500)
+    return _cumul_dump(request, fonction='docker')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(RENDERERS_DUMP)
 def cumul_conducteurs_dump(request):
     """Récupère les cumuls d'heures des conducteurs avec les informations de la table INFO_EQUIPE"""
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('''
-                SELECT 
-                    ch.id_cumul_heures,
-                    ch.matricule,
-                    ch.code_engin,
-                    ch.heure_par_jour,
-                    ch.date,
-                    ie.nom,
-                    ie.prenom,
-                    ie.fonction,
-                    ie.email,
-                    ie.phone_number,
-                    ie.date_embauche,
-                    ie.disponibilité
-                FROM cumul_heures ch
-                LEFT JOIN info_equipe ie ON ch.matricule = ie.matricule
-                WHERE ie.fonction = 'conducteur'
-                ORDER BY ch.matricule ASC, ch.date DESC
-            ''')
-            columns = [col[0] for col in cursor.description]
-            rows = cursor.fetchall()
-        data = [
-            {col: (val.isoformat() if hasattr(val, 'isoformat') else val) for col, val in zip(columns, row)}
-            for row in rows
-        ]
-        return Response(data)
-    except Exception as e:
-        return Response({'error': str(e)}, status=500)
+    return _cumul_dump(request, fonction='conducteur')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -875,33 +888,12 @@ def modifier_qualification_conducteur(request, id_qualification):
 def limites_alertes(request):
     """Récupère les limites d'alertes depuis la base de données"""
     try:
-        with connection.cursor() as cursor:
-            # Vérifier si une table de configuration existe, sinon utiliser des valeurs par défaut
-            cursor.execute('''
-                SELECT 
-                    COALESCE(
-                        (SELECT valeur FROM configuration WHERE cle = 'limite_min_heures'), 
-                        2
-                    ) as limite_min,
-                    COALESCE(
-                        (SELECT valeur FROM configuration WHERE cle = 'limite_max_heures'), 
-                        8
-                    ) as limite_max
-            ''')
-            
-            result = cursor.fetchone()
-            limite_min = int(result[0]) if result[0] else 2
-            limite_max = int(result[1]) if result[1] else 8
-            
-        return Response({
-            'limite_min': limite_min,
-            'limite_max': limite_max
-        })
+        return Response(lire_limites_alertes())
     except Exception as e:
         # En cas d'erreur, retourner les valeurs par défaut
         return Response({
-            'limite_min': 2,
-            'limite_max': 8
+            'limite_min': LIMITE_MIN_DEFAUT,
+            'limite_max': LIMITE_MAX_DEFAUT
         })
 
 # ===== NOUVELLES VUES POUR LES CHEFS D'ESCALE =====
@@ -951,9 +943,10 @@ def chef_escale_ajouter(request):
                 return Response({'error': f'Le champ {field} est requis'}, status=400)
         
         # Validation du nombre d'affectations manuelles
-        nbr_aff_manuelle = data.get('nbr_aff_manuelle', 4)
-        if nbr_aff_manuelle > 4:
-            return Response({'error': 'Le nombre d\'affectations manuelles ne peut pas dépasser 4'}, status=400)
+        try:
+            nbr_aff_manuelle = valider_quota(data.get('nbr_aff_manuelle', QUOTA_AFF_MANUELLE))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         
         with connection.cursor() as cursor:
             cursor.execute('''
@@ -969,6 +962,7 @@ def chef_escale_ajouter(request):
                 data.get('telephone'),
                 data.get('email')
             ])
+        invalider('chef_escale')
             
         return Response({'message': 'Chef d\'escale ajouté avec succès'}, status=201)
     except Exception as e:
@@ -982,32 +976,43 @@ def chef_escale_modifier(request, id_chef_escale):
         data = request.data
         
         # Validation du nombre d'affectations manuelles
-        if 'nbr_aff_manuelle' in data and data['nbr_aff_manuelle'] > 4:
-            return Response({'error': 'Le nombre d\'affectations manuelles ne peut pas dépasser 4'}, status=400)
+        if 'nbr_aff_manuelle' in data:
+            try:
+                valider_quota(data['nbr_aff_manuelle'])
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
         
         # Construire la requête SQL dynamiquement
         update_fields = []
         update_values = []
         
         for field, value in data.items():
-            if field in ['nbr_aff_manuelle', 'id_shift', 'nom', 'prenom', 'telephone', 'email']:
+            if field in ['id_shift', 'nom', 'prenom', 'telephone', 'email']:
                 update_fields.append(f"{field} = %s")
                 update_values.append(value)
         
-        if not update_fields:
+        if not update_fields and 'nbr_aff_manuelle' not in data:
             return Response({'error': 'Aucun champ valide à modifier'}, status=400)
         
-        update_values.append(id_chef_escale)
-        
-        with connection.cursor() as cursor:
-            cursor.execute(f'''
-                UPDATE CHEF_ESCALE 
-                SET {', '.join(update_fields)}
-                WHERE id_chef_escale = %s
-            ''', update_values)
-            
-            if cursor.rowcount == 0:
-                return Response({'error': 'Chef d\'escale non trouvé'}, status=404)
+        with transaction.atomic():
+            if update_fields:
+                update_values.append(id_chef_escale)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'''
+                        UPDATE CHEF_ESCALE 
+                        SET {', '.join(update_fields)}
+                        WHERE id_chef_escale = %s
+                    ''', update_values)
+                    
+                    if cursor.rowcount == 0:
+                        return Response({'error': 'Chef d\'escale non trouvé'}, status=404)
+            if 'nbr_aff_manuelle' in data:
+                # Écriture atomique du compteur, journalisée comme ajustement
+                try:
+                    ajuster_quota(id_chef_escale, data['nbr_aff_manuelle'], reference='modification RH')
+                except ChefEscale.DoesNotExist:
+                    return Response({'error': 'Chef d\'escale non trouvé'}, status=404)
+        invalider('chef_escale')
                 
         return Response({'message': 'Chef d\'escale modifié avec succès'})
     except Exception as e:
@@ -1015,6 +1020,7 @@ def chef_escale_modifier(request, id_chef_escale):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_endpoint('chef_escale')
 def chef_escale_stats(request):
     """Récupère les statistiques des chefs d'escale"""
     try:
@@ -1038,6 +1044,51 @@ def chef_escale_stats(request):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def chef_escale_quota_consommer(request, id_chef_escale):
+    """
+    Consomme une affectation manuelle du chef d'escale
+    - body : {"reference": "<affectation>"} (optionnel, conservé dans le journal)
+    """
+    try:
+        restant = consommer_affectation_manuelle(id_chef_escale, request.data.get('reference'))
+        return Response({'nbr_aff_manuelle': restant})
+    except ChefEscale.DoesNotExist:
+        return Response({'error': 'Chef d\'escale non trouvé'}, status=404)
+    except QuotaEpuise as e:
+        return Response({'error': str(e), 'nbr_aff_manuelle': 0}, status=409)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def chef_escale_quota_rembourser(request, id_chef_escale):
+    """Rend une affectation manuelle au chef d'escale (affectation annulée)"""
+    try:
+        restant = rembourser_affectation_manuelle(id_chef_escale, request.data.get('reference'))
+        return Response({'nbr_aff_manuelle': restant})
+    except ChefEscale.DoesNotExist:
+        return Response({'error': 'Chef d\'escale non trouvé'}, status=404)
+    except QuotaComplet as e:
+        return Response({'error': str(e), 'nbr_aff_manuelle': QUOTA_AFF_MANUELLE}, status=409)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def chef_escale_quota_historique(request, id_chef_escale):
+    """Journal des mouvements du quota d'affectations manuelles (100 derniers)"""
+    try:
+        mouvements = (
+            ConsommationQuota.objects.filter(id_chef_escale=id_chef_escale)
+            .order_by('-date_operation', '-id')
+            .values('operation', 'delta', 'restant', 'reference', 'date_operation')[:100]
+        )
+        return Response(list(mouvements))
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
 def rename_justification_file(justification_file, matricule, date_debut_abs):
     """
     Renomme le fichier de justification selon le format demandé
@@ -1098,54 +1149,105 @@ class EnginsViewSet(viewsets.ModelViewSet):
     serializer_class = EnginsSerializer
     permission_classes = [AllowAny]
 
-    def get_serializer_class(self):
+    def avec_details(self):
+        """Vue détaillée pour retrieve, ou pour list avec ?details=1"""
         if self.action == 'retrieve':
-            return EnginsSerializer
+            return True
+        return self.action == 'list' and self.request.query_params.get('details') in ('1', 'true')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.avec_details():
+            return EnginDetailSerializer.optimiser_queryset(queryset)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.avec_details():
+            return EnginDetailSerializer
         return EnginsSerializer
 
     @action(detail=False, methods=['get'])
     def statistiques(self, request):
-        total_engins = Engins.objects.count()
-        en_maintenance = Engins.objects.filter(etat_engin='en maintenance').count()
-        
-        # Calculer la moyenne des heures cumulées
-        cumuls = CumulHeures.objects.all()
-        moyenne_heures = sum(c.heure_par_engin or 0 for c in cumuls) / len(cumuls) if cumuls else 0
-        
-        # Calculer le taux de disponibilité
-        disponibles = Engins.objects.filter(etat_engin='disponible').count()
-        taux_disponibilite = (disponibles / total_engins * 100) if total_engins > 0 else 0
-        
+        """
+        Statistiques des engins calculées en base (filtres optionnels :
+        ?date_from=YYYY-MM-DD, ?date_to=YYYY-MM-DD, ?famille=...)
+        """
+        filtres_engins = Q()
+        filtres_cumuls = Q()
+
+        famille = request.query_params.get('famille')
+        if famille:
+            filtres_engins &= Q(famille_engin=famille)
+            filtres_cumuls &= Q(code_engin__famille_engin=famille)
+
+        for param, lookup in (('date_from', 'date_cumul__gte'), ('date_to', 'date_cumul__lte')):
+            valeur = request.query_params.get(param)
+            if valeur:
+                try:
+                    # None si le format est invalide, ValueError si la date n'existe pas (2025-02-30)
+                    date_valeur = parse_date(valeur)
+                except ValueError:
+                    date_valeur = None
+                if date_valeur is None:
+                    return Response(
+                        {'error': f'Le paramètre {param} doit être au format YYYY-MM-DD'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                filtres_cumuls &= Q(**{lookup: date_valeur})
+
+        # Une seule requête : agrégation conditionnelle sur engins, moyenne de
+        # cumul_heures en sous-requête scalaire (non corrélée, évaluée une fois).
+        # Max() ne sert qu'à la placer dans aggregate(), qui exige un agrégat
+        moyenne_cumuls = CumulHeures.objects.filter(filtres_cumuls).order_by().values(
+            tous=Value(1)
+        ).annotate(moyenne=Avg(Coalesce('heure_par_engin', Value(0.0)))).values('moyenne')
+        stats = Engins.objects.filter(filtres_engins).aggregate(
+            total_engins=Count('pk'),
+            en_maintenance=Count('pk', filter=Q(etat_engin='en maintenance')),
+            disponibles=Count('pk', filter=Q(etat_engin='disponible')),
+            moyenne_heures=Max(Subquery(moyenne_cumuls, output_field=FloatField())),
+        )
+        moyenne_heures = stats['moyenne_heures'] or 0
+
+        total_engins = stats['total_engins']
+        taux_disponibilite = (stats['disponibles'] / total_engins * 100) if total_engins > 0 else 0
+
         return Response({
             'total_engins': total_engins,
-            'en_maintenance': en_maintenance,
+            'en_maintenance': stats['en_maintenance'],
+            'disponibles': stats['disponibles'],
             'moyenne_heures': round(moyenne_heures, 2),
             'taux_disponibilite': round(taux_disponibilite, 2)
         })
 
     @action(detail=True, methods=['patch'])
     def update_etat(self, request, pk=None):
-        engin = self.get_object()
         etat_engin = request.data.get('etat_engin')
         
         if etat_engin:
-            engin.etat_engin = etat_engin
-            engin.save()
-            
-            # Enregistrer dans l'historique si un commentaire est fourni
-            commentaire = request.data.get('commentaire')
-            if commentaire:
-                HistoriqueAffectations.objects.create(
-                    id_affectation=None,  # Pas d'affectation spécifique
-                    ancien_etat=engin.etat_engin,
-                    nouvel_etat=etat_engin,
-                    commentaire=commentaire
-                )
+            with transaction.atomic():
+                # Verrou de la ligne : l'ancien état enregistré est bien celui remplacé
+                engin = self.get_queryset().select_for_update().get(pk=self.get_object().pk)
+                ancien_etat = engin.etat_engin
+                engin.etat_engin = etat_engin
+                # La transition est diffusée par le signal post_save (manutention.signals)
+                engin.save(update_fields=['etat_engin'])
+                
+                # Enregistrer dans l'historique si un commentaire est fourni
+                commentaire = request.data.get('commentaire')
+                if commentaire:
+                    HistoriqueAffectations.objects.create(
+                        id_affectation=None,  # Pas d'affectation spécifique
+                        ancien_etat=ancien_etat,
+                        nouvel_etat=etat_engin,
+                        commentaire=commentaire
+                    )
             
             return Response({'message': 'État mis à jour avec succès'})
         return Response({'error': 'État requis'}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
+    @cache_endpoint('engins', nom='engins_filtres')
     def filtres(self, request):
         familles = Engins.objects.values_list('famille_engin', flat=True).distinct()
         etats = Engins.objects.values_list('etat_engin', flat=True).distinct()
@@ -1156,6 +1258,7 @@ class EnginsViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @cache_endpoint('engins', nom='engins_familles')
     def familles(self, request):
         """Récupérer uniquement les familles d'engins distinctes"""
         familles = Engins.objects.values_list('famille_engin', flat=True).distinct().filter(famille_engin__isnull=False).exclude(famille_engin='')
@@ -1167,6 +1270,8 @@ class AffectationsViewSet(viewsets.ModelViewSet):
     queryset = Affectations.objects.all()
     serializer_class = AffectationsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_affectation'
 
 class EnginsAffecteesViewSet(viewsets.ModelViewSet):
     queryset = EnginsAffectees.objects.all()
@@ -1182,11 +1287,32 @@ class CumulHeuresViewSet(viewsets.ModelViewSet):
     queryset = CumulHeures.objects.all()
     serializer_class = CumulHeuresSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_cumul'
 
 class ShiftsViewSet(viewsets.ModelViewSet):
     queryset = Shifts.objects.all()
     serializer_class = ShiftsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_debut_shift'
+
+    @action(detail=True, methods=['post'], url_path='affectation-auto')
+    def affectation_auto(self, request, pk=None):
+        """
+        Affecte automatiquement les conducteurs éligibles aux engins disponibles du shift
+        - {"simulation": true} (ou ?simulation=1) : calcule sans rien enregistrer
+        """
+        simulation = request.data.get('simulation', request.query_params.get('simulation', False))
+        if isinstance(simulation, str):
+            simulation = simulation.lower() in ('1', 'true', 'oui')
+        try:
+            resultat = affecter_shift(int(pk), simulation=bool(simulation))
+        except (ValueError, Shifts.DoesNotExist):
+            return Response({'error': f'Shift {pk} introuvable'}, status=404)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+        return Response(resultat, status=200 if simulation or not resultat['affectations'] else 201)
 
 class EquipeViewSet(viewsets.ModelViewSet):
     queryset = Equipe.objects.all()
@@ -1231,6 +1357,8 @@ class AbsencesViewSet(viewsets.ModelViewSet):
     queryset = Absences.objects.all()
     serializer_class = AbsencesSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_debut_abs'
 
     def create(self, request, *args, **kwargs):
         print('POST /api/absences/ - Données reçues:', request.data)
@@ -1255,6 +1383,9 @@ class AbsencesViewSet(viewsets.ModelViewSet):
             headers = self.get_success_headers(serializer.data)
             print('Absence créée avec succès:', serializer.data)
             return Response(serializer.data, status=201, headers=headers)
+        except ValidationError:
+            # Chevauchement détecté à l'écriture (revérification en base) : 400 avec les conflits
+            raise
         except Exception as e:
             print('Erreur lors de la création:', str(e))
             import traceback
@@ -1288,18 +1419,35 @@ class AbsencesViewSet(viewsets.ModelViewSet):
             self.perform_update(serializer)
             
             return Response(serializer.data)
+        except ValidationError:
+            raise
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
     def absences_non_declarees(self, request):
-        """Endpoint pour récupérer les absences non déclarées"""
+        """
+        Absences non déclarées détectées (commande detecter_absences_non_declarees)
+        - ?debut=YYYY-MM-DD&fin=YYYY-MM-DD (30 derniers jours par défaut), ?id_shift=
+        """
         try:
-            # Pour l'instant, retourner une liste vide car la logique métier
-            # pour détecter les absences non déclarées n'est pas encore implémentée
-            # Cette logique pourrait comparer les présences planifiées vs les absences déclarées
-            absences_non_declarees = []
-            return Response(absences_non_declarees)
+            fin = timezone.localdate()
+            debut = fin - timedelta(days=29)
+            for param in ('debut', 'fin'):
+                if request.query_params.get(param):
+                    valeur = parse_date(request.query_params[param])
+                    if valeur is None:
+                        return Response({'error': f'Paramètre {param} invalide (format YYYY-MM-DD)'}, status=400)
+                    if param == 'debut':
+                        debut = valeur
+                    else:
+                        fin = valeur
+            if debut > fin or (fin - debut).days >= JOURS_HISTORIQUE_MAX:
+                return Response({'error': f'Période invalide (au plus {JOURS_HISTORIQUE_MAX} jours)'}, status=400)
+            id_shift = request.query_params.get('id_shift')
+            if id_shift is not None and not id_shift.isdigit():
+                return Response({'error': 'Paramètre id_shift invalide'}, status=400)
+            return Response(lire_absences_non_declarees(debut, fin, int(id_shift) if id_shift else None))
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1307,6 +1455,8 @@ class AbsencesNonDeclareesViewSet(viewsets.ModelViewSet):
     queryset = AbsencesNonDeclarees.objects.all().order_by('-date_debut_abs')
     serializer_class = AbsencesNonDeclareesSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_debut_abs'
 
     @action(detail=True, methods=['patch'])
     def justifier(self, request, pk=None):
@@ -1382,11 +1532,15 @@ class MaintenanceViewSet(viewsets.ModelViewSet):
     queryset = Maintenance.objects.all()
     serializer_class = MaintenanceSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_debut'
 
 class IncidentsViewSet(viewsets.ModelViewSet):
     queryset = Incidents.objects.all()
     serializer_class = IncidentsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_incident'
 
 class UtilisateursViewSet(viewsets.ModelViewSet):
     queryset = Utilisateurs.objects.all()
@@ -1407,16 +1561,22 @@ class HistoriqueAffectationsViewSet(viewsets.ModelViewSet):
     queryset = HistoriqueAffectations.objects.all()
     serializer_class = HistoriqueAffectationsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_modification'
 
 class NotificationsViewSet(viewsets.ModelViewSet):
     queryset = Notifications.objects.all()
     serializer_class = NotificationsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_envoi'
 
 class RapportsViewSet(viewsets.ModelViewSet):
     queryset = Rapports.objects.all()
     serializer_class = RapportsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_creation'
 
 class ParametresViewSet(viewsets.ModelViewSet):
     queryset = Parametres.objects.all()
@@ -1427,78 +1587,32 @@ class LogsViewSet(viewsets.ModelViewSet):
     queryset = Logs.objects.all()
     serializer_class = LogsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_action'
 
 class NavirePrevisionnelViewSet(viewsets.ModelViewSet):
     queryset = NavirePrevisionnel.objects.all().order_by('date_arrivee', 'heure_arrivee')
     serializer_class = NavirePrevisionnelSerializer
     permission_classes = [AllowAny]
-    pagination_class = None  # Désactiver la pagination
-
-    def list(self, request, *args, **kwargs):
-        """Liste des navires prévisionnels"""
-        try:
-            # Compter le nombre total de navires
-            total_count = NavirePrevisionnel.objects.count()
-            print(f"📊 Nombre total de navires dans la DB: {total_count}")
-            
-            # Récupérer tous les navires
-            navires = NavirePrevisionnel.objects.all().order_by('date_arrivee', 'heure_arrivee')
-            serializer = self.get_serializer(navires, many=True)
-            
-            print(f"✅ Navires récupérés: {len(serializer.data)}")
-            print(f"📋 Premiers navires: {serializer.data[:3] if serializer.data else 'Aucun'}")
-            
-            return Response(serializer.data)
-        except Exception as e:
-            print(f"❌ Erreur lors de la récupération des navires: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    pagination_class = KeysetPagination
+    cursor_ordering = ('date_arrivee', 'heure_arrivee')
 
     @action(detail=False, methods=['post'])
     def update_navires(self, request):
-        """Mettre à jour les navires prévisionnels via scraping"""
+        """
+        Mettre à jour les navires prévisionnels via scraping.
+        Le scraping est exécuté par le worker `run_jobs` ; suivre sa progression sur /jobs/<id>/
+        """
         try:
-            # Lancer le scraping dans un thread séparé pour éviter le blocage
-            def run_scraping():
-                try:
-                    print("🚀 Début du scraping des navires...")
-                    
-                    # Importer et exécuter le script de scraping
-                    from .navire_scraper import scrape_navires_anp
-                    
-                    # Changer le répertoire de travail pour que le CSV soit créé au bon endroit
-                    import os
-                    current_dir = os.getcwd()
-                    script_dir = os.path.dirname(os.path.abspath(__file__))
-                    os.chdir(script_dir)
-                    
-                    try:
-                        result = scrape_navires_anp()
-                        print(f"✅ Scraping terminé: {result}")
-                    finally:
-                        # Restaurer le répertoire de travail
-                        os.chdir(current_dir)
-                        
-                except Exception as e:
-                    print(f"❌ Erreur lors du scraping: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-            
-            # Démarrer le scraping en arrière-plan
-            scraping_thread = threading.Thread(target=run_scraping)
-            scraping_thread.daemon = True
-            scraping_thread.start()
-            
+            job, cree = soumettre_job('scraping_navires')
             return Response({
                 'success': True,
-                'message': 'Scraping des navires lancé en arrière-plan. Vérifiez les logs pour le suivi.'
+                'message': 'Scraping des navires lancé en arrière-plan.' if cree else 'Un scraping des navires est déjà en cours.',
+                'job': JobSerializer(job).data,
+                'statut_url': reverse('job-detail', args=[job.id], request=request),
             }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
-            print(f"Erreur lors du lancement du scraping: {str(e)}")
-            import traceback
-            traceback.print_exc()
             return Response({
                 'success': False,
                 'error': f'Erreur lors du lancement du scraping: {str(e)}'
@@ -1523,46 +1637,67 @@ class NavirePrevisionnelViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def csv_data(self, request):
-        """Endpoint pour récupérer les données du fichier CSV"""
-        print("🚀 Endpoint csv_data appelé!")
+        """
+        Endpoint pour récupérer les données du fichier CSV
+        - ?since=YYYY-MM-DD : navires arrivant à partir de cette date
+        Répond 304 si le fichier n'a pas changé (If-None-Match / If-Modified-Since)
+        """
         try:
-            csv_filename = "navires_agadir.csv"
-            # Chemin direct vers le fichier dans le dossier manutention
-            csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), csv_filename)
-            
-            print(f"🔍 Recherche du fichier CSV: {csv_path}")
-            print(f"📁 Le fichier existe: {os.path.exists(csv_path)}")
-            
-            if not os.path.exists(csv_path):
+            since = None
+            if request.query_params.get('since'):
+                since = parse_date(request.query_params['since'])
+                if since is None:
+                    return Response({'error': 'Paramètre since invalide (format YYYY-MM-DD)'}, status=400)
+
+            try:
+                stat, navires = lire_csv_navires()
+            except FileNotFoundError:
                 return Response({
-                    'error': f'Fichier CSV non trouvé à l\'emplacement: {csv_path}'
+                    'error': f'Fichier CSV non trouvé à l\'emplacement: {CSV_NAVIRES}'
                 }, status=status.HTTP_404_NOT_FOUND)
-            
-            navires_data = []
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader)  # Skip header
-                for row in reader:
-                    if len(row) >= 8:
-                        navires_data.append({
-                            'nom': row[0],
-                            'type': row[1],
-                            'statut': row[2],
-                            'date': row[3],
-                            'heure': row[4],
-                            'port': row[5],
-                            'consignataire': row[6],
-                            'operateur': row[7]
-                        })
-            
-            return Response({
-                'success': True,
-                'data': navires_data,
-                'count': len(navires_data),
-                'csv_file': csv_filename
-            })
+
+            etag = etag_fichier(stat)
+            last_modified = int(stat.st_mtime)
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            if (if_none_match and etag in if_none_match) or (
+                not if_none_match and if_modified_since is not None and last_modified <= if_modified_since
+            ):
+                response = HttpResponseNotModified()
+            else:
+                navires_data = [
+                    navire for date_arrivee, navire in navires
+                    if since is None or (date_arrivee is not None and date_arrivee >= since)
+                ]
+                response = Response({
+                    'success': True,
+                    'data': navires_data,
+                    'count': len(navires_data),
+                    'csv_file': os.path.basename(CSV_NAVIRES)
+                })
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            return response
             
         except Exception as e:
             return Response({
                 'error': f'Erreur lors de la lecture du CSV: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Statut, progression et résultat des tâches de fond"""
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-date_creation'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        type_job = self.request.query_params.get('type_job')
+        statut_job = self.request.query_params.get('statut')
+        if type_job:
+            queryset = queryset.filter(type_job=type_job)
+        if statut_job:
+            queryset = queryset.filter(statut=statut_job)
+        return queryset
@@ -134,6 +134,26 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Hash des mots de passe : PBKDF2 au coût LOGIN_PBKDF2_ITERATIONS, les hash
+# existants sont recalculés à ce coût lors de la connexion suivante
+PASSWORD_HASHERS = [
+    'users.hashers.PBKDF2HasherConfigurable',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+LOGIN_PBKDF2_ITERATIONS = 1_000_000
+
+# Pool de vérification des mots de passe (users.login) : WORKERS threads
+# (nombre de cœurs par défaut), FILE_MAX vérifications en attente au plus,
+# TIMEOUT secondes avant de répondre 503
+LOGIN_HASH = {
+    'WORKERS': None,
+    'FILE_MAX': 64,
+    'TIMEOUT': 10,
+}
+
 # Custom user model - using Utilisateur model instead
 # AUTH_USER_MODEL = 'users.User'
 
@@ -146,6 +166,78 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'users.authentication.UtilisateurJWTAuthentication',
     ),
+    'DEFAULT_THROTTLE_RATES': {
+        # Tentatives de connexion par identifiant (users.login.LoginThrottle)
+        'login': '10/min',
+    },
+}
+
+# Pagination par curseur des ModelViewSet qui déclarent
+# pagination_class = KeysetPagination (?pagination=off pour une liste complète)
+CURSOR_PAGINATION = {
+    'PAGE_SIZE': 100,
+    'MAX_PAGE_SIZE': 1000,
+}
+
+# Cache des endpoints de référence (manutention.caching).
+# LocMemCache est propre à chaque worker ; pour partager le cache entre
+# workers gunicorn, utiliser FileBasedCache ou DatabaseCache
+# (python manage.py createcachetable) sur l'alias 'endpoints'.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'endpoints': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'endpoints',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# Durée de vie (secondes) des réponses en cache, par nom de vue
+CACHE_ENDPOINTS_TTL = {
+    'default': 300,
+    'limites_alertes': 600,
+    'chef_escale_stats': 60,
+}
+
+# Backends du scraper ANP essayés dans l'ordre (manutention.anp_fetchers) ;
+# 'selenium' n'est qu'un repli et nécessite selenium + Chrome sur le serveur
+ANP_SCRAPER_BACKENDS = ['http', 'selenium']
+
+# Worker des tâches de fond : python manage.py run_jobs (manutention.jobs)
+JOBS_WORKERS = 2
+JOBS_INTERVALLE_POLL = 2.0
+# Secondes entre deux heartbeats des jobs en cours ; un job sans heartbeat
+# depuis JOBS_DELAI_ORPHELINS secondes est marqué en échec par tout worker actif
+JOBS_INTERVALLE_HEARTBEAT = 15
+JOBS_DELAI_ORPHELINS = 120
+
+# Cache des utilisateurs authentifiés par JWT (users.authentication).
+# DEPUIS_TOKEN construit l'utilisateur à partir des claims signés, sans
+# requête : un changement de rôle ne prend alors effet qu'au prochain token.
+UTILISATEUR_CACHE = {
+    'TAILLE_MAX': 1024,
+    'TTL': 300,
+    'DEPUIS_TOKEN': False,
+}
+
+# Bus d'événements temps réel (manutention.evenements) : NOTIFY/LISTEN
+# PostgreSQL pour diffuser à tous les workers ASGI. LISTEN=False diffuse
+# uniquement dans le processus courant (serveur de développement unique).
+EVENEMENTS = {
+    'LISTEN': True,
+    'FILE_MAX': 100,
+    'HEARTBEAT': 15,
+}
+
+# Index en mémoire des absences (manutention.index_absences) pour refuser les
+# chevauchements : fenêtre chargée autour d'aujourd'hui, tenue à jour par le
+# bus d'événements, rechargée entièrement au plus tard après TTL secondes.
+INDEX_ABSENCES = {
+    'JOURS_PASSES': 90,
+    'JOURS_FUTURS': 365,
+    'TTL': 300,
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -1,7 +1,12 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import AnonymousUser
+from .login import ServeurSature, verifier_utilisateur
 from .models import Utilisateur
-from django.contrib.auth.hashers import check_password
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.settings import api_settings
 
@@ -10,10 +15,10 @@ class UtilisateurBackend(ModelBackend):
         id_utilisateur = kwargs.get('id_utilisateur', username)
         try:
             utilisateur = Utilisateur.objects.get(id_utilisateur=id_utilisateur)
-            if check_password(password, utilisateur.mot_de_passe_hash):
+            if verifier_utilisateur(utilisateur, password):
                 # Créer un objet utilisateur compatible avec Django
                 return UtilisateurUser(utilisateur)
-        except Utilisateur.DoesNotExist:
+        except (Utilisateur.DoesNotExist, ServeurSature):
             return None
     
     def get_user(self, user_id):
@@ -39,15 +44,102 @@ class UtilisateurUser:
     def has_module_perms(self, app_label):
         return True  # Simplifié pour l'exemple
 
+class CacheUtilisateurs:
+    """
+    Cache LRU borné avec expiration des UtilisateurUser, clé (id_utilisateur, rôle).
+    Propre à chaque processus : les écritures ORM l'invalident via les signaux
+    (users.signals), le TTL borne la durée de vie des autres modifications.
+    """
+
+    def __init__(self, taille_max=1024, ttl=300):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            expiration, user = entree
+            if expiration < time.monotonic():
+                del self._entrees[cle]
+                return None
+            self._entrees.move_to_end(cle)
+            return user
+
+    def set(self, cle, user):
+        with self._verrou:
+            self._entrees[cle] = (time.monotonic() + self.ttl, user)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def invalider(self, id_utilisateur):
+        with self._verrou:
+            for cle in [cle for cle in self._entrees if cle[0] == id_utilisateur]:
+                del self._entrees[cle]
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+_cache_utilisateurs = None
+
+
+def config_cache_utilisateurs():
+    return getattr(settings, 'UTILISATEUR_CACHE', {})
+
+
+def get_cache_utilisateurs():
+    global _cache_utilisateurs
+    if _cache_utilisateurs is None:
+        config = config_cache_utilisateurs()
+        _cache_utilisateurs = CacheUtilisateurs(config.get('TAILLE_MAX', 1024), config.get('TTL', 300))
+    return _cache_utilisateurs
+
+
+def reinitialiser_cache_utilisateurs():
+    global _cache_utilisateurs
+    _cache_utilisateurs = None
+
+
+def invalider_utilisateur(id_utilisateur):
+    if _cache_utilisateurs is not None:
+        _cache_utilisateurs.invalider(str(id_utilisateur))
+
+
 class UtilisateurJWTAuthentication(JWTAuthentication):
     def get_user(self, validated_token):
         """
         Returns a user that is active and verified by the given token.
+
+        Avec UTILISATEUR_CACHE['DEPUIS_TOKEN'] l'utilisateur est construit
+        uniquement à partir des claims signés (aucune requête) ; sinon il est
+        lu une fois puis servi depuis le cache LRU du processus.
         """
-        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        role = validated_token.get('role')
+
+        if config_cache_utilisateurs().get('DEPUIS_TOKEN', False) and role is not None:
+            return UtilisateurUser(Utilisateur(
+                id_utilisateur=user_id,
+                nom_utilisateur=validated_token.get('nom_utilisateur', ''),
+                role=role,
+            ))
+
+        cache = get_cache_utilisateurs()
+        cle = (user_id, role)
+        user = cache.get(cle)
+        if user is not None:
+            return user
         
         try:
             utilisateur = Utilisateur.objects.get(id_utilisateur=user_id)
-            return UtilisateurUser(utilisateur)
         except Utilisateur.DoesNotExist:
-            return None 
\ No newline at end of file
+            return None
+        user = UtilisateurUser(utilisateur)
+        cache.set(cle, user)
+        return user
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class PBKDF2HasherConfigurable(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 dont le coût se règle avec settings.LOGIN_PBKDF2_ITERATIONS.
+
+    L'algorithme reste « pbkdf2_sha256 » : les hash existants restent valides
+    et sont recalculés au coût configuré à la connexion suivante (must_update).
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'LOGIN_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
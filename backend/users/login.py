@@ -0,0 +1,115 @@
+"""
+Chaîne de connexion : limitation par identifiant, vérification du hash dans
+un pool de threads borné et recalcul transparent du hash.
+
+PBKDF2 (hashlib) libère le GIL : les vérifications du pool s'exécutent en
+parallèle sur les cœurs disponibles pendant que le worker attend. Au-delà de
+WORKERS + FILE_MAX vérifications simultanées, les connexions sont refusées
+immédiatement (503) au lieu d'immobiliser tous les workers.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .models import Utilisateur
+
+
+class ServeurSature(Exception):
+    """Trop de vérifications de mot de passe en attente"""
+
+
+def config_login():
+    return getattr(settings, 'LOGIN_HASH', {})
+
+
+class VerificateurMotsDePasse:
+    """Pool borné de vérification des hash"""
+
+    def __init__(self, workers=None, file_max=64, timeout=10):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.places = threading.BoundedSemaphore(self.workers + file_max)
+        self.executeur = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='login')
+
+    def verifier(self, mot_de_passe, hash_stocke):
+        """
+        Retourne (valide, nouveau_hash). nouveau_hash n'est pas None quand le
+        hash stocké doit être recalculé (hasher ou coût différent du réglage).
+        """
+        if not self.places.acquire(blocking=False):
+            raise ServeurSature()
+        try:
+            future = self.executeur.submit(_verifier_et_rehasher, mot_de_passe, hash_stocke)
+        except BaseException:
+            self.places.release()
+            raise
+        # La place est rendue à la fin du calcul (ou à son annulation), pas à
+        # l'expiration de l'attente : un hash toujours en cours occupe le pool
+        future.add_done_callback(lambda _: self.places.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise ServeurSature()
+
+
+def _verifier_et_rehasher(mot_de_passe, hash_stocke):
+    nouveau_hash = []
+    valide = check_password(mot_de_passe, hash_stocke, setter=lambda brut: nouveau_hash.append(make_password(brut)))
+    return valide, (nouveau_hash[0] if nouveau_hash else None)
+
+
+_verificateur = None
+_verrou = threading.Lock()
+
+
+def get_verificateur():
+    global _verificateur
+    if _verificateur is None:
+        with _verrou:
+            if _verificateur is None:
+                config = config_login()
+                _verificateur = VerificateurMotsDePasse(
+                    config.get('WORKERS'), config.get('FILE_MAX', 64), config.get('TIMEOUT', 10)
+                )
+    return _verificateur
+
+
+def reinitialiser_verificateur():
+    global _verificateur
+    with _verrou:
+        if _verificateur is not None:
+            _verificateur.executeur.shutdown(wait=False)
+        _verificateur = None
+
+
+def verifier_utilisateur(utilisateur, mot_de_passe):
+    """Vérifie le mot de passe et enregistre le hash recalculé si nécessaire"""
+    valide, nouveau_hash = get_verificateur().verifier(mot_de_passe, utilisateur.mot_de_passe_hash)
+    if valide and nouveau_hash:
+        # update() : pas de signal, le cache des utilisateurs ne dépend pas du hash
+        Utilisateur.objects.filter(pk=utilisateur.pk).update(mot_de_passe_hash=nouveau_hash)
+        utilisateur.mot_de_passe_hash = nouveau_hash
+    return valide
+
+
+class LoginThrottle(SimpleRateThrottle):
+    """
+    Limite les tentatives de connexion par identifiant (adresse IP si
+    l'identifiant est absent). Taux : DEFAULT_THROTTLE_RATES['login'].
+    """
+    scope = 'login'
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        identifiant = request.data.get('id_utilisateur') if hasattr(request.data, 'get') else None
+        ident = str(identifiant).strip().lower() if identifiant else self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -0,0 +1,48 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from users.login import VerificateurMotsDePasse
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit de vérification des mots de passe (connexions/s et par cœur) au coût configuré"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connexions', type=int, default=200, help="Nombre de vérifications à effectuer")
+        parser.add_argument('--workers', type=int, default=None, help="Threads du pool (nombre de cœurs par défaut)")
+        parser.add_argument('--iterations', type=int, default=None, help="Coût PBKDF2 (LOGIN_PBKDF2_ITERATIONS par défaut)")
+
+    def handle(self, *args, **options):
+        if options['iterations']:
+            settings.LOGIN_PBKDF2_ITERATIONS = options['iterations']
+        coeurs = os.cpu_count() or 1
+        workers = options['workers'] or coeurs
+        connexions = options['connexions']
+
+        mot_de_passe = 'Motdepasse#2025'
+        hash_stocke = make_password(mot_de_passe)
+        verificateur = VerificateurMotsDePasse(workers=workers, file_max=connexions, timeout=None)
+
+        # Les requêtes simultanées sont simulées par autant de threads clients
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=connexions) as clients:
+            resultats = list(clients.map(lambda _: verificateur.verifier(mot_de_passe, hash_stocke), range(connexions)))
+        duree = time.perf_counter() - debut
+        verificateur.executeur.shutdown()
+
+        if not all(valide for valide, _ in resultats):
+            self.stderr.write(self.style.ERROR("Vérification en échec"))
+            return
+
+        debit = connexions / duree
+        self.stdout.write(f"Hasher       : {hash_stocke.split('$')[0]} ({hash_stocke.split('$')[1]} itérations)")
+        self.stdout.write(f"Pool         : {workers} thread(s) sur {coeurs} cœur(s)")
+        self.stdout.write(f"Connexions   : {connexions} en {duree:.2f} s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Débit        : {debit:.1f} connexions/s, {debit / min(workers, coeurs):.1f} connexions/s/cœur"
+        ))
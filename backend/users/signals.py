@@ -0,0 +1,23 @@
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from manutention.models import Utilisateurs
+from .authentication import invalider_utilisateur, reinitialiser_cache_utilisateurs
+from .login import reinitialiser_verificateur
+from .models import Utilisateur
+
+
+@receiver([post_save, post_delete], sender=Utilisateur, dispatch_uid='cache_utilisateur_utilisateur')
+@receiver([post_save, post_delete], sender=Utilisateurs, dispatch_uid='cache_utilisateur_utilisateurs')
+def invalider_cache_utilisateur(sender, instance, **kwargs):
+    # Les deux modèles pointent sur la table utilisateurs
+    invalider_utilisateur(instance.id_utilisateur)
+
+
+@receiver(setting_changed)
+def recharger_configuration(setting, **kwargs):
+    if setting == 'UTILISATEUR_CACHE':
+        reinitialiser_cache_utilisateurs()
+    elif setting == 'LOGIN_HASH':
+        reinitialiser_verificateur()
@@ -1,3 +1,135 @@
-from django.test import TestCase
+import threading
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CacheUtilisateurs, UtilisateurJWTAuthentication, reinitialiser_cache_utilisateurs
+from .login import ServeurSature, VerificateurMotsDePasse, get_verificateur
+from .models import Utilisateur
 
 # Create your tests here.
+
+class CacheUtilisateurJWTTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create(
+            id_utilisateur='rh01', nom_utilisateur='Amal', mot_de_passe_hash='x', role='RH'
+        )
+
+    def setUp(self):
+        reinitialiser_cache_utilisateurs()
+        self.authentification = UtilisateurJWTAuthentication()
+        self.token = AccessToken()
+        self.token['user_id'] = 'rh01'
+        self.token['role'] = 'RH'
+
+    def test_une_seule_requete_par_utilisateur(self):
+        with self.assertNumQueries(1):
+            self.authentification.get_user(self.token)
+        with self.assertNumQueries(0):
+            user = self.authentification.get_user(self.token)
+        self.assertEqual(user.nom_utilisateur, 'Amal')
+
+    def test_invalidation_a_la_sauvegarde(self):
+        self.authentification.get_user(self.token)
+        self.utilisateur.nom_utilisateur = 'Amal B.'
+        self.utilisateur.save()
+        with self.assertNumQueries(1):
+            user = self.authentification.get_user(self.token)
+        self.assertEqual(user.nom_utilisateur, 'Amal B.')
+
+    @override_settings(UTILISATEUR_CACHE={'DEPUIS_TOKEN': True})
+    def test_utilisateur_depuis_le_token(self):
+        with self.assertNumQueries(0):
+            user = self.authentification.get_user(self.token)
+        self.assertEqual((user.id, user.role), ('rh01', 'RH'))
+
+    def test_lru_borne(self):
+        cache = CacheUtilisateurs(taille_max=2, ttl=60)
+        cache.set(('a', 'RH'), 'A')
+        cache.set(('b', 'RH'), 'B')
+        cache.get(('a', 'RH'))
+        cache.set(('c', 'RH'), 'C')
+        self.assertIsNone(cache.get(('b', 'RH')))
+        self.assertEqual(cache.get(('a', 'RH')), 'A')
+
+        expire = CacheUtilisateurs(taille_max=2, ttl=-1)
+        expire.set(('a', 'RH'), 'A')
+        self.assertIsNone(expire.get(('a', 'RH')))
+
+@override_settings(
+    LOGIN_PBKDF2_ITERATIONS=1000,
+    LOGIN_HASH={'WORKERS': 2, 'FILE_MAX': 0, 'TIMEOUT': 5},
+    REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'login': '3/min'}},
+)
+class LoginPipelineTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.create(
+            id_utilisateur='ce01', nom_utilisateur='Karim', role='CE',
+            mot_de_passe_hash=make_password('secret', hasher='pbkdf2_sha1'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def connexion(self, mot_de_passe='secret', id_utilisateur='ce01'):
+        return self.client.post('/api/login/', {'id_utilisateur': id_utilisateur, 'mot_de_passe': mot_de_passe}, format='json')
+
+    def test_connexion_et_rehash(self):
+        response = self.connexion()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()['access'])['user_id'], 'ce01')
+        self.utilisateur.refresh_from_db()
+        self.assertTrue(self.utilisateur.mot_de_passe_hash.startswith('pbkdf2_sha256$1000$'))
+
+        with override_settings(LOGIN_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.connexion().status_code, 200)
+        self.utilisateur.refresh_from_db()
+        self.assertTrue(self.utilisateur.mot_de_passe_hash.startswith('pbkdf2_sha256$2000$'))
+
+    def test_limitation_par_identifiant(self):
+        for _ in range(3):
+            self.assertEqual(self.connexion('mauvais').status_code, 401)
+        self.assertEqual(self.connexion().status_code, 429)
+        # Un autre identifiant n'est pas concerné
+        self.assertEqual(self.connexion(id_utilisateur='inconnu').status_code, 401)
+
+    def test_pool_sature(self):
+        verificateur = get_verificateur()
+        for _ in range(verificateur.workers):
+            verificateur.places.acquire()
+        try:
+            response = self.connexion()
+        finally:
+            for _ in range(verificateur.workers):
+                verificateur.places.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_place_rendue_a_la_fin_du_calcul(self):
+        verificateur = VerificateurMotsDePasse(workers=1, file_max=0, timeout=0.05)
+        fin = threading.Event()
+        termine = threading.Event()
+
+        def hash_lent(mot_de_passe, hash_stocke):
+            fin.wait(5)
+            termine.set()
+            return True, None
+
+        with mock.patch('users.login._verifier_et_rehasher', hash_lent):
+            with self.assertRaises(ServeurSature):
+                verificateur.verifier('secret', 'hash')
+            # L'attente a expiré mais le hash occupe toujours le seul worker
+            self.assertFalse(verificateur.places.acquire(blocking=False))
+            fin.set()
+            termine.wait(5)
+            verificateur.executeur.shutdown(wait=True)
+        self.assertTrue(verificateur.places.acquire(blocking=False))
@@ -1,27 +1,30 @@
 from django.shortcuts import render
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.contrib.auth.hashers import make_password, check_password
 from rest_framework_simplejwt.tokens import RefreshToken
+from .login import LoginThrottle, ServeurSature, verifier_utilisateur
 from .models import Utilisateur
 import re
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginThrottle])
 def login_view(request):
     id_utilisateur = request.data.get('id_utilisateur')
     mot_de_passe = request.data.get('mot_de_passe')
     
     try:
         utilisateur = Utilisateur.objects.get(id_utilisateur=id_utilisateur)
-        if check_password(mot_de_passe, utilisateur.mot_de_passe_hash):
+        if verifier_utilisateur(utilisateur, mot_de_passe):
             # Générer les tokens JWT
             refresh = RefreshToken()
-            # Utiliser un ID numérique pour la compatibilité
-            refresh['user_id'] = 1  # ID numérique pour l'admin
+            # Claims lus par UtilisateurJWTAuthentication (cache ou construction depuis le token)
+            refresh['user_id'] = utilisateur.id_utilisateur
             refresh['role'] = utilisateur.role
+            refresh['nom_utilisateur'] = utilisateur.nom_utilisateur
             
             return Response({
                 'message': 'Connexion réussie',
@@ -38,6 +41,10 @@ def login_view(request):
         return Response({
             'error': 'Utilisateur non trouvé'
         }, status=status.HTTP_401_UNAUTHORIZED)
+    except ServeurSature:
+        return Response({
+            'error': 'Trop de connexions simultanées, veuillez réessayer'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '2'})
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -1,4 +1,5 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
+import { useFluxEvenements } from '../../hooks/useFluxEvenements';
 
 const API_URL = "http://localhost:8000/api";
 
@@ -20,25 +21,29 @@ const AlertesJour: React.FC<AlertesJourProps> = ({ type }) => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
-  useEffect(() => {
-    const fetchAlertes = async () => {
-      try {
-        setLoading(true);
-        const response = await fetch(`${API_URL}/alertes/${type === 'conducteur' ? 'conducteurs' : 'dockers'}/`);
-        if (!response.ok) {
-          throw new Error('Erreur lors du chargement des alertes');
-        }
-        const data = await response.json();
-        setAlertes(data.alertes || []);
-      } catch (err) {
-        setError(err instanceof Error ? err.message : 'Erreur inconnue');
-      } finally {
-        setLoading(false);
+  const fetchAlertes = useCallback(async () => {
+    try {
+      const response = await fetch(`${API_URL}/alertes/${type === 'conducteur' ? 'conducteurs' : 'dockers'}/`);
+      if (!response.ok) {
+        throw new Error('Erreur lors du chargement des alertes');
       }
-    };
+      const data = await response.json();
+      setAlertes(data.alertes || []);
+      setError(null);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Erreur inconnue');
+    } finally {
+      setLoading(false);
+    }
+  }, [type]);
 
+  useEffect(() => {
+    setLoading(true);
     fetchAlertes();
-  }, [type]);
+  }, [fetchAlertes]);
+
+  // Rechargement à l'ouverture / fermeture d'une alerte plutôt qu'à intervalle fixe
+  useFluxEvenements('/flux/rh/', ['alertes'], fetchAlertes);
 
   if (loading) {
     return (
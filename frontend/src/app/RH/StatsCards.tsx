@@ -1,5 +1,6 @@
 'use client';
-import React, { useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useState } from 'react';
+import { useFluxEvenements } from '../../hooks/useFluxEvenements';
 
 interface StatsData {
   total: number;
@@ -16,35 +17,38 @@ export default function StatsCards({ type }: StatsCardsProps) {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
-  useEffect(() => {
-    const fetchStats = async () => {
-      try {
-        const endpoint = type === 'conducteurs' 
-          ? 'http://localhost:8000/api/stats/conducteurs/presence/'
-          : 'http://localhost:8000/api/stats/dockers/presence/';
-        
-        const response = await fetch(endpoint, {
-          headers: {
-            'Content-Type': 'application/json',
-          },
-        });
-
-        if (!response.ok) {
-          throw new Error('Erreur lors du chargement des statistiques');
-        }
+  const fetchStats = useCallback(async () => {
+    try {
+      const fonction = type === 'conducteurs' ? 'conducteur' : 'docker';
+      const endpoint = `http://localhost:8000/api/stats/presence/?fonction=${fonction}`;
+      
+      const response = await fetch(endpoint, {
+        headers: {
+          'Content-Type': 'application/json',
+        },
+      });
 
-        const data = await response.json();
-        setStats(data);
-        setLoading(false);
-      } catch (err) {
-        setError(err instanceof Error ? err.message : 'Erreur inconnue');
-        setLoading(false);
+      if (!response.ok) {
+        throw new Error('Erreur lors du chargement des statistiques');
       }
-    };
 
-    fetchStats();
+      const data = await response.json();
+      setStats(data);
+      setError(null);
+      setLoading(false);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Erreur inconnue');
+      setLoading(false);
+    }
   }, [type]);
 
+  useEffect(() => {
+    fetchStats();
+  }, [fetchStats]);
+
+  // Les statistiques (en cache côté serveur) ne sont relues qu'après un changement de présence
+  useFluxEvenements('/flux/rh/', ['presence'], fetchStats);
+
   if (loading) {
     return (
       <div style={{
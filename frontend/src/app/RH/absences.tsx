@@ -41,7 +41,7 @@ export default function RHAbsencesPage() {
   const [absencesNonDeclarees, setAbsencesNonDeclarees] = useState<any[]>([]);
 
   useEffect(() => {
-    fetch('http://localhost:8000/api/absences/', {
+    fetch('http://localhost:8000/api/absences/?pagination=off', {
       headers: {
         'Content-Type': 'application/json',
         // 'Authorization': `Bearer ${typeof window !== 'undefined' ? localStorage.getItem('token') : ''}`, // Temporairement commenté
@@ -62,7 +62,7 @@ export default function RHAbsencesPage() {
   }, []);
 
   useEffect(() => {
-    fetch('http://localhost:8000/api/absences-non-declarees/', {
+    fetch('http://localhost:8000/api/absences-non-declarees/?pagination=off', {
       headers: {
         'Content-Type': 'application/json',
       },
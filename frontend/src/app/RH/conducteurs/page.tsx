@@ -156,7 +156,7 @@ export default function ConducteursPage() {
 
       // Récupérer les stats de présence
       console.log('Fetching presence stats...');
-      const presenceResponse = await fetch(`${API_URL}/stats/conducteurs/presence/`);
+      const presenceResponse = await fetch(`${API_URL}/stats/presence/?fonction=conducteur`);
       console.log('Presence response status:', presenceResponse.status);
       
       if (!presenceResponse.ok) {
@@ -168,7 +168,7 @@ export default function ConducteursPage() {
       const presenceData = await presenceResponse.json();
       console.log('Presence data:', presenceData);
       
-      // The API returns an object with presents, absents, total, and details
+      // The API returns an object with presents, absents and total
       const presents = presenceData.presents || 0;
       const absents = presenceData.absents || 0;
       setStatsPresence({ presents, absents });
@@ -131,7 +131,7 @@ export default function DockersPage() {
 
       // Récupérer les stats de présence
       console.log('Fetching presence stats...');
-      const presenceResponse = await fetch(`${API_URL}/stats/dockers/presence/`);
+      const presenceResponse = await fetch(`${API_URL}/stats/presence/?fonction=docker`);
       console.log('Presence response status:', presenceResponse.status);
       
       if (!presenceResponse.ok) {
@@ -143,7 +143,7 @@ export default function DockersPage() {
       const presenceData = await presenceResponse.json();
       console.log('Presence data:', presenceData);
       
-      // The API returns an object with presents, absents, total, and details
+      // The API returns an object with presents, absents and total
       const presents = presenceData.presents || 0;
       const absents = presenceData.absents || 0;
       setStatsPresence({ presents, absents });
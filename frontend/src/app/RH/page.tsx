@@ -43,7 +43,7 @@ export default function RHHome() {
         const chefsData = await chefsResponse.json();
         
         // Récupérer les absences en attente
-        const absencesResponse = await fetch(`${API_URL}/absences/`);
+        const absencesResponse = await fetch(`${API_URL}/absences/?pagination=off`);
         const absencesData = await absencesResponse.json();
         
         // Récupérer les alertes du jour
@@ -139,7 +139,7 @@ const AccueilChefEscale = () => {
         }
 
         // Charger les absences
-        const absencesResponse = await fetch('http://localhost:8000/api/absences/');
+        const absencesResponse = await fetch('http://localhost:8000/api/absences/?pagination=off');
         if (absencesResponse.ok) {
           const absencesData = await absencesResponse.json();
           setAbsences(absencesData || []);
@@ -1236,7 +1236,7 @@ const AbsencesSection = () => {
   const loadAbsences = async () => {
     try {
       setLoading(true);
-      const response = await fetch('http://localhost:8000/api/absences/', {
+      const response = await fetch('http://localhost:8000/api/absences/?pagination=off', {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -1261,7 +1261,7 @@ const AbsencesSection = () => {
 
   const loadAbsencesNonDeclarees = async () => {
     try {
-      const response = await fetch('http://localhost:8000/api/absences-non-declarees/', {
+      const response = await fetch('http://localhost:8000/api/absences-non-declarees/?pagination=off', {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -2863,13 +2863,23 @@ const NaviresSection = () => {
       }
 
       const result = await response.json();
-      console.log('Mise à jour réussie:', result);
-      
-      // Attendre un peu puis recharger les données
-      setTimeout(async () => {
-        await loadNavires();
-      }, 3000);
-      
+      console.log('Mise à jour lancée:', result);
+
+      // Suivre le job de scraping jusqu'à sa fin puis recharger les données
+      let job = result.job;
+      while (job && (job.statut === 'en attente' || job.statut === 'en cours')) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const statutResponse = await fetch(`http://localhost:8000/api/jobs/${job.id}/`);
+        if (!statutResponse.ok) {
+          break;
+        }
+        job = await statutResponse.json();
+      }
+      if (job && job.statut === 'échoué') {
+        throw new Error(job.erreur);
+      }
+      await loadNavires();
+
     } catch (err) {
       console.error('Erreur lors de la mise à jour des navires:', err);
       setError('Erreur lors de la mise à jour des navires. Vérifiez que le backend est démarré.');
@@ -10,6 +10,7 @@ import DashboardEngins from "./DashboardEngins";
 import styles from "./dev-tech.module.css";
 import { Engin } from "./EnginCard";
 import ModalSuppressionEngin from "./ModalSuppressionEngin";
+import { EvenementFlux, useFluxEvenements } from "../../hooks/useFluxEvenements";
 
 const fetchEngins = async (): Promise<Engin[]> => {
   const res = await fetch("http://localhost:8000/api/engins/");
@@ -55,10 +56,29 @@ export default function KanbanEngins() {
     queryFn: fetchEngins,
   });
 
+  // Transitions diffusées par le serveur (tous les écrans, y compris celui-ci) :
+  // mise à jour locale au lieu de recharger toute la table des engins
+  useFluxEvenements("/flux/engins/", ["engins"], (evenement: EvenementFlux) => {
+    const { code_engin, nouvel_etat } = evenement.donnees as {
+      code_engin: string;
+      nouvel_etat: Engin["etat_engin"];
+    };
+    if (evenement.type === "transition") {
+      queryClient.setQueryData<Engin[]>(["engins"], (anciens) =>
+        anciens?.map((e) => (e.code_engin === code_engin ? { ...e, etat_engin: nouvel_etat } : e))
+      );
+    } else {
+      // Création, suppression ou resynchronisation demandée par le serveur
+      queryClient.invalidateQueries({ queryKey: ["engins"] });
+    }
+  });
+
   const patchMutation = useMutation({
     mutationFn: patchEngin,
-    onSuccess: () => {
-      queryClient.invalidateQueries({ queryKey: ["engins"] });
+    onSuccess: (engin: Engin) => {
+      queryClient.setQueryData<Engin[]>(["engins"], (anciens) =>
+        anciens?.map((e) => (e.code_engin === engin.code_engin ? { ...e, ...engin } : e))
+      );
       toast.success("État de l'engin mis à jour !");
     },
     onError: () => toast.error("Erreur lors de la mise à jour"),
@@ -0,0 +1,47 @@
+import { useEffect, useRef } from 'react';
+
+const API_URL = "http://localhost:8000/api";
+
+export interface EvenementFlux {
+  canal: string;
+  type: string;
+  donnees: Record<string, unknown>;
+}
+
+/**
+ * Abonnement à un flux SSE du backend (ex: /flux/rh/).
+ * `onEvenement` est appelé pour chaque événement des canaux demandés, et
+ * avec un événement de canal « resync » quand le client doit tout relire.
+ * EventSource se reconnecte seul en cas de coupure.
+ */
+export function useFluxEvenements(
+  chemin: string,
+  canaux: string[],
+  onEvenement: (evenement: EvenementFlux) => void
+) {
+  const callback = useRef(onEvenement);
+  callback.current = onEvenement;
+  const cleCanaux = canaux.join(',');
+
+  useEffect(() => {
+    if (typeof window === 'undefined' || !('EventSource' in window)) {
+      return;
+    }
+    const source = new EventSource(`${API_URL}${chemin}?canaux=${cleCanaux}`);
+    const recevoir = (message: MessageEvent) => {
+      try {
+        callback.current(JSON.parse(message.data));
+      } catch {
+        // Message illisible ignoré
+      }
+    };
+    [...cleCanaux.split(','), 'resync'].forEach((canal) => source.addEventListener(canal, recevoir));
+    source.onerror = () => {
+      // Serveur WSGI (501) : pas de flux, l'écran garde son chargement initial
+      if (source.readyState === EventSource.CLOSED) {
+        source.close();
+      }
+    };
+    return () => source.close();
+  }, [chemin, cleCanaux]);
+}